@@ -30,6 +30,34 @@ class UnsupportedTarballFormat(Exception):
     pass
 
 
+class ManifestError(Exception):
+    """Raised when a tar ball member manifest exists but can't be used.
+    """
+
+    pass
+
+
+class IngestError(Exception):
+    """Raised when the single pass ingest of a tar ball fails.
+    """
+
+    pass
+
+
+class WorkerDied(Exception):
+    """Raised when a worker process dies before completing its task.
+    """
+
+    pass
+
+
+class BulkFileError(Exception):
+    """Raised when a bulk file, or its replay progress file, can't be read.
+    """
+
+    pass
+
+
 class SosreportHostname(Exception):
     pass
 
@@ -129,6 +129,18 @@ _handlers = {}
 _devlog = "/dev/log"
 
 
+def reset_pbench_logger(caller):
+    """Remove and close the handler added to the logger of the given caller by
+    get_pbench_logger(), if any, so that the next call to get_pbench_logger()
+    adds a new one per the configuration it is given, e.g. when a long-running
+    process reloads its configuration.
+    """
+    handler = _handlers.pop(caller, None)
+    if handler is not None:
+        logging.getLogger(caller).removeHandler(handler)
+        handler.close()
+
+
 def get_pbench_logger(caller, config):
     """Fetch the logger specifed by "caller", and add a specific handler
     based on the logging configuration requested.
@@ -100,7 +100,7 @@ class PbenchServerConfig(PbenchConfig):
             " TO-UNPACK UNPACKED WONT-UNPACK"
             " TO-SYNC SYNCED"
             " TO-LINK"
-            " TO-INDEX TO-RE-INDEX TO-INDEX-TOOL INDEXED WONT-INDEX"
+            " TO-INDEX TO-RE-INDEX TO-INDEX-TOOL TO-REPLAY INDEXED WONT-INDEX"
             " TO-COPY-SOS COPIED-SOS"
             " TO-BACKUP BACKED-UP BACKUP-FAILED"
             " SATELLITE-MD5-PASSED SATELLITE-MD5-FAILED"
@@ -0,0 +1,463 @@
+"""Pipelined bulk indexing of documents into Elasticsearch.
+
+The `pyesbulk.streaming_bulk()` interface generates a chunk of documents,
+sends it to Elasticsearch, and waits for the response before generating the
+next chunk, so the indexer sits idle while a bulk request is in flight, and
+Elasticsearch sits idle while the indexer generates documents.
+
+The `PipelinedBulk` class below instead keeps a configurable number of bulk
+requests in flight, issued by a small pool of threads, while the calling
+thread continues to generate (and serialize) the documents of the next
+chunks.  Chunks are closed when they reach either a maximum number of
+documents or a maximum number of bytes.  When Elasticsearch pushes back by
+rejecting requests or documents with a 429 status, the number of requests
+allowed in flight is halved (and then grown back one request at a time as
+chunks complete without being rejected), and the rejected documents are
+retried after a random back-off sleep.
+
+Responses are processed in the order the chunks were generated, and each
+document response is handled the same way `pyesbulk` does: 409 responses
+are counted as duplicates (unless the document was retried), 400 responses
+and closed index errors are written to the errors file, and all other
+errors are retried.
+
+Instead of sending them to Elasticsearch, the actions for a tar ball can also
+be written to a compressed NDJSON bulk file, `write_bulk_file()`, holding the
+body of the bulk requests which would have been sent.  Bulk files are later
+replayed into Elasticsearch by reading them back, `read_bulk_file()`, and
+indexing their actions, while the number of leading documents of the file
+known to be handled is recorded in a progress file next to it, so that an
+interrupted replay can resume where it left off.
+"""
+
+import gzip
+import json
+import math
+import os
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from random import SystemRandom
+from time import sleep as _sleep
+
+from elasticsearch.exceptions import TransportError
+
+import pbench.server
+from pbench.common.exceptions import BulkFileError
+from pbench.server import tstos
+
+
+# Default maximum number of bulk requests in flight at one time.
+DEFAULT_IN_FLIGHT = 4
+
+# Default maximum number of documents in one bulk request.
+DEFAULT_CHUNK_DOCS = 2000
+
+# Default maximum size, in bytes, of one bulk request.
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Maximum length of messages logged when retrying documents.
+_MAX_ERRMSG_LENGTH = 16384
+
+# 100,000 minute timeouts talking to Elasticsearch, see indexer.py.
+_request_timeout = 100000 * 60.0
+
+_r = SystemRandom()
+_MAX_SLEEP_TIME = 120
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# Suffix of the compressed NDJSON bulk files.
+BULK_FILE_SUFFIX = ".ndjson.gz"
+
+# Suffix of the progress file kept next to a bulk file being replayed.
+PROGRESS_SUFFIX = ".progress"
+
+# Bulk files are written while generating documents, so we favor speed over
+# size when compressing them.
+_COMPRESS_LEVEL = 1
+
+
+def _calc_backoff_sleep(backoff):
+    b = math.pow(2, backoff)
+    return _r.uniform(0, min(b, _MAX_SLEEP_TIME))
+
+
+def action_lines(action):
+    """Return the bulk API request lines for the given action, the action
+    metadata line followed by the document source line, as UTF-8 encoded
+    bytes.
+
+    The document source of the action is either a document, which is
+    converted to JSON here, or the JSON form of a document, as bytes, which
+    is used as is.
+    """
+    op_type = action["_op_type"]
+    meta = {op_type: {"_index": action["_index"], "_id": action["_id"]}}
+    source = action["_source"]
+    if not isinstance(source, bytes):
+        source = _encoder.encode(source).encode("utf-8")
+    return _encoder.encode(meta).encode("utf-8") + b"\n" + source + b"\n"
+
+
+def _action_meta(action):
+    """Return a copy of the given action without its document source, which
+    is only kept in its serialized form once added to a chunk.
+    """
+    return {key: val for key, val in action.items() if key != "_source"}
+
+
+class PipelinedBulk:
+    """Index a stream of actions using a bounded number of concurrent bulk
+    requests.
+
+    Construct the object with an Elasticsearch client object, the file
+    object to which documents which can't or won't be retried are reported,
+    a logger, and the chunking and concurrency limits, and then call run()
+    with an iterable of actions.
+    """
+
+    def __init__(
+        self,
+        es,
+        errorsfp,
+        logger,
+        in_flight=DEFAULT_IN_FLIGHT,
+        chunk_docs=DEFAULT_CHUNK_DOCS,
+        chunk_bytes=DEFAULT_CHUNK_BYTES,
+        sleep=_sleep,
+        progress=None,
+        failed=None,
+    ):
+        assert in_flight >= 1, f"Invalid number of in flight requests, {in_flight}"
+        assert chunk_docs >= 1, f"Invalid number of documents per chunk, {chunk_docs}"
+        self.es = es
+        self.errorsfp = errorsfp
+        self.logger = logger
+        self.in_flight = in_flight
+        self.chunk_docs = chunk_docs
+        self.chunk_bytes = chunk_bytes
+        self.sleep = sleep
+        # Optional callable invoked with the number of leading actions which
+        # have been completely handled each time that number might change.
+        self.progress = progress
+        # Optional callable invoked with the sequence number of each action
+        # which could not be indexed.
+        self.failed = failed
+        # Sequence number of the next action taken from the actions given.
+        self.next_seq = 0
+        # The number of requests currently allowed in flight, reduced when
+        # Elasticsearch pushes back.
+        self.window = in_flight
+        # Actions to be retried, as (retry count, action metadata, lines,
+        # sequence number) tuples.
+        self.retry_q = deque()
+        self.backoff = 0
+        self.throttled = False
+        self.successes = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.retries = 0
+
+    def _next_chunk(self, actions):
+        """Return the next chunk of (retry count, action metadata, lines,
+        sequence number) tuples to be sent, drawn first from the actions to be retried, and
+        then from the given actions iterator, or an empty list if there is
+        nothing left to send.
+        """
+        chunk = []
+        nbytes = 0
+        while len(chunk) < self.chunk_docs and nbytes < self.chunk_bytes:
+            if self.retry_q:
+                entry = self.retry_q.popleft()
+            else:
+                try:
+                    action = next(actions)
+                except StopIteration:
+                    break
+                entry = (0, _action_meta(action), action_lines(action), self.next_seq)
+                self.next_seq += 1
+            chunk.append(entry)
+            nbytes += len(entry[2])
+        return chunk
+
+    def _send(self, chunk):
+        """Send one chunk as a bulk request, returning the response, or the
+        exception raised making the request.
+
+        This is invoked from the threads of the pool.
+        """
+        body = b"".join(entry[2] for entry in chunk)
+        try:
+            return self.es.bulk(body=body, request_timeout=_request_timeout)
+        except TransportError as exc:
+            return exc
+
+    def _report_error(self, ok, resp, retry_count, action, lines, seq):
+        # Recover the document source from the request lines for the report.
+        action = dict(action, _source=json.loads(lines.split(b"\n", 1)[1]))
+        try:
+            exc_payload = resp["exception"]
+        except KeyError:
+            pass
+        else:
+            # The exception object is not always JSON serializable, so we use
+            # its `repr` instead.
+            resp["exception"] = repr(exc_payload)
+        jsonstr = json.dumps(
+            {
+                "action": action,
+                "ok": ok,
+                "resp": resp,
+                "retry_count": retry_count,
+                "timestamp": tstos(),
+            },
+            indent=4,
+            sort_keys=True,
+        )
+        print(jsonstr, file=self.errorsfp)
+        self.errorsfp.flush()
+        self.failures += 1
+        if self.failed is not None:
+            self.failed(seq)
+
+    def _handle(self, entry, ok, resp):
+        """Account for the response to one document.
+        """
+        retry_count, action, lines, seq = entry
+        status = resp.get("status", 999)
+        if ok:
+            self.successes += 1
+        elif status == 409:
+            if retry_count == 0:
+                # Only count duplicates if the retry count is 0 ...
+                self.duplicates += 1
+            else:
+                # ... otherwise consider it successful.
+                self.successes += 1
+        elif status == 400:
+            self._report_error(ok, resp, retry_count, action, lines, seq)
+        else:
+            error = resp.get("error", "")
+            if isinstance(error, dict):
+                closed = error.get("type") == "index_closed_exception"
+            else:
+                closed = str(error).startswith("IndexClosedException")
+            if status == 403 and closed:
+                # Don't retry closed index exceptions
+                self._report_error(ok, resp, retry_count, action, lines, seq)
+                return
+            if status == 429:
+                self.throttled = True
+            self.logger.warning(
+                "retrying action: {}",
+                json.dumps(resp, default=repr)[:_MAX_ERRMSG_LENGTH],
+            )
+            self.retry_q.append((retry_count + 1, action, lines, seq))
+
+    def _complete(self, pending, unsent=None):
+        """Wait for the response to the oldest pending chunk, and account for
+        the response to each of its documents, then report the progress made,
+        taking into account the given chunk not yet sent.
+        """
+        chunk, future, _ = pending.popleft()
+        result = future.result()
+        self.throttled = False
+        retries_before = len(self.retry_q)
+        if isinstance(result, TransportError):
+            # The entire request failed, so every document in it failed the
+            # same way.
+            status = result.status_code
+            if not isinstance(status, int):
+                status = 999
+            for entry in chunk:
+                resp = {
+                    "_id": entry[1]["_id"],
+                    "error": str(result.error),
+                    "exception": result,
+                    "status": status,
+                }
+                self._handle(entry, False, resp)
+        else:
+            items = result["items"]
+            assert len(items) == len(chunk), (
+                f"Bulk response has {len(items)} items for a request"
+                f" of {len(chunk)} actions"
+            )
+            for entry, item in zip(chunk, items):
+                action = entry[1]
+                try:
+                    resp = item[action["_op_type"]]
+                except KeyError:
+                    # Some errors are always reported using the "index"
+                    # operation type.
+                    resp = item.get("index", item)
+                status = resp.get("status", 999)
+                if "_id" in resp:
+                    assert action["_id"] == resp["_id"], (
+                        "Response encountered out of order from actions, "
+                        f"action = {action!r}, response = {resp!r}"
+                    )
+                self._handle(entry, 200 <= status < 300, resp)
+        if self.throttled:
+            # Elasticsearch is pushing back, allow fewer requests in flight.
+            self.window = max(1, self.window // 2)
+        elif self.window < self.in_flight:
+            self.window += 1
+        if len(self.retry_q) > retries_before:
+            self.backoff += 1
+        else:
+            self.backoff = 0
+        if self.progress is not None:
+            # Every action before the lowest sequence number still to be
+            # sent, or waiting for a response, has been handled.
+            low = self.next_seq
+            for _, _, min_seq in pending:
+                low = min(low, min_seq)
+            for entry in self.retry_q:
+                low = min(low, entry[3])
+            if unsent:
+                low = min(low, min(entry[3] for entry in unsent))
+            self.progress(low)
+
+    def run(self, actions):
+        """Index all the given actions, returning a tuple with the start and
+        end times, the number of successfully indexed, duplicate, and failed
+        documents, and the number of times a chunk of retried documents was
+        sent.
+        """
+        beg = pbench.server._time()
+        actions = iter(actions)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.in_flight) as executor:
+            while True:
+                chunk = self._next_chunk(actions)
+                if not chunk:
+                    if not pending:
+                        break
+                    # Nothing more to send until the outstanding requests
+                    # complete, as they may yet yield documents to retry.
+                    self._complete(pending)
+                    continue
+                while len(pending) >= self.window:
+                    self._complete(pending, chunk)
+                if chunk[0][0] > 0:
+                    # Retried documents are always at the front of a chunk;
+                    # avoid pounding on the Elasticsearch instance.
+                    self.retries += 1
+                    self.sleep(_calc_backoff_sleep(self.backoff))
+                pending.append(
+                    (
+                        chunk,
+                        executor.submit(self._send, chunk),
+                        min(entry[3] for entry in chunk),
+                    )
+                )
+        end = pbench.server._time()
+        return (
+            beg,
+            end,
+            self.successes,
+            self.duplicates,
+            self.failures,
+            self.retries,
+        )
+
+
+def write_bulk_file(path, actions):
+    """Write the given actions to a bulk file at the given path, returning a
+    tuple like es_index() does, where every action written is counted as a
+    success.
+
+    The file is written to a temporary file which is then renamed into
+    place, so a bulk file is never partially written, and any progress
+    recorded replaying a previous bulk file at the same path is discarded.
+    """
+    beg = pbench.server._time()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=path.parent)
+    count = 0
+    try:
+        with os.fdopen(fd, "wb") as raw_fp:
+            with gzip.GzipFile(
+                fileobj=raw_fp, mode="wb", compresslevel=_COMPRESS_LEVEL
+            ) as fp:
+                for action in actions:
+                    fp.write(action_lines(action))
+                    count += 1
+        os.chmod(tmp_name, 0o664)
+        os.rename(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    try:
+        os.unlink(f"{path}{PROGRESS_SUFFIX}")
+    except FileNotFoundError:
+        pass
+    end = pbench.server._time()
+    return beg, end, count, 0, 0, 0
+
+
+def read_bulk_file(path, skip=0):
+    """Generate the actions of the given bulk file, skipping the given number
+    of leading actions.
+
+    The document source of each action is its JSON form, as bytes, exactly
+    as written to the file.
+    """
+    with gzip.open(path, "rb") as fp:
+        idx = 0
+        while True:
+            try:
+                meta_line = fp.readline()
+                if not meta_line:
+                    break
+                source_line = fp.readline()
+            except (EOFError, OSError, zlib.error) as exc:
+                raise BulkFileError(f"{path}: unreadable after {idx:d} actions: {exc}")
+            if not source_line.endswith(b"\n"):
+                raise BulkFileError(f"{path}: truncated after {idx:d} actions")
+            if idx >= skip:
+                try:
+                    ((op_type, meta),) = json.loads(meta_line).items()
+                    action = {
+                        "_op_type": op_type,
+                        "_index": meta["_index"],
+                        "_id": meta["_id"],
+                        "_source": source_line[:-1],
+                    }
+                except Exception as exc:
+                    raise BulkFileError(f"{path}: bad action line {idx:d}: {exc}")
+                yield action
+            idx += 1
+
+
+def load_progress(path):
+    """Return the recorded progress of replaying the given bulk file, a tuple
+    of the number of leading actions handled, and whether the replay was
+    completed.
+    """
+    try:
+        with open(f"{path}{PROGRESS_SUFFIX}", "r") as fp:
+            progress = json.load(fp)
+        return progress["actions"], progress["complete"]
+    except FileNotFoundError:
+        return 0, False
+    except Exception as exc:
+        raise BulkFileError(f"{path}: bad progress file: {exc}")
+
+
+def save_progress(path, actions, complete=False):
+    """Record the progress of replaying the given bulk file.
+    """
+    ppath = Path(f"{path}{PROGRESS_SUFFIX}")
+    tmp = ppath.with_name(f".{ppath.name}.tmp")
+    with tmp.open("w") as fp:
+        json.dump({"actions": actions, "complete": complete}, fp)
+    tmp.rename(ppath)
@@ -0,0 +1,351 @@
+"""State catalog of the tar balls of the ARCHIVE hierarchy.
+
+The state of a tar ball in the pipeline is recorded by the links to it in
+the state directories of its controller, `<controller>/<STATE>/<name>`, and
+each stage finds its work by globbing for the links in its source state of
+every controller.  With many controllers and tar balls, that is a storm of
+directory reads, stats and readlinks on every run of every stage.
+
+The catalog is an SQLite database kept alongside the links, recording each
+tar ball (controller, name, size, MD5 from its ".md5" file, and when it was
+first seen) and the states it is in (and since when), so that a stage can
+ask for the tar balls in a given state in a single query.
+
+The links remain the authority: the catalog is brought up to date with them
+by refresh(), which only reads the state directories that changed (by their
+modification time) since the last refresh, and only those of the states a
+stage is about to look at, so that the stages, scripts and people moving
+links around need not know about the catalog.  A directory
+modified within the last couple of seconds is always read again, in case it
+changed again within the granularity of its modification time.  The audit
+verifies the catalog against a full scan of the links with check().
+
+The catalog is only used when the "state-catalog" option of the
+[pbench-server] section names the database file.
+"""
+
+import os
+import sqlite3
+import time
+from configparser import NoOptionError, NoSectionError
+
+from pbench.server.ingest import read_md5_file
+
+
+# Version of the catalog schema.
+CATALOG_VERSION = 1
+
+# A state directory modified this recently (in nanoseconds) is read again by
+# the next refresh, even when its modification time has not changed.
+_SETTLE_NS = 2 * 1000 * 1000 * 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tarballs (
+    controller TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER,
+    md5 TEXT,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (controller, name)
+);
+CREATE TABLE IF NOT EXISTS states (
+    controller TEXT NOT NULL,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    since REAL NOT NULL,
+    PRIMARY KEY (controller, state, name)
+);
+CREATE INDEX IF NOT EXISTS states_by_state ON states (state);
+CREATE INDEX IF NOT EXISTS states_by_tarball ON states (controller, name);
+CREATE TABLE IF NOT EXISTS dirs (
+    controller TEXT NOT NULL,
+    state TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (controller, state)
+);
+"""
+
+
+def _controllers(archive):
+    """Return the names of the controller directories of the archive.
+    """
+    with os.scandir(archive) as scan:
+        return sorted(
+            entry.name
+            for entry in scan
+            if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False)
+        )
+
+
+def _state_links(state_dir):
+    """Return the map of the names of the tar ball links in the given state
+    directory to their modification times, or None if there is no such
+    directory.
+    """
+    try:
+        scan = os.scandir(state_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    links = {}
+    with scan:
+        for entry in scan:
+            if not entry.name.endswith(".tar.xz"):
+                continue
+            try:
+                links[entry.name] = entry.stat(follow_symlinks=False).st_mtime
+            except FileNotFoundError:
+                pass
+    return links
+
+
+class StateCatalog:
+    """The state catalog of the tar balls of the given ARCHIVE hierarchy,
+    kept in the given SQLite database file, for the given state directory
+    names.
+    """
+
+    def __init__(self, db_path, archive, states):
+        self.archive = str(archive)
+        self.states = list(states)
+        # Other stages may be refreshing the catalog at the same time.
+        self.db = sqlite3.connect(str(db_path), timeout=300, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self.db.execute(
+            "INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(CATALOG_VERSION),)
+        )
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _add_tarball(self, controller, name, now):
+        tb = os.path.join(self.archive, controller, name)
+        try:
+            size = os.stat(tb).st_size
+        except OSError:
+            size = None
+        try:
+            md5 = read_md5_file(f"{tb}.md5")
+        except OSError:
+            md5 = None
+        self.db.execute(
+            "INSERT OR IGNORE INTO tarballs VALUES (?, ?, ?, ?, ?)",
+            (controller, name, size, md5, now),
+        )
+        # A tar ball seen again in another state may have been missing its
+        # .md5 file, or been replaced, when first seen.  (An UPSERT would
+        # need SQLite 3.24 or later.)
+        self.db.execute(
+            "UPDATE tarballs SET size = COALESCE(?, size), md5 = COALESCE(?, md5)"
+            " WHERE controller = ? AND name = ?",
+            (size, md5, controller, name),
+        )
+
+    def _update_dir(self, controller, state, links, now):
+        """Make the states recorded for the given state directory those of
+        the given links (None if there is no such directory).
+        """
+        recorded = {
+            row[0]
+            for row in self.db.execute(
+                "SELECT name FROM states WHERE controller = ? AND state = ?",
+                (controller, state),
+            )
+        }
+        current = links or {}
+        gone = recorded - current.keys()
+        self.db.executemany(
+            "DELETE FROM states WHERE controller = ? AND state = ? AND name = ?",
+            ((controller, state, name) for name in gone),
+        )
+        for name in sorted(current.keys() - recorded):
+            self._add_tarball(controller, name, now)
+            self.db.execute(
+                "INSERT INTO states VALUES (?, ?, ?, ?)",
+                (controller, name, state, current[name]),
+            )
+        return len(gone) + len(current.keys() - recorded)
+
+    def refresh(self, states=None):
+        """Bring the catalog up to date with the links of the given state
+        directories (all of them by default), only reading those which
+        changed since the last refresh, returning the number of states added
+        or removed.
+
+        A stage only needs its source state to be up to date, so it should
+        not pay for reading (or even stat'ing) the directories of all the
+        other states of every controller.
+        """
+        states = self.states if states is None else list(states)
+        changes = 0
+        now = time.time()
+        now_ns = time.time_ns() if hasattr(time, "time_ns") else int(now * 1e9)
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            seen = {
+                (row[0], row[1]): row[2]
+                for row in self.db.execute("SELECT * FROM dirs")
+                if row[1] in states
+            }
+            controllers = _controllers(self.archive)
+            for controller in controllers:
+                for state in states:
+                    state_dir = os.path.join(self.archive, controller, state)
+                    try:
+                        mtime_ns = os.stat(state_dir).st_mtime_ns
+                    except OSError:
+                        mtime_ns = None
+                    recorded = seen.pop((controller, state), None)
+                    if mtime_ns is None and recorded is None:
+                        continue
+                    if (
+                        mtime_ns is not None
+                        and mtime_ns == recorded
+                        and now_ns - mtime_ns > _SETTLE_NS
+                    ):
+                        continue
+                    links = _state_links(state_dir) if mtime_ns is not None else None
+                    changes += self._update_dir(controller, state, links, now)
+                    if links is None:
+                        self.db.execute(
+                            "DELETE FROM dirs WHERE controller = ? AND state = ?",
+                            (controller, state),
+                        )
+                    else:
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                            (controller, state, mtime_ns),
+                        )
+            # Forget the state directories of controllers which went away.
+            for controller, state in seen:
+                changes += self._update_dir(controller, state, None, now)
+                self.db.execute(
+                    "DELETE FROM dirs WHERE controller = ? AND state = ?",
+                    (controller, state),
+                )
+            if changes and set(states) >= set(self.states):
+                # Forget the tar balls no longer in any state; left to a full
+                # refresh, as a tar ball moved out of one of the given states
+                # may not have been seen in its new one yet.
+                self.db.execute(
+                    "DELETE FROM tarballs WHERE NOT EXISTS (SELECT 1 FROM states s"
+                    " WHERE s.controller = tarballs.controller"
+                    " AND s.name = tarballs.name)"
+                )
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return changes
+
+    def links(self, state, limit=None, order="size"):
+        """Return the paths of the links of the tar balls in the given state,
+        smallest first (order="size"), or by controller and name
+        (order="name"), at most "limit" of them.
+
+        Links which went away since the last refresh are left out.
+        """
+        order_by = {
+            "size": "t.size, s.controller, s.name",
+            "name": "s.controller, s.name",
+        }[order]
+        query = (
+            "SELECT s.controller, s.name FROM states s LEFT JOIN tarballs t"
+            " ON s.controller = t.controller AND s.name = t.name"
+            f" WHERE s.state = ? ORDER BY {order_by}"
+        )
+        paths = []
+        for controller, name in self.db.execute(query, (state,)):
+            path = os.path.join(self.archive, controller, state, name)
+            if not os.path.lexists(path):
+                continue
+            paths.append(path)
+            if limit is not None and len(paths) >= limit:
+                break
+        return paths
+
+    def tarball(self, controller, name):
+        """Return the recorded size, MD5, and states of the given tar ball,
+        or None if it is not in the catalog.
+        """
+        row = self.db.execute(
+            "SELECT size, md5 FROM tarballs WHERE controller = ? AND name = ?",
+            (controller, name),
+        ).fetchone()
+        if row is None:
+            return None
+        states = [
+            r[0]
+            for r in self.db.execute(
+                "SELECT state FROM states WHERE controller = ? AND name = ?"
+                " ORDER BY state",
+                (controller, name),
+            )
+        ]
+        return dict(size=row[0], md5=row[1], states=states)
+
+    def check(self):
+        """Verify the catalog against a full scan of the links of the state
+        directories, and the tar balls' sizes and ".md5" files, returning a
+        list of the inconsistencies found (empty when there are none).
+        """
+        problems = []
+        recorded = {}
+        for controller, name, state in self.db.execute(
+            "SELECT controller, name, state FROM states"
+        ):
+            recorded.setdefault((controller, state), set()).add(name)
+        for controller in _controllers(self.archive):
+            for state in self.states:
+                links = _state_links(os.path.join(self.archive, controller, state))
+                names = recorded.pop((controller, state), set())
+                for name in sorted((links or {}).keys() - names):
+                    problems.append(f"{controller}/{state}/{name}: not in catalog")
+                for name in sorted(names - (links or {}).keys()):
+                    problems.append(f"{controller}/{state}/{name}: no such link")
+        for (controller, state), names in sorted(recorded.items()):
+            for name in sorted(names):
+                problems.append(f"{controller}/{state}/{name}: no such link")
+        for controller, name, size, md5 in self.db.execute(
+            "SELECT controller, name, size, md5 FROM tarballs"
+            " ORDER BY controller, name"
+        ):
+            tb = os.path.join(self.archive, controller, name)
+            try:
+                actual = os.stat(tb).st_size
+            except OSError:
+                actual = None
+            if actual != size:
+                problems.append(
+                    f"{controller}/{name}: size {actual}, catalog has {size}"
+                )
+            try:
+                actual = read_md5_file(f"{tb}.md5")
+            except OSError:
+                actual = None
+            if actual != md5:
+                problems.append(f"{controller}/{name}: MD5 {actual}, catalog has {md5}")
+        return problems
+
+
+def open_catalog(config):
+    """Return the state catalog named by the configuration, or None if no
+    catalog is configured.
+    """
+    try:
+        db_path = config.get("pbench-server", "state-catalog")
+    except (NoOptionError, NoSectionError):
+        return None
+    if not db_path:
+        return None
+    return StateCatalog(db_path, config.ARCHIVE, config.LINKDIRS.split())
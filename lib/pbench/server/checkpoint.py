@@ -0,0 +1,167 @@
+"""Indexing checkpoints of pbench tar balls.
+
+The documents of a tar ball are generated in "units": the run document, the
+table-of-contents documents, the result data documents, and the documents of
+each unit of tool data (an iteration, sample, host, and tool).  As the bulk
+indexer reports the documents it has completely handled, each unit whose
+documents were all indexed without error is recorded in a checkpoint file.
+If indexing the tar ball then fails part way through, the next attempt skips
+the units recorded, instead of sending all their documents to Elasticsearch
+again only to have them rejected as duplicates.
+
+The checkpoint for a tar ball, `<controller>/<name>.tar.xz`, is stored in
+the ARCHIVE hierarchy as `<controller>/.checkpoint/<name>.checkpoint`, next
+to the state directories holding the tar ball's state link, so it follows
+the tar ball as that link is moved from one state to another.  It is removed
+once the tar ball is indexed without error.
+
+The file is a single JSON object:
+
+    { "version": 1, "key": <key>, "units": [ <unit name>, ... ] }
+
+where the key identifies what was being indexed (e.g. the tar ball's MD5
+value, the index prefix, and the indexer version); a checkpoint recorded for
+a different key is ignored.
+"""
+
+import json
+import os
+import tempfile
+from collections import deque
+
+
+# Version of the checkpoint file format.
+CHECKPOINT_VERSION = 1
+
+# Name of the directory, relative to the controller directory holding the tar
+# ball, where checkpoints are kept.
+CHECKPOINT_DIR = ".checkpoint"
+
+
+def checkpoint_path(tbname):
+    """Return the path of the checkpoint for the given tar ball path.
+
+    The tar ball path is expected to be the real location of the tar ball in
+    the ARCHIVE hierarchy, and not a state directory symlink.
+    """
+    controller_dir, name = os.path.split(tbname)
+    if name.endswith(".tar.xz"):
+        name = name[: -len(".tar.xz")]
+    return os.path.join(controller_dir, CHECKPOINT_DIR, f"{name}.checkpoint")
+
+
+class IndexCheckpoint:
+    """The units of a tar ball completely indexed, and the bookkeeping to
+    find out which units are completed while indexing.
+
+    The actions of each unit are passed through actions(), which numbers them
+    in the order they are generated, the same order in which the bulk
+    indexer numbers them.  The bulk indexer calls progress() with the number
+    of leading actions completely handled, and failed() with the number of
+    each action which could not be indexed.
+    """
+
+    def __init__(self, path, key, logger):
+        self.path = path
+        self.key = key
+        self.logger = logger
+        self.done = self._load()
+        # Number of actions generated so far.
+        self.seq = 0
+        # Units whose actions have all been generated, but which are not yet
+        # known to be completely handled, as (start, end, unit name) tuples.
+        self._open = deque()
+        # Sequence numbers of the actions which failed.
+        self._failed = []
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as fp:
+                checkpoint = json.load(fp)
+        except FileNotFoundError:
+            return set()
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable checkpoint {}: {}", self.path, e)
+            return set()
+        try:
+            if (
+                checkpoint["version"] != CHECKPOINT_VERSION
+                or checkpoint["key"] != self.key
+            ):
+                return set()
+            return set(checkpoint["units"])
+        except (KeyError, TypeError) as e:
+            self.logger.warning("Ignoring invalid checkpoint {}: {}", self.path, e)
+            return set()
+
+    def _save(self):
+        """Record the completed units, writing the checkpoint to a temporary
+        file which is renamed into place, so it is never partially written.
+        """
+        cdir = os.path.dirname(self.path)
+        try:
+            os.makedirs(cdir, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=cdir)
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(
+                        {
+                            "version": CHECKPOINT_VERSION,
+                            "key": self.key,
+                            "units": sorted(self.done),
+                        },
+                        fp,
+                    )
+                os.rename(tmp_name, self.path)
+            except Exception:
+                os.unlink(tmp_name)
+                raise
+        except OSError as e:
+            self.logger.warning("Unable to write checkpoint {}: {}", self.path, e)
+
+    def completed(self, unit):
+        """Return True if the given unit was completely indexed before.
+        """
+        return unit in self.done
+
+    def actions(self, unit, actions):
+        """Generate the given actions of the given unit, or nothing at all
+        if the unit was completely indexed before.
+        """
+        if unit in self.done:
+            self.logger.debug("skipping completed unit {}", unit)
+            return
+        start = self.seq
+        for action in actions:
+            self.seq += 1
+            yield action
+        self._open.append((start, self.seq, unit))
+
+    def failed(self, seq):
+        """Note that the action with the given sequence number failed.
+        """
+        self._failed.append(seq)
+
+    def progress(self, handled):
+        """Record the units all of whose actions are among the given number
+        of leading actions handled, and none of which failed.
+        """
+        changed = False
+        while self._open and self._open[0][1] <= handled:
+            start, end, unit = self._open.popleft()
+            if any(start <= seq < end for seq in self._failed):
+                continue
+            self.done.add(unit)
+            changed = True
+        if changed:
+            self._save()
+
+    def remove(self):
+        """Remove the checkpoint, once the tar ball is completely indexed.
+        """
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning("Unable to remove checkpoint {}: {}", self.path, e)
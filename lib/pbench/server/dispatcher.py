@@ -0,0 +1,397 @@
+"""Event-driven dispatching of the pbench server pipeline stages.
+
+Each stage of the pipeline is run by cron once a minute, and finds its work
+by scanning its source state directories: a tar ball waits up to a minute at
+every stage for the next run to notice it, and the scans are repeated every
+minute whether or not there is anything to do.
+
+The Dispatcher watches the receive directories, and the TODO, TO-UNPACK and
+TO-INDEX state directories of every controller, with inotify, and runs the
+stage for the work that arrived right away:
+
+    receive    - pbench-server-prep-shim-002
+    TODO       - pbench-dispatch
+    TO-UNPACK  - an Unpacker running in-process (see pbench.server.unpack)
+    TO-INDEX   - pbench-index (or, when it runs as a daemon, a wake-up
+                 datagram on its socket)
+
+Each stage command is run by a persistent worker thread, whenever triggered,
+with the triggers arriving while it runs coalesced into a single further
+run.  The stages hold the same lock files as their cron jobs, so that the
+dispatcher and cron never run the same stage at once, and either can be used
+(or both, cron then only picking up what the dispatcher missed).
+
+Every "rescan" seconds all the stages are triggered anyway, and the watches
+are brought up to date with the controllers, as a safety net for events
+which were missed (e.g. when the inotify event queue overflows).  Without
+inotify (it is Linux specific), the dispatcher falls back to the periodic
+rescans.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import os
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+from configparser import NoOptionError, NoSectionError
+
+
+# The inotify(7) event masks used.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# struct inotify_event, less its variable length name.
+_EVENT = struct.Struct("iIII")
+
+# The state directories watched, and the stages they trigger.
+STATE_STAGES = {"TODO": "dispatch", "TO-UNPACK": "unpack", "TO-INDEX": "index"}
+
+
+class Inotify:
+    """A minimal inotify(7) interface, by way of the C library.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init1 = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        fd = init1(os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+        # Map of the watch descriptors to the paths watched.
+        self.paths = {}
+
+    def close(self):
+        os.close(self.fd)
+
+    def add_watch(self, path, mask):
+        """Watch the given path for the events of the given mask; watching a
+        path already watched just replaces its mask.
+        """
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        self.paths[wd] = str(path)
+        return wd
+
+    def read(self, timeout=None):
+        """Return the list of (path, mask, name) tuples of the events which
+        arrive within the given number of seconds (None to wait forever); the
+        path is that of the watch, and the name that of the entry of the
+        watched directory the event is about.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        buf = os.read(self.fd, 64 * 1024)
+        events = []
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, length = _EVENT.unpack_from(buf, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(buf[pos : pos + length].rstrip(b"\0"))
+            pos += length
+            if mask & IN_IGNORED:
+                # The watched path went away.
+                self.paths.pop(wd, None)
+                continue
+            events.append((self.paths.get(wd), mask, name))
+        return events
+
+
+class Stage:
+    """A pipeline stage command, run by its own thread whenever triggered,
+    while holding the given lock file.
+
+    Triggers arriving while the command runs are coalesced into one further
+    run.  When the lock is held by someone else (i.e. the stage's cron job),
+    the run is retried every "retry" seconds, unless the lock holder is a
+    daemon listening on the given local socket (e.g. pbench-index --daemon),
+    which is sent a datagram to wake it up instead.
+    """
+
+    def __init__(self, name, argv, lock_path, logger, retry=5, wakeup_socket=None):
+        self.name = name
+        self.argv = argv
+        self.lock_path = lock_path
+        self.logger = logger
+        self.retry = retry
+        self.wakeup_socket = wakeup_socket
+        self.runs = 0
+        self._trigger = threading.Event()
+
+    def trigger(self):
+        self._trigger.set()
+
+    def _wake_up(self):
+        """Wake up the daemon listening on the stage's socket, if any,
+        returning True if there is one.
+        """
+        if not self.wakeup_socket:
+            return False
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            try:
+                sock.sendto(self.name.encode(), self.wakeup_socket)
+            except OSError:
+                return False
+        return True
+
+    def run(self, stop):
+        """Run the stage command whenever triggered, until the given
+        threading.Event is set (and trigger() is called).
+        """
+        while True:
+            self._trigger.wait()
+            if stop.is_set():
+                break
+            self._trigger.clear()
+            with open(self.lock_path, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if self._wake_up():
+                        self.logger.debug("{}: daemon woken up", self.name)
+                        continue
+                    self.logger.debug("{}: locked, retrying", self.name)
+                    if not stop.wait(self.retry):
+                        self._trigger.set()
+                    continue
+                self.logger.debug("{}: running {}", self.name, self.argv)
+                try:
+                    completed = subprocess.run(self.argv)
+                except OSError as exc:
+                    self.logger.error(
+                        "{}: cannot run {}: {}", self.name, self.argv, exc
+                    )
+                    continue
+                self.runs += 1
+                if completed.returncode != 0:
+                    self.logger.warning(
+                        "{}: {} exited with status {:d}",
+                        self.name,
+                        self.argv,
+                        completed.returncode,
+                    )
+
+
+class Dispatcher:
+    """Watch the receive and state directories, triggering the stages for the
+    work arriving in them, with the Unpacker (if any) running in-process.
+    """
+
+    def __init__(self, config, logger, unpacker=None, rescan=300, stages=None):
+        self.config = config
+        self.logger = logger
+        self.unpacker = unpacker
+        self.rescan = rescan
+        lock_dir = config.get("pbench-server", "lock-dir")
+        if stages is None:
+            bindir = str(config.BINDIR)
+            stages = [
+                Stage(
+                    "prep",
+                    [os.path.join(bindir, "pbench-server-prep-shim-002")],
+                    os.path.join(lock_dir, "pbench-prep-002.lock"),
+                    logger,
+                ),
+                Stage(
+                    "dispatch",
+                    [os.path.join(bindir, "pbench-dispatch")],
+                    os.path.join(lock_dir, "pbench-dispatch.lock"),
+                    logger,
+                ),
+                Stage(
+                    "index",
+                    [os.path.join(bindir, "pbench-index")],
+                    os.path.join(lock_dir, "pbench-index.lock"),
+                    logger,
+                    wakeup_socket=config.get("pbench-index", "socket", fallback=None),
+                ),
+            ]
+        self.stages = {stage.name: stage for stage in stages}
+        self.unpack_lock = os.path.join(lock_dir, "pbench-unpack-service.lock")
+        self.archive = str(config.ARCHIVE)
+        try:
+            prefix = config.get("pbench-server", "pbench-receive-dir-prefix")
+        except (NoOptionError, NoSectionError):
+            prefix = ""
+        self.receive_dirs = [f"{prefix}-002"] if prefix else []
+        self.inotify = None
+        # Map of the watched directories to what they are: the archive, a
+        # controller directory, a state directory, a receive directory, or a
+        # controller directory of a receive directory.
+        self._roles = {}
+
+    def trigger(self, stage):
+        """Trigger the given stage, if it is run by this dispatcher.
+        """
+        if stage == "unpack":
+            if self.unpacker is not None:
+                self.unpacker.notify()
+        elif stage in self.stages:
+            self.stages[stage].trigger()
+
+    def trigger_all(self):
+        for stage in ("prep", "dispatch", "unpack", "index"):
+            self.trigger(stage)
+
+    def _watch(self, path, mask, role):
+        try:
+            self.inotify.add_watch(path, mask | IN_ONLYDIR)
+        except OSError as exc:
+            if exc.errno not in (errno.ENOENT, errno.ENOTDIR):
+                self.logger.warning("Cannot watch {}: {}", path, exc)
+            return False
+        self._roles[str(path)] = role
+        return True
+
+    def _watch_controller(self, controller_dir):
+        if not self._watch(controller_dir, IN_CREATE | IN_MOVED_TO, ("controller",)):
+            return
+        for state, stage in STATE_STAGES.items():
+            self._watch(
+                os.path.join(controller_dir, state),
+                IN_CREATE | IN_MOVED_TO,
+                ("state", stage),
+            )
+
+    def _watch_receive_controller(self, path):
+        self._watch(path, IN_CLOSE_WRITE | IN_MOVED_TO, ("receive-controller",))
+
+    def watch_all(self):
+        """Bring the watches up to date with the controllers of the archive
+        and receive directories.
+        """
+        if self.inotify is None:
+            return
+        if self._watch(self.archive, IN_CREATE | IN_MOVED_TO, ("archive",)):
+            with os.scandir(self.archive) as scan:
+                for entry in scan:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._watch_controller(entry.path)
+        for receive_dir in self.receive_dirs:
+            if not self._watch(receive_dir, IN_CREATE | IN_MOVED_TO, ("receive",)):
+                continue
+            with os.scandir(receive_dir) as scan:
+                for entry in scan:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._watch_receive_controller(entry.path)
+
+    def handle(self, path, mask, name):
+        """Act upon the given inotify event.
+        """
+        if mask & IN_Q_OVERFLOW:
+            self.logger.warning("inotify event queue overflow, rescanning")
+            self.watch_all()
+            self.trigger_all()
+            return
+        role = self._roles.get(path)
+        if role is None:
+            return
+        entry = os.path.join(path, name)
+        if role[0] == "archive":
+            if mask & IN_ISDIR:
+                self._watch_controller(entry)
+                for stage in STATE_STAGES.values():
+                    self.trigger(stage)
+        elif role[0] == "controller":
+            stage = STATE_STAGES.get(name)
+            if stage is not None and mask & IN_ISDIR:
+                self._watch(entry, IN_CREATE | IN_MOVED_TO, ("state", stage))
+                # Links may have been added before the watch was.
+                self.trigger(stage)
+        elif role[0] == "state":
+            if name.endswith(".tar.xz"):
+                self.trigger(role[1])
+        elif role[0] == "receive":
+            if mask & IN_ISDIR:
+                self._watch_receive_controller(entry)
+                self.trigger("prep")
+        elif role[0] == "receive-controller":
+            # An agent copies the tar ball, then its .md5 file.
+            if name.endswith(".tar.xz.md5"):
+                self.trigger("prep")
+
+    def _unpack(self, stop):
+        """Run the Unpacker until stopped, once the unpack lock is acquired.
+        """
+        with open(self.unpack_lock, "a") as lock:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if stop.wait(5):
+                        return
+                else:
+                    break
+            try:
+                self.unpacker.run(stop)
+            except Exception:
+                self.logger.exception("Unpacker failed")
+                stop.set()
+
+    def run(self, stop):
+        """Dispatch the work arriving until the given threading.Event is set.
+        """
+        try:
+            self.inotify = Inotify()
+        except OSError as exc:
+            self.logger.warning(
+                "inotify unavailable ({}), rescanning every {:d} seconds",
+                exc,
+                self.rescan,
+            )
+        threads = [
+            threading.Thread(target=stage.run, args=(stop,), name=stage.name)
+            for stage in self.stages.values()
+        ]
+        if self.unpacker is not None:
+            threads.append(
+                threading.Thread(target=self._unpack, args=(stop,), name="unpack")
+            )
+        for thread in threads:
+            thread.start()
+        try:
+            next_rescan = time.monotonic()
+            while not stop.is_set():
+                now = time.monotonic()
+                if now >= next_rescan:
+                    self.watch_all()
+                    self.trigger_all()
+                    next_rescan = now + self.rescan
+                # Wake up at least once a second to notice the stop event.
+                timeout = min(next_rescan - now, 1)
+                if self.inotify is None:
+                    stop.wait(timeout)
+                    continue
+                for path, mask, name in self.inotify.read(timeout):
+                    self.handle(path, mask, name)
+        finally:
+            stop.set()
+            for stage in self.stages.values():
+                stage.trigger()
+            if self.unpacker is not None:
+                self.unpacker.notify()
+            for thread in threads:
+                thread.join()
+            if self.inotify is not None:
+                self.inotify.close()
+                self.inotify = None
@@ -11,19 +11,25 @@ import logging
 import math
 import os
 import re
+import resource
 import socket
 import sys
 import tarfile
 import errno
-from collections import Counter
+from itertools import islice
+from collections import Counter, deque
 from configparser import ConfigParser
 from configparser import Error as ConfigParserError
 from configparser import NoOptionError, NoSectionError
+from json.encoder import encode_basestring_ascii
 from datetime import datetime, timedelta
+from functools import lru_cache
+from multiprocessing import Pool, Queue
 from operator import itemgetter
 from random import SystemRandom
 from time import sleep as _sleep
 from pathlib import Path
+from queue import Empty
 
 from urllib3 import Timeout
 
@@ -40,14 +46,22 @@ from pbench.common.exceptions import (
     TemplateError,
     BadIterationName,
     BadSampleName,
+    ManifestError,
+    WorkerDied,
 )
 from pbench.common.logger import get_pbench_logger
 
 import pbench.server
 from pbench.server import tstos
+from pbench.server.bulk import DEFAULT_CHUNK_BYTES, DEFAULT_CHUNK_DOCS, PipelinedBulk
+from pbench.server.checkpoint import IndexCheckpoint, checkpoint_path
+from pbench.server.jsonstream import JsonArrayReader
+from pbench.server.manifest import MemberIndex, load_manifest, scan_extracted_tree
 
 try:
     from elasticsearch import Elasticsearch, VERSION
+    from elasticsearch.exceptions import ConnectionError as ESConnectionError
+    from elasticsearch.exceptions import NotFoundError, TransportError
 
     assert VERSION[0] == 7, "Pbench currently requires Elasticsearch V7.x"
 except ImportError:
@@ -84,9 +98,38 @@ VERSION = "4.0.0"
 # Standard normalized date/time format
 _STD_DATETIME_FMT = pbench._STD_DATETIME_FMT
 
+# The (naive, UTC) datetime of the epoch, used to convert datetime objects to
+# floating point seconds since the epoch.
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=4096)
+def _fmt_epoch_ts(ts_float):
+    """Format the given floating point seconds since the epoch as a standard
+    normalized date/time string.
+
+    The same time stamps are typically converted many times in a row (e.g.
+    for each identifier of a row of tool data), so we memoize the most
+    recently formatted ones.  For all but the earliest years, isoformat()
+    produces the same string as the standard format, only faster.
+    """
+    ts = datetime.utcfromtimestamp(ts_float)
+    if ts.year < 1000:
+        return ts.strftime(_STD_DATETIME_FMT)
+    return ts.isoformat(timespec="microseconds")
+
+
 # Maximum length of messages logged by es_index()
 _MAX_ERRMSG_LENGTH = 16384
 
+# Number of rows read from each .csv file at a time when unifying the rows of
+# multiple .csv files into documents.
+_CSV_BLOCK_ROWS = 1024
+
+# Number of characters read from a periodic time stamp stdout file at a time
+# when splitting it into records.
+_STDOUT_CHUNK_SIZE = 16 * 1024 * 1024
+
 # All indexing uses "create" (instead of "index") to avoid updating
 # existing records, allowing us to detect duplicates.
 _op_type = "create"
@@ -97,6 +140,14 @@ _dict_const = dict
 _r = SystemRandom()
 _MAX_SLEEP_TIME = 120
 
+# Elasticsearch 5xx statuses for which template requests are retried.
+_RETRY_5XXS = (500, 503, 504)
+
+# Maximum age, in seconds, of the local cache of the template content hashes
+# known to be in place in Elasticsearch.  Past that age the templates are
+# fetched from Elasticsearch to verify they are still in place.
+TEMPLATE_CACHE_MAX_AGE = 600
+
 
 def _calc_backoff_sleep(backoff):
     global _r
@@ -146,7 +197,15 @@ class PbenchTemplates:
 
     _fpat = re.compile(r"tool-data-frag-(?P<toolname>.+)\.json")
 
-    def __init__(self, basepath, idx_prefix, logger, known_tool_handlers=None, _dbg=0):
+    def __init__(
+        self,
+        basepath,
+        idx_prefix,
+        logger,
+        known_tool_handlers=None,
+        _dbg=0,
+        cache_file=None,
+    ):
         # Where to find the mappings
         MAPPING_DIR = os.path.join(os.path.dirname(basepath), "lib", "mappings")
         # Where to find the settings
@@ -158,6 +217,9 @@ class PbenchTemplates:
         self.logger = logger
         self.known_tool_handlers = known_tool_handlers
         self._dbg = _dbg
+        # Local cache of the content hashes of the templates known to be in
+        # place in Elasticsearch (None to always check Elasticsearch).
+        self.cache_file = cache_file
 
         # Pbench report status mapping and settings.
         mfile = os.path.join(MAPPING_DIR, "server-reports.json")
@@ -388,8 +450,74 @@ class PbenchTemplates:
             )
         sys.stdout.flush()
 
+    @staticmethod
+    def _template_hash(body):
+        """Return the content hash of the given template body.
+        """
+        return hashlib.md5(
+            json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+
+    def _load_cache(self):
+        """Return the template content hashes of the local cache, or an empty
+        dictionary if there is no cache, or it is too old to be trusted.
+        """
+        if self.cache_file is None:
+            return {}
+        try:
+            age = pbench.server._time() - os.stat(self.cache_file).st_mtime
+            if age > TEMPLATE_CACHE_MAX_AGE:
+                return {}
+            with open(self.cache_file, "r") as fp:
+                hashes = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        return hashes if isinstance(hashes, dict) else {}
+
+    def _save_cache(self, hashes):
+        """Record the given template content hashes in the local cache.
+        """
+        if self.cache_file is None:
+            return
+        tmp = f"{self.cache_file}.{os.getpid()}"
+        try:
+            with open(tmp, "w") as fp:
+                json.dump(hashes, fp, sort_keys=True)
+            os.rename(tmp, self.cache_file)
+        except OSError as e:
+            self.logger.warning(
+                "Unable to write template cache {}: {}", self.cache_file, e
+            )
+
+    def _es_request(self, name, request):
+        """Issue the given template request, retrying connection errors and
+        some 5xx errors, returning the response along with the number of
+        retries made.
+        """
+        retries = 0
+        backoff = 1
+        while True:
+            try:
+                return request(), retries
+            except ESConnectionError:
+                pass
+            except TransportError as exc:
+                if exc.status_code not in _RETRY_5XXS:
+                    raise
+            retries += 1
+            self.logger.debug("retrying template request for {}", name)
+            _sleep_w_backoff(backoff)
+            backoff += 1
+
     def update_templates(self, es, target_name=None):
         """Push the various Elasticsearch index templates required by pbench.
+
+        Each template pushed records the hash of its content in the "_meta"
+        field of its mappings, so that a template is only pushed when its
+        content differs from the one in place in Elasticsearch, fetched with
+        a single request for all templates.  The hashes known to be in place
+        are also recorded in a local cache file, which when recent enough
+        saves even that request.
         """
         if target_name is not None:
             idxname = self.index_patterns[target_name]["idxname"]
@@ -397,29 +525,62 @@ class PbenchTemplates:
             idxname = None
         template_names = [name for name in self.templates]
         template_names.sort()
-        successes = retries = 0
-        beg = end = None
+        if idxname is not None:
+            # If we were asked to only load a given template name, skip all
+            # non-matching templates.
+            template_names = [name for name in template_names if name.endswith(idxname)]
+        hashes = {
+            name: self._template_hash(self.templates[name]) for name in template_names
+        }
+        cached = self._load_cache()
+        if all(cached.get(name) == hashes[name] for name in template_names):
+            self.logger.debug(
+                "done templates, {:d} unchanged per the local cache", len(hashes)
+            )
+            return
+
+        successes = skipped = retries = 0
+        beg = pbench.server._time()
+        try:
+            current, retries = self._es_request(
+                f"{self.idx_prefix}.*",
+                lambda: es.indices.get_template(name=f"{self.idx_prefix}.*"),
+            )
+        except NotFoundError:
+            current = {}
+        except Exception as e:
+            self.counters["get_template_failures"] += 1
+            raise TemplateError(e)
         for name in template_names:
-            if idxname is not None and not name.endswith(idxname):
-                # If we were asked to only load a given template name, skip
-                # all non-matching templates.
+            try:
+                current_hash = current[name]["mappings"]["_meta"]["hash"]
+            except (KeyError, TypeError):
+                current_hash = None
+            if current_hash == hashes[name]:
+                skipped += 1
                 continue
+            body = self.templates[name]
+            mappings = body["mappings"]
+            body = dict(
+                body,
+                mappings=dict(
+                    mappings, _meta=dict(mappings["_meta"], hash=hashes[name])
+                ),
+            )
             try:
-                _beg, _end, _retries, _stat = pyesbulk.put_template(
-                    es,
-                    name,
-                    "pbench-{}".format(name.split(".")[2]),
-                    self.templates[name],
+                _, _retries = self._es_request(
+                    name, lambda: es.indices.put_template(name=name, body=body)
                 )
             except Exception as e:
                 self.counters["put_template_failures"] += 1
                 raise TemplateError(e)
-            else:
-                successes += 1
-                if beg is None:
-                    beg = _beg
-                end = _end
-                retries += _retries
+            successes += 1
+            retries += _retries
+        end = pbench.server._time()
+        cached.update(hashes)
+        self._save_cache(cached)
+        if skipped > 0:
+            self.logger.debug("skipped {:d} unchanged templates", skipped)
         log_action = self.logger.warning if retries > 0 else self.logger.debug
         log_action(
             "done templates (start ts: {}, end ts: {}, duration: {:.2f}s,"
@@ -528,6 +689,56 @@ def get_es(config, logger):
     return es
 
 
+def template_cache_file(config, idx_prefix):
+    """Return the path of the local cache of the content hashes of the index
+    templates in place in the configured Elasticsearch instance, or None
+    when no local cache is to be used (unit tests always check the mock).
+    """
+    if config._unittests:
+        return None
+    try:
+        host = config.get("elasticsearch", "host")
+        port = config.get("elasticsearch", "port")
+    except (NoSectionError, NoOptionError):
+        return None
+    key = hashlib.md5(f"{idx_prefix}@{host}:{port}".encode("utf-8")).hexdigest()
+    return Path(config.TMP, f"pbench-templates.{key}.json")
+
+
+def sosreport_cache_dir(config):
+    """Return the directory of the persistent cache of the host names and
+    network interfaces found in sosreports, or None when no cache is to be
+    used (unit tests always examine the sosreports).
+    """
+    if config._unittests:
+        return None
+    return Path(config.TMP, "pbench-sosreports")
+
+
+def cull_sosreport_cache(cache_dir, max_age, now):
+    """Remove the entries of the given sosreport cache last written more than
+    max_age seconds before now, returning the number removed.
+
+    A sosreport is only examined again when its tar ball is re-indexed, which
+    requires the tar ball to still be unpacked, so pbench-cull-unpacked-tarballs
+    removes the entries older than the maximum unpacked age.
+    """
+    removed = 0
+    try:
+        entries = list(os.scandir(cache_dir))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        try:
+            if now - entry.stat(follow_symlinks=False).st_mtime > max_age:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Renamed or removed meanwhile.
+            continue
+    return removed
+
+
 # Always use "create" operations, as we also ensure each JSON document being
 # indexed has an "_id" field, so we can tell when we are indexing duplicate
 # data.
@@ -539,9 +750,19 @@ _read_timeout = 100000 * 60.0
 _request_timeout = 100000 * 60.0
 
 
-def es_index(es, actions, errorsfp, logger, _dbg=0):
+def es_index(
+    es,
+    actions,
+    errorsfp,
+    logger,
+    _dbg=0,
+    in_flight=0,
+    chunk_docs=DEFAULT_CHUNK_DOCS,
+    chunk_bytes=DEFAULT_CHUNK_BYTES,
+    checkpoint=None,
+):
     """
-    es_index Encapsulate the interface to the pyesbulk module index code.
+    es_index Encapsulate the interface to the bulk index code.
 
     Args:
         es ([Elasticsearch]): An Elasticsearch object instance from either
@@ -550,12 +771,216 @@ def es_index(es, actions, errorsfp, logger, _dbg=0):
         actions ([type]): Elasticsearch bulk index action tuples
         errorsfp ([type]): A file pointer for error reporting
         logger ([type]): Standard logging object for use by bulk indexer
+        in_flight (int): The maximum number of bulk requests in flight at
+            one time; when zero, the pyesbulk module's streaming bulk
+            indexer is used, otherwise the pipelined bulk indexer (see
+            pbench.server.bulk) is used
+        chunk_docs (int): The maximum number of documents in one bulk
+            request of the pipelined bulk indexer
+        chunk_bytes (int): The maximum size, in bytes, of one bulk request
+            of the pipelined bulk indexer
+        checkpoint (IndexCheckpoint): The checkpoint recording the units of
+            the actions completely indexed, only used with the pipelined
+            bulk indexer
 
     Returns:
         tuple of (start time, end time, indexed count, duplicate count, failed
         count, and retries)
     """
-    return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    if in_flight <= 0:
+        return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    bulk = PipelinedBulk(
+        es,
+        errorsfp,
+        logger,
+        in_flight=in_flight,
+        chunk_docs=chunk_docs,
+        chunk_bytes=chunk_bytes,
+        progress=None if checkpoint is None else checkpoint.progress,
+        failed=None if checkpoint is None else checkpoint.failed,
+    )
+    es_res = bulk.run(actions)
+    if checkpoint is not None:
+        # Every action has now been handled.
+        checkpoint.progress(bulk.next_seq)
+    return es_res
+
+
+# JSON encoder whose output is identical to json.dumps(obj, sort_keys=True),
+# without constructing a new encoder for each call.
+_json_sorted = json.JSONEncoder(sort_keys=True)
+
+
+def max_rss_kb():
+    """Return the peak resident set size, in KiB, of this process and of the
+    largest of its terminated child processes (e.g. worker processes).
+    """
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+class PhaseMetrics:
+    """Accumulate the time spent in each phase of indexing a tar ball, along
+    with the number of documents generated, and the number of bytes of data
+    read, by the phase.
+
+    Phases may be nested (e.g. the "sosreports" phase happens during the
+    "run" phase), so the times of all the phases do not add up to the total.
+    """
+
+    def __init__(self, time):
+        self.time = time
+        # Map of phase name to [seconds, documents, bytes].
+        self.phases = _dict_const()
+
+    def add(self, name, seconds, docs=0, nbytes=0):
+        try:
+            phase = self.phases[name]
+        except KeyError:
+            phase = self.phases[name] = [0.0, 0, 0]
+        phase[0] += seconds
+        phase[1] += docs
+        phase[2] += nbytes
+
+    def seconds(self, name):
+        try:
+            return self.phases[name][0]
+        except KeyError:
+            return 0.0
+
+    def timed(self, name, items, nbytes=0):
+        """Generate the given items, adding the time spent generating them,
+        but not the time spent by the caller handling them, and their
+        number, to the named phase.
+        """
+        time = self.time
+        items = iter(items)
+        seconds = 0.0
+        docs = 0
+        try:
+            while True:
+                beg = time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time() - beg
+                docs += 1
+                yield item
+        finally:
+            self.add(name, seconds, docs, nbytes)
+
+    def as_list(self):
+        """Return the phases as a list of dictionaries, including the rate
+        at which documents were generated, and bytes read, by each.
+        """
+        phases = []
+        for name, (seconds, docs, nbytes) in self.phases.items():
+            phase = _dict_const(name=name, seconds=seconds, docs=docs, bytes=nbytes)
+            phase["docs_per_sec"] = docs / seconds if seconds > 0 else None
+            phase["bytes_per_sec"] = nbytes / seconds if seconds > 0 else None
+            phases.append(phase)
+        return phases
+
+    def opctx(self, tbname):
+        """Return the operational context entry recording these metrics for
+        the given tar ball, along with the peak RSS so far.
+        """
+        return _dict_const(
+            tbname=tbname,
+            object="metrics",
+            counters=_dict_const(),
+            phases=self.as_list(),
+            max_rss_kb=max_rss_kb(),
+        )
+
+
+def summarize_metrics(opctx):
+    """Return the totals of each phase of the metrics entries of the given
+    operational context, along with the number of tar balls and the peak RSS.
+    """
+    totals = PhaseMetrics(None)
+    tarballs = 0
+    rss = max_rss_kb()
+    for ctx in opctx:
+        if ctx["object"] != "metrics":
+            continue
+        tarballs += 1
+        rss = max(rss, ctx["max_rss_kb"])
+        for phase in ctx["phases"]:
+            totals.add(phase["name"], phase["seconds"], phase["docs"], phase["bytes"])
+    return _dict_const(tarballs=tarballs, max_rss_kb=rss, phases=totals.as_list())
+
+
+def _add_json_field(source_json, key, value):
+    """Return the given JSON form of a document, as constructed by
+    PbenchData.make_source_json(), with the given top-level field added (e.g.
+    a field which does not contribute to the document's source ID).
+    """
+    field = f"{encode_basestring_ascii(key)}: {_json_sorted.encode(value)}"
+    if source_json == b"{}":
+        return b"{" + field.encode("utf-8") + b"}"
+    return b"{" + field.encode("utf-8") + b", " + source_json[1:]
+
+
+class SourceIdHasher:
+    """Construct source IDs for documents which all embed the same metadata
+    objects (e.g. the "run", "iteration", and "sample" metadata of tool data
+    documents), without converting those objects to JSON for every document.
+
+    The IDs are identical to those constructed by
+    PbenchData.make_source_id(): the JSON form of a document, its keys
+    sorted, is assembled from the JSON form of each of its top-level values,
+    using the cached JSON form of any value which is one of the shared
+    objects given to the constructor.  The shared objects must not be
+    modified after the hasher is constructed.
+    """
+
+    def __init__(self, *shared):
+        # Map of the id() of each shared object to the object itself (which
+        # also keeps the object, and therefore its id(), alive) and its JSON
+        # form.
+        self._shared = {id(obj): (obj, _json_sorted.encode(obj)) for obj in shared}
+        # Map of the top-level key names seen so far to their JSON form.
+        self._keys = {}
+
+    def make_source_id(self, source):
+        """Construct the source ID (MD5 value) of the given document.
+        """
+        return self.make_source_json(source)[0]
+
+    def make_source_json(self, source):
+        """Construct the source ID (MD5 value) of the given document, along
+        with the JSON form of the document (as bytes) from which it was
+        computed (see PbenchData.make_source_json()).
+        """
+        if not isinstance(source, dict):
+            return PbenchData.make_source_json(source)
+        parts = []
+        for key in sorted(source):
+            prefix = self._keys.get(key)
+            if prefix is None:
+                if not isinstance(key, str):
+                    # Let the JSON encoder deal with converting keys which
+                    # are not strings.
+                    return PbenchData.make_source_json(source)
+                prefix = self._keys[key] = f"{encode_basestring_ascii(key)}: "
+            val = source[key]
+            if type(val) is str:
+                # Encode plain strings (e.g. time stamps) directly, avoiding
+                # the overhead of the encoder for a single value.
+                parts.append(prefix + encode_basestring_ascii(val))
+                continue
+            cached = self._shared.get(id(val))
+            if cached is not None and cached[0] is val:
+                parts.append(prefix + cached[1])
+            else:
+                parts.append(prefix + _json_sorted.encode(val))
+        the_bytes = f"{{{', '.join(parts)}}}".encode("utf-8")
+        return hashlib.md5(the_bytes).hexdigest(), the_bytes
 
 
 class PbenchData:
@@ -564,6 +989,7 @@ class PbenchData:
     The following generic methods are not intended to be overridden:
 
         * make_source_id()
+        * make_source_json()
         * mk_abs_timestamp_millis()
         * generate_index_name()
 
@@ -611,8 +1037,21 @@ class PbenchData:
         """Construct a source ID (MD5 value) by first converting the python object to
         JSON, and then computing the hash of the resulting string.
         """
-        the_bytes = json.dumps(source, sort_keys=True).encode("utf-8")
-        return hashlib.md5(the_bytes).hexdigest()
+        return PbenchData.make_source_json(source)[0]
+
+    @staticmethod
+    def make_source_json(source):
+        """Construct a source ID (MD5 value) as make_source_id() does, returning
+        it along with the JSON form of the python object (as bytes) from which
+        it was computed.
+
+        The JSON form is a valid document body for a bulk request, so it is
+        used as is when the bulk indexer is given serialized documents (see
+        IdxContext.raw_sources), instead of converting the document to JSON a
+        second time.
+        """
+        the_bytes = _json_sorted.encode(source).encode("utf-8")
+        return hashlib.md5(the_bytes).hexdigest(), the_bytes
 
     def mk_abs_timestamp_millis(self, orig_ts):
         """Convert the given millis since the epoch relative or absolute
@@ -631,6 +1070,11 @@ class PbenchData:
                 " epoch: {}".format(orig_ts, e)
             )
         ts_float = orig_ts_float / 1000
+        if self.ptb.start_run_epoch < ts_float < self.ptb.end_run_epoch:
+            # The common case of a time stamp strictly within the run (NaN
+            # and infinite values never compare as such) needs no further
+            # checks.
+            return _fmt_epoch_ts(ts_float)
         try:
             ts = datetime.utcfromtimestamp(ts_float)
         except Exception as e:
@@ -687,6 +1131,34 @@ class PbenchData:
             )
         return ts.strftime(_STD_DATETIME_FMT)
 
+    def mk_abs_timestamps_millis(self, orig_ts_list):
+        """Convert the given list of millis since the epoch relative or
+        absolute timestamps, e.g. the timestamp column of a block of rows, to
+        absolute ISO string timestamps (see mk_abs_timestamp_millis()).
+
+        Only the common case of a timestamp strictly within the run is
+        converted here.  Returns a list of the same length holding either the
+        converted timestamp, or None for any other timestamp (including a
+        missing one, given as None), which the caller converts with
+        mk_abs_timestamp_millis() when it reaches that timestamp.  That way
+        the error counters only account for the timestamps actually consumed,
+        and any documents for the preceding timestamps are still emitted.
+        """
+        start_epoch = self.ptb.start_run_epoch
+        end_epoch = self.ptb.end_run_epoch
+        results = []
+        for orig_ts in orig_ts_list:
+            try:
+                ts_float = float(orig_ts) / 1000
+            except Exception:
+                results.append(None)
+            else:
+                if start_epoch < ts_float < end_epoch:
+                    results.append(_fmt_epoch_ts(ts_float))
+                else:
+                    results.append(None)
+        return results
+
     def generate_index_name(self, template_name, source, toolname=None):
         """Return a fully formed index name given its template, prefix, source
         data (for an @timestamp field) and an optional tool name."""
@@ -742,11 +1214,7 @@ class ResultData(PbenchData):
         Fetch the list of directories containing result.json files for this
         experiment; return a list directory path names.
         """
-        paths = [
-            x.name
-            for x in ptb.members
-            if x.isfile() and (os.path.basename(x.name) == "result.json")
-        ]
+        paths = ptb.index.files_named("result.json")
         dirnames = []
         for p in paths:
             dirnames.append(os.path.dirname(p))
@@ -1083,9 +1551,9 @@ class ResultData(PbenchData):
                     ]
                 )
                 # Yield the result-data-sample document.
-                _id = PbenchData.make_source_id(source)
+                _id, _json = PbenchData.make_source_json(source)
                 _parent = _id
-                yield source, _id, None, "sample"
+                yield source, _id, None, "sample", _json
 
                 # Construct the result-data document.
                 sample_md = base_sample_md
@@ -1111,8 +1579,8 @@ class ResultData(PbenchData):
                     ]
                 )
                 # Yield the result-data document.
-                _id = PbenchData.make_source_id(source)
-                yield source, _id, _parent, "res"
+                _id, _json = PbenchData.make_source_json(source)
+                yield source, _id, _parent, "res", _json
         return
 
     # Set of supported benchmarks using result.json files.
@@ -1280,13 +1748,11 @@ class ResultData(PbenchData):
 
             result_json = os.path.join(self.ptb.extracted_root, dirname, "result.json")
             try:
-                # Read the file and interpret it as a JSON document.
-                with open(result_json) as fp:
-                    results = json.load(fp)
+                fp = open(result_json)
             except Exception as e:
                 self.logger.warning(
                     "result-data-indexing: encountered invalid JSON file,"
-                    " {}: {:r} ({})",
+                    " {}: {!r} ({})",
                     result_json,
                     e,
                     self.ptb._tbctx,
@@ -1294,88 +1760,104 @@ class ResultData(PbenchData):
                 self.counters["not_valid_json_file"] += 1
                 continue
 
-            # The outer results object should be an array of iterations. Probe
-            # to see if that is true.
-            if not isinstance(results, list):
-                self.logger.warning(
-                    "result-data-indexing: encountered unexpected"
-                    " JSON file format, %s ({})",
-                    result_json,
-                    self.ptb._tbctx,
-                )
-                continue
-
-            for iteration in results:
-                try:
-                    iter_number = iteration["iteration_number"]
-                    iter_name = iteration["iteration_name"]
-                    iter_data = iteration["iteration_data"]
-                except KeyError:
+            with fp:
+                # The outer results object should be an array of iterations,
+                # which are decoded one at a time so that only a single
+                # iteration, and not the entire file, is held in memory.
+                results = JsonArrayReader(fp)
+                if not results.is_array() and results.error is None:
                     self.logger.warning(
-                        "result-data-indexing: could not find"
-                        " iteration data in JSON file, {} ({})",
+                        "result-data-indexing: encountered unexpected"
+                        " JSON file format, %s ({})",
                         result_json,
                         self.ptb._tbctx,
                     )
-                    self.counters["missing_iteration"] += 1
                     continue
-                try:
-                    iter_name_fmt = iteration["iteration_name_format"]
-                except KeyError:
-                    iter_name_fmt = None
-                # Validate the iteration name by looking for the iteration
-                # directory on disk.
-                if iter_name_fmt:
+                for iteration in results:
                     try:
-                        iter_name = iter_name_fmt % (int(iter_number), iter_name)
-                    except (ValueError, TypeError) as exc:
-                        self.logger.warning(
-                            "result-data-indexing: encountered bad"
-                            " iteration name format '{}' in JSON file,"
-                            " {}: {} ({})",
-                            iteration["iteration_name_format"],
-                            result_json,
-                            exc,
-                            self.ptb._tbctx,
-                        )
-                        self.counters["bad_iteration_name_fmt"] += 1
-                        continue
-                    iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
-                    if not os.path.isdir(iter_dir):
+                        iter_number = iteration["iteration_number"]
+                        iter_name = iteration["iteration_name"]
+                        iter_data = iteration["iteration_data"]
+                    except KeyError:
                         self.logger.warning(
-                            "result-data-indexing: formatted iteration"
-                            " name '{}' in JSON file, {}, does not"
-                            " exist as a directory ({})",
-                            iter_name,
+                            "result-data-indexing: could not find"
+                            " iteration data in JSON file, {} ({})",
                             result_json,
                             self.ptb._tbctx,
                         )
-                        self.counters["bad_iteration_name"] += 1
+                        self.counters["missing_iteration"] += 1
                         continue
-                else:
-                    iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
-                    if not os.path.isdir(iter_dir):
-                        iter_name = "{:d}-{}".format(iter_number, iter_name)
+                    try:
+                        iter_name_fmt = iteration["iteration_name_format"]
+                    except KeyError:
+                        iter_name_fmt = None
+                    # Validate the iteration name by looking for the iteration
+                    # directory on disk.
+                    if iter_name_fmt:
+                        try:
+                            iter_name = iter_name_fmt % (int(iter_number), iter_name)
+                        except (ValueError, TypeError) as exc:
+                            self.logger.warning(
+                                "result-data-indexing: encountered bad"
+                                " iteration name format '{}' in JSON file,"
+                                " {}: {} ({})",
+                                iteration["iteration_name_format"],
+                                result_json,
+                                exc,
+                                self.ptb._tbctx,
+                            )
+                            self.counters["bad_iteration_name_fmt"] += 1
+                            continue
                         iter_dir = os.path.join(
                             self.ptb.extracted_root, dirname, iter_name
                         )
                         if not os.path.isdir(iter_dir):
                             self.logger.warning(
-                                "result-data-indexing: encountered bad"
-                                " iteration name '{}' in JSON file, {},"
-                                " does not exist as a directory ({})",
-                                iteration["iteration_name"],
+                                "result-data-indexing: formatted iteration"
+                                " name '{}' in JSON file, {}, does not"
+                                " exist as a directory ({})",
+                                iter_name,
                                 result_json,
                                 self.ptb._tbctx,
                             )
                             self.counters["bad_iteration_name"] += 1
                             continue
-                # Generate JSON documents for each iteration using the
-                # iteration metadata name and number.
-                for src, _id, _parent, _type in self._handle_iteration(
-                    iter_data, iter_name, iter_number, result_json
-                ):
-                    yield src, _id, _parent, _type
+                    else:
+                        iter_dir = os.path.join(
+                            self.ptb.extracted_root, dirname, iter_name
+                        )
+                        if not os.path.isdir(iter_dir):
+                            iter_name = "{:d}-{}".format(iter_number, iter_name)
+                            iter_dir = os.path.join(
+                                self.ptb.extracted_root, dirname, iter_name
+                            )
+                            if not os.path.isdir(iter_dir):
+                                self.logger.warning(
+                                    "result-data-indexing: encountered bad"
+                                    " iteration name '{}' in JSON file, {},"
+                                    " does not exist as a directory ({})",
+                                    iteration["iteration_name"],
+                                    result_json,
+                                    self.ptb._tbctx,
+                                )
+                                self.counters["bad_iteration_name"] += 1
+                                continue
+                    # Generate JSON documents for each iteration using the
+                    # iteration metadata name and number.
+                    for src, _id, _parent, _type, _json in self._handle_iteration(
+                        iter_data, iter_name, iter_number, result_json
+                    ):
+                        yield src, _id, _parent, _type, _json
+            if results.error is not None:
+                # Any iterations before the error have been handled.
+                self.logger.warning(
+                    "result-data-indexing: encountered invalid JSON file,"
+                    " {}: {!r} ({})",
+                    result_json,
+                    results.error,
+                    self.ptb._tbctx,
+                )
+                self.counters["not_valid_json_file"] += 1
         return
 
     def _handle_iteration(self, iter_data, iter_name, iter_number, result_json):
@@ -1542,7 +2024,8 @@ class ResultData(PbenchData):
         for source, _parent, _type in ResultData.gen_sources(
             self, iter_data, iteration, self.mk_abs_timestamp_millis
         ):
-            yield source, PbenchData.make_source_id(source), _parent, _type
+            _id, _json = PbenchData.make_source_json(source)
+            yield source, _id, _parent, _type, _json
 
     # UID keyword pattern
     _uid_keyword_pat = re.compile(r"%\w*?%")
@@ -2169,6 +2652,132 @@ _aliases = {
     "disk_Wait_Time.csv": "disk_Wait_Time_msec.csv",
 }
 
+# Regular expression matching a pattern which only matches one literal file
+# name, e.g. r"^disk_IOPS\.csv$", capturing the escaped literal name.
+_literal_pat = re.compile(r"\^((?:[^\\.^$*+?()\[\]{}|]|\\[^A-Za-z0-9])*)\$")
+_unescape_pat = re.compile(r"\\(.)")
+_named_group_pat = re.compile(r"\(\?P<\w+>")
+
+
+class ToolHandlerDispatch:
+    """The handler of a tool, compiled for looking up the handler record (an
+    entry of its "patterns" list) matching a given data file name.
+
+    Patterns which only match a literal file name are placed in a dictionary
+    keyed by that name, and all the others are combined into one regular
+    expression of alternatives, one per pattern, so that the handler record
+    found is always the first matching one of the "patterns" list, as if
+    each pattern was tried in turn.  Patterns compiled with flags (or with
+    inline flags), which would be lost or would apply to every alternative
+    of the combined regular expression, are instead tried one at a time,
+    when they come before the pattern found otherwise.  The handler record
+    found for each file name is remembered, as the same file names are found
+    for each host of each sample of each iteration.
+    """
+
+    def __init__(self, handler, aliases=None):
+        self.handler = handler
+        self.aliases = aliases if aliases is not None else {}
+        self.records = handler.get("patterns", [])
+        self.exact = {}
+        # The (index, pattern) of each pattern with flags, in order.
+        self.flagged = []
+        alternatives = []
+        for idx, rec in enumerate(self.records):
+            pattern = rec["pattern"]
+            if pattern.flags & ~re.UNICODE:
+                self.flagged.append((idx, pattern))
+                continue
+            m = _literal_pat.fullmatch(pattern.pattern)
+            if m:
+                self.exact.setdefault(_unescape_pat.sub(r"\1", m.group(1)), idx)
+            else:
+                # Only the alternative matched is of interest, so any named
+                # groups of the pattern become non-capturing groups, as the
+                # same name can't be used in more than one alternative.
+                alternatives.append(
+                    "(?P<_{:d}>{})".format(
+                        idx, _named_group_pat.sub("(?:", pattern.pattern)
+                    )
+                )
+        self.combined = re.compile("|".join(alternatives)) if alternatives else None
+        self._found = {}
+
+    def _match_idx(self, fname):
+        idx = self.exact.get(fname)
+        if self.combined is not None:
+            m = self.combined.match(fname)
+            if m is not None:
+                regex_idx = int(m.lastgroup[1:])
+                if idx is None or regex_idx < idx:
+                    idx = regex_idx
+        for flagged_idx, pattern in self.flagged:
+            if idx is not None and flagged_idx > idx:
+                break
+            if pattern.match(fname):
+                idx = flagged_idx
+                break
+        return idx
+
+    def match(self, fname):
+        """Return the handler record matching the given file name, or None.
+        """
+        idx = self._match_idx(fname)
+        return None if idx is None else self.records[idx]
+
+    def lookup(self, fname):
+        """Return the handler record matching the given file name, or the
+        name it is an alias of, or None if there is no such handler record.
+        """
+        try:
+            return self._found[fname]
+        except KeyError:
+            pass
+        rec = self.match(fname)
+        if rec is None:
+            try:
+                alias_name = self.aliases[fname]
+            except KeyError:
+                pass
+            else:
+                rec = self.match(alias_name)
+        self._found[fname] = rec
+        return rec
+
+
+def compile_tool_handlers():
+    """Return a dictionary mapping each known tool name to its compiled
+    handler, see ToolHandlerDispatch (None for known tools which we don't
+    index).
+    """
+    return {
+        tool: (ToolHandlerDispatch(handler, _aliases) if handler is not None else None)
+        for tool, handler in _known_tool_handlers.items()
+    }
+
+
+def register_tool_handler(tool, handler, aliases=None):
+    """Register the handler for the given tool (see _known_tool_handlers
+    above), replacing any existing one, along with any aliases of old data
+    file names to the names of its handler records.
+
+    Handlers have to be registered before the IdxContext is constructed,
+    which compiles the handlers.
+    """
+    if handler is not None:
+        prospectus = handler.get("@prospectus", {})
+        if prospectus.get("handling") not in ("csv", "json", "stdout"):
+            raise ValueError(f"Invalid tool handler for '{tool}': bad @prospectus")
+        for rec in handler.get("patterns", []):
+            if not isinstance(rec.get("pattern"), re.Pattern):
+                raise ValueError(
+                    f"Invalid tool handler for '{tool}': patterns must be"
+                    " compiled regular expressions"
+                )
+    _known_tool_handlers[tool] = handler
+    if aliases:
+        _aliases.update(aliases)
+
 
 def _noop(arg):
     return arg
@@ -2195,12 +2804,13 @@ class ToolData(PbenchData):
         self.sample_metadata = _dict_const(name=sample, hostname=host)
 
         try:
-            self.handler = _known_tool_handlers[tool]
+            dispatch = self.idxctx.tool_handlers[tool]
         except KeyError:
             self.handler = None
             self.files = None
             self.basepath = None
         else:
+            self.handler = dispatch.handler if dispatch is not None else None
             toolsgroup = ptb.run_metadata["toolsgroup"]
             self.run_metadata["toolsgroup"] = toolsgroup
             # Impedance match between host names used when registering tools
@@ -2234,25 +2844,22 @@ class ToolData(PbenchData):
                 # Fetch all the data files as a dictionary containing metadata
                 # about them.
                 basepath = basepath_tmpl.format(hostpath)
-                files = ToolData.get_files(
-                    self.handler, basepath, toolsgroup, tool, ptb
-                )
+                files = ToolData.get_files(dispatch, basepath, toolsgroup, tool, ptb)
             if not files and hostname_s:
                 # Fetch all the data files as a dictionary containing metadata
                 # about them.
                 basepath = basepath_tmpl.format(hostname_s)
-                files = ToolData.get_files(
-                    self.handler, basepath, toolsgroup, tool, ptb
-                )
+                files = ToolData.get_files(dispatch, basepath, toolsgroup, tool, ptb)
             if not files:
                 # Fetch all the data files as a dictionary containing metadata
                 # about them.
                 basepath = basepath_tmpl.format(host)
-                files = ToolData.get_files(
-                    self.handler, basepath, toolsgroup, tool, ptb
-                )
+                files = ToolData.get_files(dispatch, basepath, toolsgroup, tool, ptb)
             self.basepath = basepath
             self.files = files
+        self._hasher = SourceIdHasher(
+            self.run_metadata, self.iteration_metadata, self.sample_metadata
+        )
 
     def _make_source_unified(self):
         """Create one JSON document per identifier, per timestamp from
@@ -2367,8 +2974,8 @@ class ToolData(PbenchData):
                     if subfield not in handler_rec["subfields"]:
                         self.logger.warning(
                             "tool-data-indexing: column header,"
-                            " {:r}, has an unexpected subfield, {:r},"
-                            " expected {:r} subfields, for .csv {} ({})",
+                            " {!r}, has an unexpected subfield, {!r},"
+                            " expected {!r} subfields, for .csv {} ({})",
                             col,
                             subfield,
                             handler_rec["subfields"],
@@ -2407,8 +3014,8 @@ class ToolData(PbenchData):
                             except IndexError:
                                 self.logger.warning(
                                     "tool-data-indexing: handler"
-                                    " metadata, {:r}, not found in column"
-                                    " {:r} using pattern {:r}, for .csv"
+                                    " metadata, {!r}, not found in column"
+                                    " {!r} using pattern {!r}, for .csv"
                                     " '{}' ({})",
                                     handler_rec["metadata"],
                                     col,
@@ -2432,26 +3039,62 @@ class ToolData(PbenchData):
             # all the csv files, reading one row from each of the csv files,
             # returning that as a dictionary of csv file to row read, which
             # in turn is yielded by the generator.
+            #
+            # The rows are read from each csv file a block at a time, which
+            # is much cheaper than reading them one at a time.  A csv file
+            # with fewer rows than the others simply stops contributing rows
+            # once it is exhausted, handling the case of a mismatched number
+            # of rows across all .csv files.
+            readers = [(csvf["basename"], csvf["reader"]) for csvf in self.files]
             idx = 0
             while True:
-                # Read a row from each .csv file
-                rows = _dict_const()
-                for csvf in self.files:
-                    try:
-                        rows[csvf["basename"]] = next(csvf["reader"])
-                    except StopIteration:
-                        # This should handle the case of mismatched number of
-                        # rows across all .csv files. All readers which have
-                        # finished will emit a StopIteration.
-                        pass
-                if not rows:
+                blocks = [
+                    (basename, list(islice(reader, _CSV_BLOCK_ROWS)))
+                    for basename, reader in readers
+                ]
+                nrows = max((len(block) for _, block in blocks), default=0)
+                if nrows == 0:
                     # None of the csv file readers returned any rows to
                     # process, so we're done.
                     break
-                # Yield the one dictionary that contains each newly read row
-                # from all the csv files.
-                yield idx, rows
-                idx += 1
+                block_rows = []
+                for offset in range(nrows):
+                    rows = _dict_const()
+                    for basename, block in blocks:
+                        if offset < len(block):
+                            rows[basename] = block[offset]
+                    block_rows.append(rows)
+                # The timestamp of each row is taken from the "first" csv
+                # file, converted for the entire block at once where
+                # possible.
+                first_rows = [next(iter(rows.values())) for rows in block_rows]
+                ts_vals = self.mk_abs_timestamps_millis(
+                    [row[0] if row else None for row in first_rows]
+                )
+                for rows, ts_val in zip(block_rows, ts_vals):
+                    # Yield the one dictionary that contains each newly read
+                    # row from all the csv files, along with its converted
+                    # timestamp (None if it still has to be converted).
+                    yield idx, rows, ts_val
+                    idx += 1
+
+        # Everything about the documents of a given row which does not
+        # depend on the row is computed once, up front: the leading fields
+        # and metadata of each identifier's tool sub-document, and for each
+        # csv file, the metric class, metric name, and converter along with
+        # the (identifier, subfield) tuple of each column after the
+        # timestamp.
+        toolname = self.toolname
+        tool_protos = []
+        for identifier in identifiers.keys():
+            lead = [] if identifier == "__none__" else [("id", identifier)]
+            tool_protos.append((identifier, lead, metadata.get(identifier)))
+        klasses = list(class_list.keys())
+        column_plans = _dict_const()
+        for fname, mapping in field_mapping.items():
+            klass, metric, converter = metric_mapping[fname]
+            columns = [mapping[idx] for idx in range(1, len(mapping))]
+            column_plans[fname] = (klass, metric, converter, columns)
 
         self.logger.info(
             "tool-data-indexing: tool {}, gen unified begin for {}",
@@ -2460,7 +3103,7 @@ class ToolData(PbenchData):
         )
         prev_first = None
         prev_ts_val = None
-        for idx, rows in rows_generator():
+        for idx, rows, ts_val in rows_generator():
             # Verify timestamps are all the same for this row.
             tstamp = None
             first = None
@@ -2502,11 +3145,15 @@ class ToolData(PbenchData):
             #                        self.toolname: { "id": "id1",
             #                                         "f1": "faz",
             #                                         "f2": "baz" } },
+            #
+            # We keep a reference to the tool sub-document of each
+            # identifier, "tool_docs", to fill in the fields below.
 
             # The timestamp is taken from the "first" timestamp, converted
             # to a floating point value in seconds, and then formatted as a
             # string.
-            ts_val = self.mk_abs_timestamp_millis(first)
+            if ts_val is None:
+                ts_val = self.mk_abs_timestamp_millis(first)
             if prev_ts_val is not None:
                 assert prev_ts_val <= ts_val, (
                     "prev_ts_val (%r, %r) > first (%r, %r)"
@@ -2514,60 +3161,67 @@ class ToolData(PbenchData):
                 )
             prev_first = first
             prev_ts_val = ts_val
+            ts_orig = str(first)
             datum = _dict_const()
-            for identifier in identifiers.keys():
+            tool_docs = {}
+            for identifier, lead, md in tool_protos:
+                tool_doc = _dict_const(lead)
+                tool_doc["@idx"] = idx
+                if md is not None:
+                    tool_doc.update(md)
+                for klass in klasses:
+                    tool_doc[klass] = _dict_const()
+                tool_docs[identifier] = tool_doc
                 datum[identifier] = _dict_const(
                     [
                         # Since they are all the same, we use the first to
                         # generate the real timestamp.
                         ("@timestamp", ts_val),
-                        ("@timestamp_original", str(first)),
+                        ("@timestamp_original", ts_orig),
                         ("run", self.run_metadata),
                         ("iteration", self.iteration_metadata),
                         ("sample", self.sample_metadata),
-                        (self.toolname, _dict_const()),
+                        (toolname, tool_doc),
                     ]
                 )
-                if identifier != "__none__":
-                    datum[identifier][self.toolname]["id"] = identifier
-                datum[identifier][self.toolname]["@idx"] = idx
-                try:
-                    md = metadata[identifier]
-                except KeyError:
-                    pass
-                else:
-                    datum[identifier][self.toolname].update(md)
-                for klass in class_list.keys():
-                    datum[identifier][self.toolname][klass] = _dict_const()
             # Now we can perform the mapping from multiple .csv files to JSON
             # documents using a known field hierarchy (no identifiers in field
             # names) with the identifiers as additional metadata. Note that we
             # are constructing this document just from the current row of data
             # taken from all .csv files (assumes timestamps are the same).
             for fname, row in rows.items():
-                klass, metric, converter = metric_mapping[fname]
-                for idx, val in enumerate(row):
-                    if idx == 0:
-                        continue
-                    # Given an fname and a column offset, return the
-                    # identifier from the header
-                    identifier, subfield = field_mapping[fname][idx]
+                klass, metric, converter, columns = column_plans[fname]
+                if len(row) > len(columns) + 1:
+                    self.logger.warning(
+                        "tool-data-indexing: row {:d} of .csv file {} has more"
+                        " columns than its header, ignoring the extra"
+                        " columns ({})",
+                        idx,
+                        fname,
+                        self.ptb._tbctx,
+                    )
+                    self.counters["csv_row_longer_than_header"] += 1
+                # Each column offset of an fname gives the identifier from
+                # the header, and the converted value of each column of the
+                # row is stored in that identifier's document.
+                for (identifier, subfield), val in zip(
+                    columns, map(converter, islice(row, 1, None))
+                ):
+                    _d = tool_docs[identifier]
                     if klass is not None:
-                        _d = datum[identifier][self.toolname][klass]
-                    else:
-                        _d = datum[identifier][self.toolname]
+                        _d = _d[klass]
                     if subfield:
                         if metric not in _d:
                             _d[metric] = _dict_const()
-                        _d[metric][subfield] = converter(val)
+                        _d[metric][subfield] = val
                     else:
-                        _d[metric] = converter(val)
+                        _d[metric] = val
             # At this point we have fully mapped all data from all .csv files
             # to their proper fields for each identifier. Now we can yield
             # records for each of the identifiers.
             for _id, source in datum.items():
-                source_id = PbenchData.make_source_id(source)
-                yield source, source_id
+                source_id, source_json = self._hasher.make_source_json(source)
+                yield source, source_id, source_json
         self.logger.info(
             "tool-data-indexing: tool {}, end unified for {}",
             self.toolname,
@@ -2575,6 +3229,21 @@ class ToolData(PbenchData):
         )
         return
 
+    def _gen_rows_with_timestamps(self, reader):
+        """Generate each row of the given .csv file reader along with its
+        converted timestamp (None if it still has to be converted, see
+        mk_abs_timestamps_millis()), reading and converting the rows a block
+        at a time.  Empty rows have no timestamp to convert.
+        """
+        while True:
+            block = list(islice(reader, _CSV_BLOCK_ROWS))
+            if not block:
+                break
+            ts_vals = self.mk_abs_timestamps_millis(
+                [row[0] if row else None for row in block]
+            )
+            yield from zip(block, ts_vals)
+
     def _make_source_individual(self):
         """Read .csv files individually, emitting records for each row and
         column coordinate."""
@@ -2613,11 +3282,14 @@ class ToolData(PbenchData):
                 self.toolname,
                 csvf["path"],
             )
-            for row in reader:
+            for row, row_ts_val in self._gen_rows_with_timestamps(reader):
                 for col, val in enumerate(row):
                     # The timestamp column is index zero.
                     if col == 0:
-                        ts_val = self.mk_abs_timestamp_millis(val)
+                        if row_ts_val is None:
+                            ts_val = self.mk_abs_timestamp_millis(val)
+                        else:
+                            ts_val = row_ts_val
                         if prev_ts_val is not None:
                             assert prev_ts_val <= ts_val, (
                                 "prev_ts_val (%r, %r) > ts_val (%r, %r)"
@@ -2642,8 +3314,8 @@ class ToolData(PbenchData):
                         column = header[col]
                         _d[metric][column] = converter(val)
 
-                source_id = PbenchData.make_source_id(datum)
-                yield datum, source_id
+                source_id, source_json = self._hasher.make_source_json(datum)
+                yield datum, source_id, source_json
                 idx += 1
             self.logger.info(
                 "tool-data-indexing: tool {}, individual end {}",
@@ -2683,6 +3355,129 @@ class ToolData(PbenchData):
         }
     }
 
+    @staticmethod
+    def _stdout_records(file_object, chunk_size=_STDOUT_CHUNK_SIZE):
+        """Generate the records of a periodic time stamp stdout file, as a
+        tuple of the text following "timestamp:" on the time stamp line of a
+        record, and the text of the lines following it, up to the next time
+        stamp line (without the final line ending).
+
+        The file is read in large chunks, which are split into records at
+        the time stamp lines in bulk.  Any lines before the first time stamp
+        line are ignored.
+        """
+        tail = ""
+        while True:
+            chunk = file_object.read(chunk_size)
+            if chunk:
+                text = tail + chunk
+                # Only the records before the last time stamp line found are
+                # known to be complete.
+                end = text.rfind("\ntimestamp:")
+                if end < 0:
+                    tail = text
+                    continue
+                text, tail = text[:end], text[end + 1 :]
+            else:
+                text, tail = tail, ""
+                if text.endswith("\n"):
+                    text = text[:-1]
+            records = text.split("\ntimestamp:")
+            if records[0].startswith("timestamp:"):
+                records[0] = records[0][len("timestamp:") :]
+            else:
+                # Lines before the first time stamp line.
+                del records[0]
+            for rec in records:
+                ts_text, _, body = rec.partition("\n")
+                yield ts_text, body
+            if not chunk:
+                break
+
+    @staticmethod
+    def _keyval_plan(keys, remaps):
+        """Return the plan for building the gauge (and rate) fields of a
+        record from the values of the given sequence of keys, or None when
+        the keys can't be handled in bulk (duplicate keys, or a stat name
+        used both with and without substats).
+
+        The plan is a tuple of the list of stat names of the keys without a
+        substat with the list of their positions, and the list of the stat
+        names of the keys with substats, each with the list of its substat
+        names and their positions.
+        """
+        flat_stats = []
+        flat_pos = []
+        nested = _dict_const()
+        for pos, key in enumerate(keys):
+            parts = key.split("_", 1)
+            if len(parts) == 1:
+                stat = key
+                if remaps is not None:
+                    stat = remaps["key"].get(key, key)
+                flat_stats.append(stat)
+                flat_pos.append(pos)
+            else:
+                stat, substat = parts
+                substats, positions = nested.setdefault(stat, ([], []))
+                substats.append(substat)
+                positions.append(pos)
+        if len(set(keys)) != len(keys) or len(set(flat_stats)) != len(flat_stats):
+            return None
+        if not set(flat_stats).isdisjoint(nested):
+            return None
+        return (
+            flat_stats,
+            flat_pos,
+            [(stat, subs, positions) for stat, (subs, positions) in nested.items()],
+        )
+
+    @staticmethod
+    def _keyval_lines(
+        lines, converter, remaps, gauge, rate, ts_orig, prev_ts_orig, prev_gauge
+    ):
+        """Add the key/value pairs of the given lines of a record to its gauge
+        and rate fields, one line at a time.
+        """
+        for line in lines:
+            key, value = line.strip().split(" ")
+            parts = key.split("_", 1)
+            if len(parts) == 1:
+                # For keys that are not split into stat and substat, look
+                # to see if the stat needs to be rename to avoid conflict
+                # with other keys that might share the same prefix.
+                if remaps is not None:
+                    try:
+                        stat = remaps["key"][key]
+                    except KeyError:
+                        stat = key
+                else:
+                    stat = key
+                gauge[stat] = converter(value)
+                if prev_ts_orig:
+                    # Note we don't record the rate on the first value
+                    # encountered.
+                    duration = ts_orig - prev_ts_orig
+                    value_diff = int(value) - prev_gauge[stat]
+                    the_rate = value_diff / duration
+                    rate[stat] = the_rate
+            else:
+                assert len(parts) == 2, "Logic bomb! parts is not parts!"
+                stat = parts[0]
+                substat = parts[1]
+                if stat not in gauge:
+                    gauge[stat] = _dict_const()
+                gauge[stat][substat] = converter(value)
+                if prev_ts_orig:
+                    # Note we don't record the rate on the first value
+                    # encountered.
+                    duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
+                    value_diff = int(value) - prev_gauge[stat][substat]
+                    the_rate = value_diff / duration
+                    if stat not in rate:
+                        rate[stat] = _dict_const()
+                    rate[stat][substat] = the_rate
+
     def _stdout_keyval(self, file_object, converter, path):
         """Process a line of a stdout key/value pair output file, building up the
         record (dict) by adding each key/value pair found, associating them
@@ -2714,6 +3509,12 @@ class ToolData(PbenchData):
         keyN: 100.N
         timestamp: ...
 
+        The file is processed one record at a time (see _stdout_records()).
+        The key/value pairs of a record are split in bulk, and when a record
+        has the same keys as the previous one, which is the common case, its
+        gauge and rate fields are built from the lists of values using the
+        plan computed for those keys (see _keyval_plan()).  Other records
+        are processed one line at a time.
         """
         record = None
         prev_gauge = None
@@ -2725,86 +3526,126 @@ class ToolData(PbenchData):
             remaps = self._remaps[self.toolname]
         except KeyError:
             remaps = None
+        # The keys of the last record processed in bulk, their plan, and their
+        # values.
+        plan_keys = None
+        plan = None
+        prev_keys = None
+        prev_values = None
         idx = 0
         self.logger.info(
             "tool-data-indexing: tool {}, stdout keyval start {}", self.toolname, path
         )
-        for line in file_object:
-            if line.startswith("timestamp:"):
-                prev_ts_orig = ts_orig
-                if record:
-                    # timestamp delimits records, yield last record.
-                    if not record[self.toolname]["rate"]:
-                        # For first record, rate will be empty, so
-                        # don't emit it.
-                        del record[self.toolname]["rate"]
-                    yield record
-                    idx += 1
-                    # Be sure to remember the record we just emitted
-                    # so that it is available for rate calculations.
-                    prev_gauge = record[self.toolname]["gauge"]
-                # Get the second column, the timestamp value, which is
-                # *seconds* since the epoch, and then convert to millis
-                # since the epoch.
-                ts_orig = float(line.split(":")[1])
-                if prev_ts_orig is not None:
-                    assert prev_ts_orig <= ts_orig, "prev_ts_orig %r > ts_orig %r" % (
-                        prev_ts_orig,
-                        ts_orig,
-                    )
-                ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
-                record = _dict_const()
-                record["@timestamp"] = ts_str
-                record["@timestamp_original"] = str(ts_orig)
-                record["run"] = self.run_metadata
-                record["iteration"] = self.iteration_metadata
-                record["sample"] = self.sample_metadata
-                record[self.toolname] = _dict_const()
-                record[self.toolname]["@idx"] = idx
-                record[self.toolname]["gauge"] = gauge = _dict_const()
-                record[self.toolname]["rate"] = rate = _dict_const()
-            elif ts_orig is None:
-                # We have not encountered a timestamp yet, so ignore
-                # all lines until the first timestamp.
+        for ts_text, body in self._stdout_records(file_object):
+            prev_ts_orig = ts_orig
+            if record:
+                # timestamp delimits records, yield last record.
+                if not record[self.toolname]["rate"]:
+                    # For first record, rate will be empty, so
+                    # don't emit it.
+                    del record[self.toolname]["rate"]
+                yield record
+                idx += 1
+                # Be sure to remember the record we just emitted
+                # so that it is available for rate calculations.
+                prev_gauge = record[self.toolname]["gauge"]
+            # Get the second column, the timestamp value, which is
+            # *seconds* since the epoch, and then convert to millis
+            # since the epoch.
+            ts_orig = float(ts_text.split(":")[0])
+            if prev_ts_orig is not None:
+                assert prev_ts_orig <= ts_orig, "prev_ts_orig %r > ts_orig %r" % (
+                    prev_ts_orig,
+                    ts_orig,
+                )
+            ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
+            record = _dict_const()
+            record["@timestamp"] = ts_str
+            record["@timestamp_original"] = str(ts_orig)
+            record["run"] = self.run_metadata
+            record["iteration"] = self.iteration_metadata
+            record["sample"] = self.sample_metadata
+            record[self.toolname] = _dict_const()
+            record[self.toolname]["@idx"] = idx
+            record[self.toolname]["gauge"] = gauge = _dict_const()
+            record[self.toolname]["rate"] = rate = _dict_const()
+            if not body:
+                prev_keys = prev_values = None
                 continue
+            tokens = body.split()
+            if len(tokens) == 2 * (body.count("\n") + 1):
+                keys = tokens[0::2]
+                if keys != plan_keys:
+                    plan_keys = keys
+                    plan = self._keyval_plan(keys, remaps)
             else:
-                key, value = line.strip().split(" ")
-                parts = key.split("_", 1)
-                if len(parts) == 1:
-                    # For keys that are not split into stat and substat, look
-                    # to see if the stat needs to be rename to avoid conflict
-                    # with other keys that might share the same prefix.
-                    if remaps is not None:
-                        try:
-                            stat = remaps["key"][key]
-                        except KeyError:
-                            stat = key
-                    else:
-                        stat = key
-                    gauge[stat] = converter(value)
-                    if prev_ts_orig:
-                        # Note we don't record the rate on the first value
-                        # encountered.
-                        duration = ts_orig - prev_ts_orig
-                        value_diff = int(value) - prev_gauge[stat]
-                        the_rate = value_diff / duration
-                        rate[stat] = the_rate
+                keys = None
+            if keys is None or plan is None:
+                self._keyval_lines(
+                    body.split("\n"),
+                    converter,
+                    remaps,
+                    gauge,
+                    rate,
+                    ts_orig,
+                    prev_ts_orig,
+                    prev_gauge,
+                )
+                prev_keys = prev_values = None
+                continue
+            str_values = tokens[1::2]
+            values = list(map(converter, str_values))
+            flat_stats, flat_pos, nested = plan
+            gauge.update(zip(flat_stats, [values[pos] for pos in flat_pos]))
+            for stat, substats, positions in nested:
+                gauge[stat] = _dict_const(
+                    zip(substats, [values[pos] for pos in positions])
+                )
+            if prev_ts_orig:
+                # Note we don't record the rate on the first values
+                # encountered.
+                if keys != prev_keys:
+                    # Rates against a record with other keys are computed
+                    # one key at a time.
+                    self._keyval_lines(
+                        body.split("\n"),
+                        converter,
+                        remaps,
+                        _dict_const(),
+                        rate,
+                        ts_orig,
+                        prev_ts_orig,
+                        prev_gauge,
+                    )
                 else:
-                    assert len(parts) == 2, "Logic bomb! parts is not parts!"
-                    stat = parts[0]
-                    substat = parts[1]
-                    if stat not in gauge:
-                        gauge[stat] = _dict_const()
-                    gauge[stat][substat] = converter(value)
-                    if prev_ts_orig:
-                        # Note we don't record the rate on the first value
-                        # encountered.
-                        duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
-                        value_diff = int(value) - prev_gauge[stat][substat]
-                        the_rate = value_diff / duration
-                        if stat not in rate:
-                            rate[stat] = _dict_const()
-                        rate[stat][substat] = the_rate
+                    int_values = (
+                        values if converter is int else list(map(int, str_values))
+                    )
+                    duration = ts_orig - prev_ts_orig
+                    rate.update(
+                        zip(
+                            flat_stats,
+                            [
+                                (int_values[pos] - prev_values[pos]) / duration
+                                for pos in flat_pos
+                            ],
+                        )
+                    )
+                    # The rates of substats have always been computed using a
+                    # duration in thousands of seconds.
+                    duration = (ts_orig / 1000) - (prev_ts_orig / 1000)
+                    for stat, substats, positions in nested:
+                        rate[stat] = _dict_const(
+                            zip(
+                                substats,
+                                [
+                                    (int_values[pos] - prev_values[pos]) / duration
+                                    for pos in positions
+                                ],
+                            )
+                        )
+            prev_keys = keys
+            prev_values = values
         if record and record[self.toolname]["gauge"]:
             yield record
         self.logger.info(
@@ -2822,100 +3663,109 @@ class ToolData(PbenchData):
         NMI:          0          0          0          0   Non-maskable interrupts
         LOC:      48687      45068      40188      65602   Local timer interrupts
         SPU:          0          0          0          0   Spurious interrupts
+
+        The file is processed one record at a time (see _stdout_records()),
+        and the documents for each CPU of an interrupt line are copied from
+        the fields they share with the other documents of the same record.
         """
         cpu_column_ids = None
         cpu_count = None
-        ts_str = None
+        header = None
         ts_orig = None
         prev_ts_orig = None
         prev_gauges = _dict_const()
+        toolname = self.toolname
         idx = 0
         self.logger.info(
             "tool-data-indexing: tool {}, stdout procint start {}", self.toolname, path
         )
-        for line in file_object:
-            if line.startswith("timestamp:"):
-                idx += 1
-                prev_ts_orig = ts_orig
-                # Get the second column, the timestamp value, which is
-                # *seconds* since the epoch, and then convert to millis
-                # since the epoch.
-                ts_orig = float(line.split(":")[1])
-                if prev_ts_orig is not None:
-                    assert prev_ts_orig <= ts_orig, "prev_ts_orig %r > ts_orig %r" % (
-                        prev_ts_orig,
-                        ts_orig,
-                    )
-                ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
-                # The next line is assumed to be the header, so instead of
-                # looping to get to it, we just pull it out and process it
-                # here.
-                header = next(file_object)
-                columns = header.split()
+        for ts_text, body in self._stdout_records(file_object):
+            idx += 1
+            prev_ts_orig = ts_orig
+            # Get the second column, the timestamp value, which is
+            # *seconds* since the epoch, and then convert to millis
+            # since the epoch.
+            ts_orig = float(ts_text.split(":")[0])
+            if prev_ts_orig is not None:
+                assert prev_ts_orig <= ts_orig, "prev_ts_orig %r > ts_orig %r" % (
+                    prev_ts_orig,
+                    ts_orig,
+                )
+                duration = ts_orig - prev_ts_orig
+            ts_str = self.mk_abs_timestamp_millis(ts_orig * 1000)
+            # The first line is assumed to be the header, which is usually
+            # the same for every record.
+            lines = body.split("\n")
+            if lines[0] != header:
+                header = lines[0]
                 cpu_column_ids = []
-                for cpu in columns:
+                for cpu in header.split():
                     if not cpu.startswith("CPU"):
                         raise Exception(
                             "Bad proc-interrupts-stdout.txt file encountered"
                         )
                     cpu_column_ids.append(cpu[3:])
                 cpu_count = len(cpu_column_ids)
-                continue
-            parts = line[:-1].split(None, 1 + cpu_count)
-            int_id = parts[0][:-1]
-            if int_id in ("ERR", "MIS"):
-                record = _dict_const()
-                record["@timestamp"] = ts_str
-                record["@timestamp_original"] = str(ts_orig)
-                record["run"] = self.run_metadata
-                record["iteration"] = self.iteration_metadata
-                record["sample"] = self.sample_metadata
-                record[self.toolname] = _dict_const()
-                record[self.toolname]["@idx"] = idx
-                record[self.toolname]["int_id"] = int_id
-                record[self.toolname]["gauge"] = value = converter(parts[1])
-                if int_id in prev_gauges:
-                    duration = ts_orig - prev_ts_orig
-                    value_diff = value - prev_gauges[int_id]
-                    the_rate = value_diff / duration
-                    record[self.toolname]["rate"] = the_rate
-                prev_gauges[int_id] = value
-                yield record
-            else:
+            base = _dict_const()
+            base["@timestamp"] = ts_str
+            base["@timestamp_original"] = str(ts_orig)
+            base["run"] = self.run_metadata
+            base["iteration"] = self.iteration_metadata
+            base["sample"] = self.sample_metadata
+            base[toolname] = None
+            for line in islice(lines, 1, None):
+                parts = line.split(None, 1 + cpu_count)
+                int_id = parts[0][:-1]
+                if int_id in ("ERR", "MIS"):
+                    record = base.copy()
+                    record[toolname] = _dict_const()
+                    record[toolname]["@idx"] = idx
+                    record[toolname]["int_id"] = int_id
+                    record[toolname]["gauge"] = value = converter(parts[1])
+                    if int_id in prev_gauges:
+                        value_diff = value - prev_gauges[int_id]
+                        the_rate = value_diff / duration
+                        record[toolname]["rate"] = the_rate
+                    prev_gauges[int_id] = value
+                    yield record
+                    continue
+                if len(parts) <= cpu_count:
+                    raise Exception("Bad proc-interrupts-stdout.txt file encountered")
                 desc_str = parts[-1]
-                col = 1
+                cpu_gauges = list(map(converter, parts[1 : cpu_count + 1]))
+                # The fields shared by the documents of each CPU, with all the
+                # other fields in place (so that the copy of each document
+                # never needs to grow).
+                shared = _dict_const()
+                shared["@idx"] = idx
+                shared["int_id"] = int_id
+                shared["cpu_id"] = None
+                shared["desc"] = desc_str
+                shared["gauge"] = None
                 records = []
-                cpu_gauges = []
-                for cpu in cpu_column_ids:
-                    val = converter(parts[col])
-                    col += 1
-                    record = _dict_const()
-                    record["@timestamp"] = ts_str
-                    record["@timestamp_original"] = str(ts_orig)
-                    record["run"] = self.run_metadata
-                    record["iteration"] = self.iteration_metadata
-                    record["sample"] = self.sample_metadata
-                    record[self.toolname] = _dict_const()
-                    record[self.toolname]["@idx"] = idx
-                    record[self.toolname]["int_id"] = int_id
-                    record[self.toolname]["cpu_id"] = cpu
-                    record[self.toolname]["desc"] = desc_str
-                    record[self.toolname]["gauge"] = val
-                    records.append(record)
-                    cpu_gauges.append(val)
-                if int_id in prev_gauges:
-                    prev_cpu_gauges = prev_gauges[int_id]
-                    col = 0
-                    duration = ts_orig - prev_ts_orig
-                    for record in records:
-                        value_diff = (
-                            record[self.toolname]["gauge"] - prev_cpu_gauges[col]
-                        )
-                        the_rate = value_diff / duration
-                        record[self.toolname]["rate"] = the_rate
+                if int_id in prev_gauges and cpu_gauges:
+                    # The rate of every CPU is computed against the previous
+                    # gauge of the first CPU, as it always has been.
+                    prev_gauge = prev_gauges[int_id][0]
+                    shared["rate"] = None
+                    for cpu, val in zip(cpu_column_ids, cpu_gauges):
+                        fields = shared.copy()
+                        fields["cpu_id"] = cpu
+                        fields["gauge"] = val
+                        fields["rate"] = (val - prev_gauge) / duration
+                        record = base.copy()
+                        record[toolname] = fields
+                        records.append(record)
+                else:
+                    for cpu, val in zip(cpu_column_ids, cpu_gauges):
+                        fields = shared.copy()
+                        fields["cpu_id"] = cpu
+                        fields["gauge"] = val
+                        record = base.copy()
+                        record[toolname] = fields
+                        records.append(record)
                 prev_gauges[int_id] = cpu_gauges
-                for record in records:
-                    yield record
+                yield from records
         self.logger.info(
             "tool-data-indexing: tool {}, stdout procint end {}", self.toolname, path
         )
@@ -2960,8 +3810,17 @@ class ToolData(PbenchData):
             path = os.path.join(self.ptb.extracted_root, output_file["path"])
             with open(path, "r") as file_object:
                 for record in func(self, file_object, converter, output_file["path"]):
-                    source_id = PbenchData.make_source_id(record)
-                    yield record, source_id
+                    source_id, source_json = self._hasher.make_source_json(record)
+                    yield record, source_id, source_json
+
+    def _bad_json_file(self, path, exc):
+        self.logger.warning(
+            "tool-data-indexing: encountered bad JSON file, {}: {!r} ({})",
+            path,
+            exc,
+            self.ptb._tbctx,
+        )
+        self.counters["bad_json_file"] += 1
 
     def _make_source_json(self):
         """Process JSON files in the form of an outer JSON array of ready to
@@ -2978,104 +3837,112 @@ class ToolData(PbenchData):
         """
         for df in self.files:
             try:
-                with open(os.path.join(self.ptb.extracted_root, df["path"])) as fp:
-                    payload = json.load(fp)
+                fp = open(os.path.join(self.ptb.extracted_root, df["path"]))
             except Exception as e:
-                self.logger.warning(
-                    "tool-data-indexing: encountered bad JSON file, {}: {:r} ({})",
-                    df["path"],
-                    e,
-                    self.ptb._tbctx,
-                )
-                self.counters["bad_json_file"] += 1
+                self._bad_json_file(df["path"], e)
                 continue
 
-            missing_ts = False
-            invalid_ts = False
-            badrange_ts = False
-            idx = 0
-            self.logger.info(
-                "tool-data-indexing: tool {}, json start {}", self.toolname, df["path"]
-            )
-            for payload_source in payload:
-                try:
-                    ts_val = payload_source["@timestamp"]
-                except KeyError:
-                    # Missing timestamps
-                    if not missing_ts:
-                        # Log the first record with missing timestamps we
-                        # encounter for this file, and then count the rest and
-                        # report the count with the summary of how the
-                        # indexing went.
-                        missing_ts = True
-                        self.logger.warning(
-                            "tool-data-indexing: encountered JSON"
-                            " file, {}, with missing @timestamp fields ({})",
-                            df["path"],
-                            self.ptb._tbctx,
-                        )
-                    self.counters["json_doc_missing_timestamp"] += 1
-                    idx += 1
+            with fp:
+                # The documents are decoded one at a time so that only a single
+                # document, and not the entire file, is held in memory.
+                payload = JsonArrayReader(fp)
+                if not payload.is_array():
+                    self._bad_json_file(
+                        df["path"], payload.error or ValueError("not a JSON array")
+                    )
                     continue
-                else:
-                    del payload_source["@timestamp"]
+                missing_ts = False
+                invalid_ts = False
+                badrange_ts = False
+                idx = 0
+                self.logger.info(
+                    "tool-data-indexing: tool {}, json start {}",
+                    self.toolname,
+                    df["path"],
+                )
+                for payload_source in payload:
+                    try:
+                        ts_val = payload_source["@timestamp"]
+                    except KeyError:
+                        # Missing timestamps
+                        if not missing_ts:
+                            # Log the first record with missing timestamps we
+                            # encounter for this file, and then count the rest and
+                            # report the count with the summary of how the
+                            # indexing went.
+                            missing_ts = True
+                            self.logger.warning(
+                                "tool-data-indexing: encountered JSON"
+                                " file, {}, with missing @timestamp fields ({})",
+                                df["path"],
+                                self.ptb._tbctx,
+                            )
+                        self.counters["json_doc_missing_timestamp"] += 1
+                        idx += 1
+                        continue
+                    else:
+                        del payload_source["@timestamp"]
 
-                # Further timestamp handling
-                try:
-                    # Unix seconds since epoch timestamp as an absolute time
-                    # value.
-                    ts = datetime.utcfromtimestamp(ts_val)
-                except TypeError:
-                    # The timestamp value is not in seconds since the epoch,
-                    # so assume that payload_source[@timestamp] is already in
-                    # the expected format; validate it.
+                    # Further timestamp handling
                     try:
-                        ts = datetime.strptime(ts_val, _STD_DATETIME_FMT)
-                    except ValueError:
-                        if not invalid_ts:
-                            invalid_ts = True
+                        # Unix seconds since epoch timestamp as an absolute time
+                        # value.
+                        ts = datetime.utcfromtimestamp(ts_val)
+                    except TypeError:
+                        # The timestamp value is not in seconds since the epoch,
+                        # so assume that payload_source[@timestamp] is already in
+                        # the expected format; validate it.
+                        try:
+                            ts = datetime.strptime(ts_val, _STD_DATETIME_FMT)
+                        except ValueError:
+                            if not invalid_ts:
+                                invalid_ts = True
+                                self.logger.warning(
+                                    "tool-data-indexing: encountered"
+                                    " JSON file, {}, with invalid @timestamp"
+                                    " fields ({!r}) ({})",
+                                    df["path"],
+                                    ts_val,
+                                    self.ptb._tbctx,
+                                )
+                            self.counters["json_doc_timestamp_not_valid"] += 1
+                            idx += 1
+                            continue
+                    if ts < self.ptb.start_run_ts or ts > self.ptb.end_run_ts:
+                        if not badrange_ts:
+                            badrange_ts = True
                             self.logger.warning(
-                                "tool-data-indexing: encountered"
-                                " JSON file, {}, with invalid @timestamp"
-                                " fields ('{:r}') ({})",
+                                "tool-data-indexing: encountered JSON"
+                                " file, {}, with @timestamp fields out side"
+                                " start/end run time range ({!r}) ({})",
                                 df["path"],
                                 ts_val,
                                 self.ptb._tbctx,
                             )
-                        self.counters["json_doc_timestamp_not_valid"] += 1
+                        self.counters["json_doc_timestamp_out_of_range"] += 1
                         idx += 1
                         continue
-                if ts < self.ptb.start_run_ts or ts > self.ptb.end_run_ts:
-                    if not badrange_ts:
-                        badrange_ts = True
-                        self.logger.warning(
-                            "tool-data-indexing: encountered JSON"
-                            " file, {}, with @timestamp fields out side"
-                            " start/end run time range ({:r}) ({})",
-                            df["path"],
-                            ts_val,
-                            self.ptb._tbctx,
-                        )
-                    self.counters["json_doc_timestamp_out_of_range"] += 1
-                    idx += 1
-                    continue
 
-                source = _dict_const()
-                # Convert the validated timestamp into ISO format.
-                source["@timestamp"] = ts.strftime(_STD_DATETIME_FMT)
-                source["@timestamp_original"] = str(ts_val)
-                # Add the run metadata
-                source["run"] = self.run_metadata
-                source["iteration"] = self.iteration_metadata
-                source["sample"] = self.sample_metadata
-                source[self.toolname] = payload_source
-                source[self.toolname]["@idx"] = idx
-
-                # Any further transformations needed should be done here.
-
-                source_id = PbenchData.make_source_id(source)
-                yield source, source_id
-                idx += 1
+                    source = _dict_const()
+                    # Convert the validated timestamp into ISO format.
+                    source["@timestamp"] = ts.strftime(_STD_DATETIME_FMT)
+                    source["@timestamp_original"] = str(ts_val)
+                    # Add the run metadata
+                    source["run"] = self.run_metadata
+                    source["iteration"] = self.iteration_metadata
+                    source["sample"] = self.sample_metadata
+                    source[self.toolname] = payload_source
+                    source[self.toolname]["@idx"] = idx
+
+                    # Any further transformations needed should be done here.
+
+                    source_id, source_json = self._hasher.make_source_json(source)
+                    yield source, source_id, source_json
+                    idx += 1
+            if payload.error is not None:
+                # Any documents before the error have been handled.
+                self._bad_json_file(df["path"], payload.error)
+                continue
             self.logger.info(
                 "tool-data-indexing: tool {}, json end {}", self.toolname, df["path"]
             )
@@ -3099,8 +3966,40 @@ class ToolData(PbenchData):
             raise Exception("Logic bomb!")
         return gen
 
+    def data_bytes(self):
+        """Return the total size of the data files of this unit of tool data.
+        """
+        nbytes = 0
+        for df in self.files or ():
+            try:
+                nbytes += os.path.getsize(
+                    os.path.join(self.ptb.extracted_root, df["path"])
+                )
+            except OSError:
+                pass
+        return nbytes
+
+    def gen_indexable_sources(self):
+        """Generate the index name, source document, source ID, and source
+        JSON (see PbenchData.make_source_json()) of each document of this
+        unit of tool data, skipping those documents for which an index name
+        cannot be generated.
+        """
+        asource = self.make_source()
+        if not asource:
+            return
+        for source, source_id, source_json in asource:
+            try:
+                idx_name = self.generate_index_name(
+                    "tool-data", source, toolname=self.toolname
+                )
+            except BadDate:
+                pass
+            else:
+                yield idx_name, source, source_id, source_json
+
     @staticmethod
-    def get_csv_files(handler, basepath, toolsgroup, tool, ptb):
+    def get_csv_files(dispatch, basepath, toolsgroup, tool, ptb):
         """
         Fetch the list of .csv files for this tool, fetch their headers, and
         return a dictionary mapping their column headers to their field names.
@@ -3110,32 +4009,11 @@ class ToolData(PbenchData):
         datafiles = []
         for p in paths:
             fname = os.path.basename(p)
-            for rec in handler["patterns"]:
-                if rec["pattern"].match(fname):
-                    handler_rec = rec
-                    break
-            else:
-                # Try an alias
-                try:
-                    alias_name = _aliases[fname]
-                except KeyError:
-                    # Ignore .csv files for which we don't have a handler,
-                    # after checking to see if they might have an alias
-                    # name.
-                    # self.logger.warning("no .csv handler for '{}' ({})\n",
-                    #        fname, p)
-                    continue
-                else:
-                    for rec in handler["patterns"]:
-                        if rec["pattern"].match(alias_name):
-                            handler_rec = rec
-                            break
-                    else:
-                        # Ignore .csv files for which we don't have a handler
-                        # self.logger.warning("no .csv handler for '{}' ({}, {})\n",
-                        #        alias_name, fname, p)
-                        continue
-            assert handler_rec is not None, "Logic bomb! handler_rec is None"
+            handler_rec = dispatch.lookup(fname)
+            if handler_rec is None:
+                # Ignore .csv files for which we don't have a handler, after
+                # checking to see if they might have an alias name.
+                continue
             datafile = _dict_const(path=p, basename=fname, handler_rec=handler_rec)
             datafile["reader"] = reader = csv.reader(
                 open(os.path.join(ptb.extracted_root, p))
@@ -3145,7 +4023,7 @@ class ToolData(PbenchData):
         return datafiles
 
     @staticmethod
-    def get_json_files(handler, basepath, toolsgroup, tool, ptb):
+    def get_json_files(dispatch, basepath, toolsgroup, tool, ptb):
         """
         Fetch the list of json files for this tool, and return a list of dicts
         containing their metadata.
@@ -3160,7 +4038,7 @@ class ToolData(PbenchData):
         return datafiles
 
     @staticmethod
-    def get_stdout_files(handler, basepath, toolsgroup, tool, ptb):
+    def get_stdout_files(dispatch, basepath, toolsgroup, tool, ptb):
         """
         Fetch the stdout file for this tool returning a list of dicts
         containing their metadata.
@@ -3171,11 +4049,7 @@ class ToolData(PbenchData):
         datafiles = []
         for p in paths:
             fname = os.path.basename(p)
-            handler_rec = None
-            for rec in handler["patterns"]:
-                if rec["pattern"].match(fname):
-                    handler_rec = rec
-                    break
+            handler_rec = dispatch.match(fname)
             if handler_rec is not None:
                 datafile = _dict_const(
                     path=p, basename=stdout_file, handler_rec=handler_rec
@@ -3184,21 +4058,25 @@ class ToolData(PbenchData):
         return datafiles
 
     @staticmethod
-    def get_files(handler, basepath, toolsgroup, tool, ptb):
-        if handler is None:
+    def get_files(dispatch, basepath, toolsgroup, tool, ptb):
+        if dispatch is None:
             datafiles = []
-        elif handler["@prospectus"]["handling"] == "csv":
-            datafiles = ToolData.get_csv_files(handler, basepath, toolsgroup, tool, ptb)
-        elif handler["@prospectus"]["handling"] == "json":
+        elif dispatch.handler["@prospectus"]["handling"] == "csv":
+            datafiles = ToolData.get_csv_files(
+                dispatch, basepath, toolsgroup, tool, ptb
+            )
+        elif dispatch.handler["@prospectus"]["handling"] == "json":
             datafiles = ToolData.get_json_files(
-                handler, basepath, toolsgroup, tool, ptb
+                dispatch, basepath, toolsgroup, tool, ptb
             )
-        elif handler["@prospectus"]["handling"] == "stdout":
+        elif dispatch.handler["@prospectus"]["handling"] == "stdout":
             datafiles = ToolData.get_stdout_files(
-                handler, basepath, toolsgroup, tool, ptb
+                dispatch, basepath, toolsgroup, tool, ptb
             )
         else:
-            raise Exception("Logic bomb! %s" % (handler["@prospectus"]["handling"]))
+            raise Exception(
+                "Logic bomb! %s" % (dispatch.handler["@prospectus"]["handling"])
+            )
         datafiles.sort(key=itemgetter("path", "basename"))
         return datafiles
 
@@ -3354,6 +4232,9 @@ def if_ip_from_sosreport(ip_addr_f):
     return ifnames
 
 
+_md5_pat = re.compile(r"^[0-9a-f]{32}$")
+
+
 def find_hostname(a_string):
     ret_val = a_string.find("sos_commands/host/hostname")
     if ret_val < 0:
@@ -3531,6 +4412,103 @@ class Sample:
         self.path = os.path.join(iteration.path, name)
 
 
+# The tar ball whose tool data a worker process indexes, and the queues
+# through which it sends back the documents of each unit, see
+# _tool_data_worker_init().
+_tool_data_worker_ptb = None
+_tool_data_worker_slots = None
+
+# The number of documents a tool data worker process sends back at once, and
+# the number of such chunks of a unit which may be waiting to be consumed by
+# the parent process before the worker blocks.
+_TOOL_DATA_CHUNK_DOCS = 1000
+_TOOL_DATA_CHUNKS_QUEUED = 2
+
+
+def _tool_data_unit_name(unit):
+    """Return the name of the given unit of tool data in a checkpoint.
+    """
+    return "tool-data/{}/{}/{}/{}".format(*unit)
+
+
+def _tool_data_phase_name(unit):
+    """Return the name of the indexing phase of the tool (handler) of the
+    given unit of tool data.
+    """
+    return f"tool-data:{unit[3]}"
+
+
+class _PoolWatch:
+    """Notice the death of any worker process of a multiprocessing Pool.
+
+    A pool starts another worker process in place of one which dies (e.g.
+    killed by the OOM killer), but never completes the task the dead one was
+    running, so waiting for its result would never end.  As the pool only
+    starts worker processes in place of dead ones, one died if any of those
+    seen at first exited, or if any other one appears.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        # The pool's worker processes are not part of its API, but there is
+        # no other way to learn of their death.
+        self.pids = {proc.pid for proc in pool._pool}
+
+    def check(self):
+        """Raise WorkerDied if any worker process of the pool died.
+        """
+        for proc in list(self.pool._pool):
+            if proc.pid not in self.pids or proc.exitcode is not None:
+                raise WorkerDied("A tool data worker process died")
+
+
+def _tool_data_worker_init(ptb, slots):
+    """Record the tar ball, inherited from the parent process, that a tool
+    data worker process generates documents for, and the queues ("slots")
+    used to send them back.
+    """
+    global _tool_data_worker_ptb, _tool_data_worker_slots
+    _tool_data_worker_ptb = ptb
+    _tool_data_worker_slots = slots
+
+
+def _tool_data_worker_sources(unit, slot):
+    """Generate all the documents of one unit of tool data in a worker
+    process, sending them to the parent process through the given slot's
+    queue as lists of at most _TOOL_DATA_CHUNK_DOCS (index name, source,
+    source ID, source JSON) tuples, followed by None.  Returns the error
+    counters of the unit, the time taken, and the number of bytes of tool
+    data.
+
+    Only the form of each document the parent process will index, either
+    the source document or its JSON form, is sent.  The time spent waiting
+    for the parent process to make room in the queue is not counted.
+    """
+    ptb = _tool_data_worker_ptb
+    chunks = _tool_data_worker_slots[slot]
+    # The parent process accounts for each unit's counters itself.
+    ptb.idxctx.opctx = []
+    beg = ptb.idxctx.time()
+    waited = 0
+    td = ToolData(ptb, *unit)
+    raw_sources = ptb.idxctx.raw_sources
+    chunk = []
+    for idx_name, source, source_id, source_json in td.gen_indexable_sources():
+        if raw_sources:
+            chunk.append((idx_name, None, source_id, source_json))
+        else:
+            chunk.append((idx_name, source, source_id, None))
+        if len(chunk) >= _TOOL_DATA_CHUNK_DOCS:
+            put_beg = ptb.idxctx.time()
+            chunks.put(chunk)
+            waited += ptb.idxctx.time() - put_beg
+            chunk = []
+    if chunk:
+        chunks.put(chunk)
+    chunks.put(None)
+    return td.counters, ptb.idxctx.time() - beg - waited, td.data_bytes()
+
+
 class PbenchTarBall:
     """Encapsulation of the data structures representing the contents of a
     pbench tar ball.
@@ -3538,6 +4516,8 @@ class PbenchTarBall:
 
     def __init__(self, idxctx, tbarg, tmpdir, extracted_root):
         self.idxctx = idxctx
+        # The time spent in each phase of indexing this tar ball.
+        self.metrics = PhaseMetrics(idxctx.time)
         self.tbname = tbarg
         self.controller_dir = os.path.basename(os.path.dirname(self.tbname))
         try:
@@ -3547,19 +4527,35 @@ class PbenchTarBall:
             self.controller_name = self.controller_dir
         tb_stat = os.stat(self.tbname)
         mtime = datetime.utcfromtimestamp(tb_stat.st_mtime)
-        self.tb = tarfile.open(self.tbname)
 
         # This is the top-level name of the run - it should be the common
         # first component of every member of the tar ball.
         dirname = os.path.basename(self.tbname)
         self.dirname = dirname[: dirname.rfind(".tar.xz")]
-        # ... but let's make sure ...
+
+        self.extracted_root = extracted_root
+        # The sosreport information, gathered once on first use.
+        self._sosreports = None
+        # The checkpoint of the units of actions completely indexed, if any,
+        # see mk_checkpoint().
+        self.checkpoint = None
+        if not os.path.isdir(os.path.join(self.extracted_root, self.dirname)):
+            raise UnsupportedTarballFormat(
+                '{} - extracted tar ball directory "{}" does not'
+                " exist.".format(
+                    self.tbname, os.path.join(self.extracted_root, self.dirname)
+                )
+            )
+
+        beg = self.idxctx.time()
+        self.members = self._load_members()
+        # ... but let's make sure the dirname is the common first component
+        # ...
         #
         # ... while we are at it, we verify we have a metadata.log file in the
-        # tar ball before we start extracting.
+        # tar ball.
         metadata_log_path = "%s/metadata.log" % (self.dirname)
         metadata_log_found = False
-        self.members = self.tb.getmembers()
         for m in self.members:
             if m.name == metadata_log_path:
                 metadata_log_found = True
@@ -3577,15 +4573,11 @@ class PbenchTarBall:
             raise UnsupportedTarballFormat(
                 '{} - tar ball is missing "{}".'.format(self.tbname, metadata_log_path)
             )
+        # Directory index over the members, shared by all the lookups made
+        # while indexing this tar ball.
+        self.index = MemberIndex(self.members)
+        self.metrics.add("members", self.idxctx.time() - beg)
 
-        self.extracted_root = extracted_root
-        if not os.path.isdir(os.path.join(self.extracted_root, self.dirname)):
-            raise UnsupportedTarballFormat(
-                '{} - extracted tar ball directory "{}" does not'
-                " exist.".format(
-                    self.tbname, os.path.join(self.extracted_root, self.dirname)
-                )
-            )
         # Open the MD5 file of the tar ball and read the MD5 sum from it.
         md5sum = open("%s.md5" % (self.tbname)).read().split()[0]
         # Construct the @metadata and run metadata dictionaries from the
@@ -3631,6 +4623,11 @@ class PbenchTarBall:
         # Normalize all the timestamps
         self.start_run_ts, self.start_run = PbenchTarBall.convert_to_dt(start_run_orig)
         self.end_run_ts, self.end_run = PbenchTarBall.convert_to_dt(end_run_orig)
+        # The start and end of the run as floating point seconds since the
+        # epoch, for quickly checking that a tool data time stamp is within
+        # the run.
+        self.start_run_epoch = (self.start_run_ts - _EPOCH).total_seconds()
+        self.end_run_epoch = (self.end_run_ts - _EPOCH).total_seconds()
         date_ts, date = PbenchTarBall.convert_to_dt(date_orig)
         # At this point, date is a local time value, while start_ and
         # end_run are UTC.  We figure out what the UTC offset is by
@@ -3744,13 +4741,33 @@ class PbenchTarBall:
         # additional context to add.
         self._tbctx = f"{self.controller_dir}/{os.path.basename(tbarg)}({md5sum})"
 
+    def _load_members(self):
+        """Load the list of tar ball members from the tar ball's manifest,
+        written when the tar ball was unpacked, falling back to scanning the
+        extracted tar ball hierarchy when the manifest is missing or can't be
+        used.
+        """
+        try:
+            members = load_manifest(self.tbname)
+        except ManifestError as e:
+            self.idxctx.logger.warning("{}", e)
+            members = None
+        else:
+            if members is None:
+                self.idxctx.logger.info(
+                    "No member manifest for {}, scanning extracted tar ball",
+                    self.tbname,
+                )
+        if members is None:
+            members = scan_extracted_tree(self.extracted_root, self.dirname)
+        return members
+
     def gen_files_by_partial_path(self, path):
-        """Generator for all files in the tar ball which match the given path
-        pattern.
+        """Generator for all files in the tar ball whose names begin with the
+        given partial path (which always starts with the tar ball's top-level
+        directory name).
         """
-        for member in self.members:
-            if member.isfile() and member.name.find(path) >= 0:
-                yield member.name
+        yield from self.index.files_by_prefix(path)
 
     _iter_num_pat = re.compile(r"(?P<num>^[1-9][0-9]*)-")
 
@@ -3776,20 +4793,11 @@ class PbenchTarBall:
             # N.B. Comma-separated list
             iterations_str = self.run_metadata["iterations"]
         except Exception:
-            # Since we don't have the iterations list in the metadata, we run
-            # through the tar ball members looking for directories that are
-            # most likely iterations.
+            # Since we don't have the iterations list in the metadata, we
+            # look through the directories at the top of the tar ball for
+            # those that are most likely iterations.
             iterations = []
-            for member in self.members:
-                if not member.isdir():
-                    # We are only looking for directories
-                    continue
-                path_els = member.name.split("/")
-                if len(path_els) != 2:
-                    # Iteration directory names always have 2 path elements,
-                    # [ '/', '<iteration name>' ].
-                    continue
-                itername = path_els[1]
+            for itername in self.index.subdirs(self.dirname):
                 if self._iter_num_pat.match(itername):
                     # We only recognize iteration names that match this
                     # pattern, as later versions of the pbench-agent have
@@ -3811,18 +4819,7 @@ class PbenchTarBall:
         """Get the list of Sample objects for a given iteration object.
         """
         samples = []
-        for member in self.members:
-            if not member.isdir():
-                # We are only looking for directories
-                continue
-            if member.name.find(f"{iteration.name}/") < 0:
-                continue
-            path_els = member.name.split("/")
-            if len(path_els) != 3:
-                # Sample directory names always have 3 path elements,
-                # [ '/', '<iteration name>', 'sample<number>' ].
-                continue
-            sample = path_els[2]
+        for sample in self.index.subdirs(f"{self.dirname}/{iteration.name}"):
             if sample.startswith("sample"):
                 # Sample directories always begin with 'sample'.
                 samples.append(sample)
@@ -3935,14 +4932,47 @@ class PbenchTarBall:
         result data.
         """
         self.idxctx.logger.debug("start")
-        yield self.mk_run_action()
-        for action in self.mk_toc_actions():
-            yield action
-        for action in self.mk_result_data_actions():
-            yield action
+        metrics = self.metrics
+        yield from self._unit_actions(
+            "run", metrics.timed("run", self._gen_run_action())
+        )
+        yield from self._unit_actions(
+            "toc", metrics.timed("toc", self.mk_toc_actions())
+        )
+        yield from self._unit_actions(
+            "result-data", metrics.timed("result-data", self.mk_result_data_actions())
+        )
         self.idxctx.logger.debug("end")
         return
 
+    def _gen_run_action(self):
+        yield self.mk_run_action()
+
+    def mk_checkpoint(self):
+        """Start recording the units of actions completely indexed in the
+        checkpoint of this tar ball, skipping the units of actions recorded
+        by a previous attempt at indexing it.
+        """
+        key = f"{self.run_metadata['id']}:{self.idxctx.idx_prefix}:{VERSION}"
+        self.checkpoint = IndexCheckpoint(
+            checkpoint_path(self.tbname), key, self.idxctx.logger
+        )
+        if self.checkpoint.done:
+            self.idxctx.logger.info(
+                "resuming {}, skipping {:d} completed units",
+                self._tbctx,
+                len(self.checkpoint.done),
+            )
+        return self.checkpoint
+
+    def _unit_actions(self, unit, actions):
+        """Return the given actions of the named unit, passed through the
+        checkpoint when one is kept.
+        """
+        if self.checkpoint is None:
+            return actions
+        return self.checkpoint.actions(unit, actions)
+
     def mk_run_action(self):
         """Extract metadata from the named tar ball and create an indexing
         action out of them.
@@ -3968,6 +4998,8 @@ class PbenchTarBall:
         # make a simple action for indexing
         pd = PbenchData(self)
         idx_name = pd.generate_index_name("run", source)
+        if self.idxctx.raw_sources:
+            source = _json_sorted.encode(source).encode("utf-8")
         action = _dict_const(
             _op_type=_op_type,
             _index=idx_name,
@@ -3978,7 +5010,12 @@ class PbenchTarBall:
         return action
 
     def mk_sosreports(self):
+        if self._sosreports is not None:
+            # Both the run and the tool data need the sosreports of a tar
+            # ball, but there is no need to examine them twice.
+            return self._sosreports
         self.idxctx.logger.debug("start")
+        beg = self.idxctx.time()
 
         sosreports = [
             x.name
@@ -4003,9 +5040,7 @@ class PbenchTarBall:
                     self._tbctx,
                 )
                 continue
-            ret_val = hostnames_if_ip_from_sosreport(
-                os.path.join(self.extracted_root, sos)
-            )
+            ret_val = self._sosreport_hostnames(sos, md5_val)
             # get hostname (short and FQDN) from sosreport
             d = _dict_const()
             d["name"] = sos
@@ -4016,8 +5051,53 @@ class PbenchTarBall:
                 d["sosreport-error"] = ret_val[1]
             sosreportlist.append(d)
         self.idxctx.logger.debug("end [{:d} sosreports processed]", len(sosreportlist))
+        self.metrics.add("sosreports", self.idxctx.time() - beg)
+        self._sosreports = sosreportlist
         return sosreportlist
 
+    def _sosreport_hostnames(self, sos, md5_val):
+        """Return the result of hostnames_if_ip_from_sosreport() for the given
+        sosreport, from the persistent cache, keyed by the MD5 of the
+        sosreport, if it is there.
+
+        Examining a sosreport requires decompressing all of it, and the same
+        sosreport is seen again each time its tar ball is re-indexed.  Only
+        successful results are cached, so that a sosreport which could not
+        be examined is examined again.  The cache entries are removed by
+        pbench-cull-unpacked-tarballs (see cull_sosreport_cache()).
+        """
+        cache_dir = self.idxctx.sosreport_cache
+        if cache_dir is None or not _md5_pat.match(md5_val):
+            return hostnames_if_ip_from_sosreport(
+                os.path.join(self.extracted_root, sos)
+            )
+        cache_file = cache_dir / f"{md5_val}.json"
+        try:
+            with cache_file.open("r") as fp:
+                status, val = json.load(fp, object_pairs_hook=_dict_const)
+        except (OSError, ValueError, TypeError):
+            pass
+        else:
+            if status == 0:
+                return status, val
+        ret_val = hostnames_if_ip_from_sosreport(os.path.join(self.extracted_root, sos))
+        if ret_val[0] != 0:
+            return ret_val
+        tmp = cache_dir / f"{md5_val}.json.{os.getpid()}"
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w") as fp:
+                json.dump(ret_val, fp)
+            tmp.rename(cache_file)
+        except OSError as e:
+            self.idxctx.logger.warning(
+                "Unable to write sosreport cache {}: {} ({})",
+                cache_file,
+                e,
+                self._tbctx,
+            )
+        return ret_val
+
     def mk_tool_info(self, sos_d):
         """Return a dict containing tool info (local and remote)"""
         self.idxctx.logger.debug("start")
@@ -4097,11 +5177,11 @@ class PbenchTarBall:
         count = 0
         for source in self.gen_toc():
             source["@timestamp"] = tstamp
+            _id = get_md5sum_of_dir(source, self.run_metadata["id"])
+            if self.idxctx.raw_sources:
+                source = _json_sorted.encode(source).encode("utf-8")
             action = _dict_const(
-                _id=get_md5sum_of_dir(source, self.run_metadata["id"]),
-                _op_type=_op_type,
-                _index=idx_name,
-                _source=source,
+                _id=_id, _op_type=_op_type, _index=idx_name, _source=source,
             )
             count += 1
             yield action
@@ -4170,77 +5250,81 @@ class PbenchTarBall:
             ] }
         """
         prefix_l = len(self.dirname)
-        # Note we have to fully populate the dictionary by processing all the
-        # members before we can yield the generated sources for each
-        # directory.
-        toc_dirs = _dict_const()
-        for m in self.members:
+        # Only the path of each directory is gathered up front, so that the
+        # directory documents can be generated in sorted order; the document
+        # for each directory, along with its file entries, is constructed
+        # when it is yielded, so that only one is held at a time.
+        dirs = []
+        for m in self.index.iter_directories():
             # Always strip the prefix
             path = m.name[prefix_l:]
-            if m.isdir():
-                if path == "/" or path == "":
-                    dpath = "/"
-                    name = None
-                    parent = "/"
-                    path_els = []
-                else:
-                    dpath = path[:-1] if path.endswith(os.path.sep) else path
-                    name = os.path.basename(dpath)
-                    parent = os.path.dirname(dpath)
-                    path_els = dpath.split(os.path.sep)[1:-1]
-                if dpath in toc_dirs:
-                    raise Exception(
-                        "Logic bomb! Found a directory entry that already exists!"
-                    )
-                toc_dirs[dpath] = _dict_const(
-                    parent=parent,
-                    directory=dpath,
-                    mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
-                    mode=oct(m.mode),
+            if path == "/" or path == "":
+                dpath = "/"
+            else:
+                dpath = path[:-1] if path.endswith(os.path.sep) else path
+            dirs.append((dpath, m))
+        dirs.sort(key=itemgetter(0))
+        for prev, curr in zip(dirs, islice(dirs, 1, None)):
+            if prev[0] == curr[0]:
+                raise Exception(
+                    "Logic bomb! Found a directory entry that already exists!"
                 )
+        for dpath, m in dirs:
+            source = _dict_const(
+                parent="/" if dpath == "/" else os.path.dirname(dpath),
+                directory=dpath,
+                mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
+                mode=oct(m.mode),
+            )
+            if dpath != "/":
+                name = os.path.basename(dpath)
                 if name:
-                    toc_dirs[dpath]["name"] = name
+                    source["name"] = name
+                path_els = dpath.split(os.path.sep)[1:-1]
                 if len(path_els) > 0:
-                    toc_dirs[dpath]["ancestor_path_elements"] = path_els
-            else:
-                fentry = _dict_const(
-                    name=os.path.basename(path),
-                    mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
-                    size=m.size,
-                    mode=oct(m.mode),
-                )
-                try:
-                    ftype = self._mode_table[m.type]
-                except KeyError:
-                    ftype = "unk"
-                fentry["type"] = ftype
-                if m.issym():
-                    fentry["linkpath"] = m.linkpath
-                dpath = os.path.dirname(path)
-                # we may have created an empty dir entry already without a
-                # 'files' entry, so we now make sure that there is an
-                # empty 'files' entry that we can populate.
-                if "files" not in toc_dirs[dpath]:
-                    toc_dirs[dpath]["files"] = []
-                toc_dirs[dpath]["files"].append(fentry)
-        for key in sorted(toc_dirs.keys()):
-            source = toc_dirs[key]
-            try:
-                sorted_file_list = sorted(
-                    source["files"], key=itemgetter("name", "mtime")
-                )
-            except KeyError:
-                pass
-            else:
-                source["files"] = sorted_file_list
+                    source["ancestor_path_elements"] = path_els
+            files = self._toc_files(m.name.rstrip(os.path.sep))
+            if files:
+                source["files"] = files
 
             # Add "join" metadata to connect TOC doc to parent run doc
             source["run_data_parent"] = self.run_metadata["id"]
             yield source
 
-    def mk_tool_data(self):
-        """Yield ToolData() objects for each tool directory found in the
-        hierarhcy.
+    def _toc_files(self, dirname):
+        """Return the TOC file entries for the non-directory members of the
+        given directory, sorted by name and modification time.
+        """
+        # The entries are kept as tuples of (name, mtime, size, mode, type,
+        # linkpath) while they are sorted, and only expanded into their
+        # dictionary form once sorted.
+        entries = []
+        for f in self.index.children(dirname):
+            if f.isdir():
+                continue
+            entries.append(
+                (
+                    os.path.basename(f.name),
+                    datetime.utcfromtimestamp(float(f.mtime)).isoformat(),
+                    f.size,
+                    f.mode,
+                    self._mode_table.get(f.type, "unk"),
+                    f.linkpath if f.issym() else None,
+                )
+            )
+        entries.sort(key=itemgetter(0, 1))
+        files = []
+        for name, mtime, size, mode, ftype, linkpath in entries:
+            fentry = _dict_const(name=name, mtime=mtime, size=size, mode=oct(mode))
+            fentry["type"] = ftype
+            if linkpath is not None:
+                fentry["linkpath"] = linkpath
+            files.append(fentry)
+        return files
+
+    def _tool_data_units(self):
+        """Generate the (iteration, sample, host, tool) tuple naming each unit
+        of tool data found in the hierarchy.
 
         Tool data are stored in various files in the tar ball under a specific
         hierarchy.  The structure looks like the following:
@@ -4271,46 +5355,165 @@ class PbenchTarBall:
                     tool_names = list(tools_data.keys())
                     tool_names.sort()
                     for tool in tool_names:
-                        yield ToolData(
-                            self, iteration.name, sample.name, hostname, tool
-                        )
+                        yield iteration.name, sample.name, hostname, tool
+        return
+
+    def mk_tool_data(self):
+        """Yield ToolData() objects for each tool directory found in the
+        hierarhcy.
+        """
+        for iteration, sample, hostname, tool in self._tool_data_units():
+            yield ToolData(self, iteration, sample, hostname, tool)
         return
 
+    def _pending_tool_data_units(self):
+        """Generate the units of tool data, as _tool_data_units() does, other
+        than those completely indexed before per the checkpoint.
+        """
+        for unit in self._tool_data_units():
+            if self.checkpoint is None or not self.checkpoint.completed(
+                _tool_data_unit_name(unit)
+            ):
+                yield unit
+
+    def _mk_tool_data_action(self, idx_name, source, source_id, source_json):
+        tracking_id = self.idxctx.get_tracking_id()
+        if self.idxctx.raw_sources:
+            source = _add_json_field(source_json, "@generated-by", tracking_id)
+        else:
+            source["@generated-by"] = tracking_id
+        return _dict_const(
+            _op_type=_op_type, _index=idx_name, _id=source_id, _source=source,
+        )
+
     def mk_tool_data_actions(self):
         """Generate all the tool data actions from the entire run hierarchy.
+
+        When the "tool_data_workers" option asks for more than one worker,
+        the units of tool data are handed to a pool of worker processes (see
+        _gen_tool_data_units_parallel()), otherwise each unit is processed in
+        turn by this process.  Either way, the same actions are generated in
+        the same order.
         """
         self.idxctx.logger.debug("start")
+        workers = getattr(self.idxctx.options, "tool_data_workers", 1)
+        if workers > 1:
+            gen = self._gen_tool_data_units_parallel(workers)
+        else:
+            gen = self._gen_tool_data_units()
         count = 0
-        for td in self.mk_tool_data():
-            # Each ToolData object, td, that is returned here represents how
-            # data collected for that tool across all hosts is to be returned.
+        for unit, sources in gen:
+            actions = (
+                self._mk_tool_data_action(idx_name, source, source_id, source_json)
+                for idx_name, source, source_id, source_json in sources
+            )
+            for action in self._unit_actions(_tool_data_unit_name(unit), actions):
+                count += 1
+                yield action
+        self.idxctx.logger.debug("end [{:d} tool data documents]", count)
+        return
+
+    def _gen_tool_data_units(self):
+        """Generate each unit of tool data along with the index name, source
+        document, source ID, and source JSON of each of its documents, one
+        unit of tool data after the other.
+        """
+        for unit in self._pending_tool_data_units():
+            # Each ToolData object, td, constructed here represents how data
+            # collected for that tool across all hosts is to be returned.
             # The make_source method returns a generator that will emit each
             # source document for the appropriate unit of tool data.  Each has
             # the option of constructing that data as best fits its tool data.
             # The tool data for each tool is kept in its own index to allow
             # for different curation policies for each tool.
-            asource = td.make_source()
-            if not asource:
-                continue
-            for source, source_id in asource:
-                try:
-                    idx_name = td.generate_index_name(
-                        "tool-data", source, toolname=td.toolname
+            beg = self.idxctx.time()
+            td = ToolData(self, *unit)
+            phase = _tool_data_phase_name(unit)
+            self.metrics.add(phase, self.idxctx.time() - beg, nbytes=td.data_bytes())
+            yield unit, self.metrics.timed(phase, td.gen_indexable_sources())
+
+    def _gen_tool_data_units_parallel(self, workers):
+        """Generate each unit of tool data along with the index name, source
+        document, source ID, and source JSON of each of its documents, where
+        each unit of tool data is processed by one of a pool of worker
+        processes (which only return the form of each document which will be
+        indexed).
+
+        The documents of each unit are consumed in the order the units were
+        submitted, and each unit's error counters are added to the indexing
+        context's operational context in that order, so the generated
+        documents, and the operational context, are the same as when the
+        units are processed one after the other.
+
+        At most two units per worker are outstanding at any time, each with
+        its own queue ("slot") through which its worker streams its documents
+        in chunks (see _tool_data_worker_sources()).  A worker blocks once
+        its unit's queue is full, so the memory held by documents waiting to
+        be consumed is bounded regardless of the size of the units.  A slot
+        is only handed to another unit once its unit has been consumed.
+        """
+        nslots = 2 * workers
+        slots = [Queue(_TOOL_DATA_CHUNKS_QUEUED) for _ in range(nslots)]
+        free = list(range(nslots))
+        pending = deque()
+        with Pool(
+            workers, initializer=_tool_data_worker_init, initargs=(self, slots)
+        ) as pool:
+            watch = _PoolWatch(pool)
+            for unit in self._pending_tool_data_units():
+                if not free:
+                    unit0, slot, result = pending.popleft()
+                    yield unit0, self._consume_tool_data_unit(
+                        unit0, slots[slot], result, watch
                     )
-                except BadDate:
-                    pass
-                else:
-                    source["@generated-by"] = self.idxctx.get_tracking_id()
-                    action = _dict_const(
-                        _op_type=_op_type,
-                        _index=idx_name,
-                        _id=source_id,
-                        _source=source,
+                    free.append(slot)
+                slot = free.pop()
+                pending.append(
+                    (
+                        unit,
+                        slot,
+                        pool.apply_async(_tool_data_worker_sources, (unit, slot)),
                     )
-                    count += 1
-                    yield action
-        self.idxctx.logger.debug("end [{:d} tool data documents]", count)
-        return
+                )
+            while pending:
+                unit, slot, result = pending.popleft()
+                yield unit, self._consume_tool_data_unit(
+                    unit, slots[slot], result, watch
+                )
+
+    def _consume_tool_data_unit(self, unit, chunks, result, watch):
+        """Generate the documents of the given unit of tool data, streamed by
+        its worker process through the chunks queue, accounting for the
+        unit's metrics and error counters once they have all been consumed.
+
+        WorkerDied is raised if any worker process of the pool dies while
+        waiting, as the unit's documents may then never come.
+        """
+        counters = Counter()
+        self.idxctx.opctx.append(
+            _dict_const(
+                tbname=self.tbname,
+                object="ToolData-%s-%s-%s-%s" % unit,
+                counters=counters,
+            )
+        )
+        ndocs = 0
+        while True:
+            try:
+                chunk = chunks.get(timeout=1)
+            except Empty:
+                if result.ready() and not result.successful():
+                    # Raises the exception of the worker.
+                    result.get()
+                watch.check()
+                continue
+            if chunk is None:
+                break
+            ndocs += len(chunk)
+            yield from chunk
+        unit_counters, seconds, nbytes = result.get()
+        counters.update(unit_counters)
+        self.metrics.add(_tool_data_phase_name(unit), seconds, ndocs, nbytes)
 
     def mk_result_data_actions(self):
         """Generate all the result data actions.
@@ -4326,7 +5529,7 @@ class PbenchTarBall:
             self.idxctx.logger.debug("end [no result data sources]")
             return
         count = 0
-        for source, source_id, parent_id, doc_type in sources:
+        for source, source_id, parent_id, doc_type, source_json in sources:
             assert doc_type in (
                 "sample",
                 "res",
@@ -4341,12 +5544,20 @@ class PbenchTarBall:
                 # exception in its operational context.
                 pass
             else:
+                if parent_id is None:
+                    # Only the parent result data documents hold the tracking IDs.
+                    tracking_id = self.idxctx.get_tracking_id()
+                    if self.idxctx.raw_sources:
+                        source_json = _add_json_field(
+                            source_json, "@generated-by", tracking_id
+                        )
+                    else:
+                        source["@generated-by"] = tracking_id
+                if self.idxctx.raw_sources:
+                    source = source_json
                 action = _dict_const(
                     _op_type=_op_type, _index=idx_name, _id=source_id, _source=source,
                 )
-                if parent_id is None:
-                    # Only the parent result data documents hold the tracking IDs.
-                    source["@generated-by"] = self.idxctx.get_tracking_id()
                 count += 1
                 yield action
         self.idxctx.logger.debug("end [{:d} result documents]", count)
@@ -4375,6 +5586,33 @@ class IdxContext:
                     "Index prefix, '{}', not allowed to"
                     " contain a period ('.')".format(self.idx_prefix)
                 )
+        # The bulk indexing options passed to es_index(); by default, the
+        # pipelined bulk indexer is not used.
+        try:
+            self.bulk_options = dict(
+                in_flight=int(
+                    self.config.get("Indexing", "bulk_in_flight", fallback="0")
+                ),
+                chunk_docs=int(
+                    self.config.get(
+                        "Indexing", "bulk_action_count", fallback=DEFAULT_CHUNK_DOCS
+                    )
+                ),
+                chunk_bytes=int(
+                    self.config.get(
+                        "Indexing", "bulk_max_bytes", fallback=DEFAULT_CHUNK_BYTES
+                    )
+                ),
+            )
+        except ValueError as e:
+            raise ConfigFileError(f"Invalid bulk indexing option: {e}")
+        # When the pipelined bulk indexer is used, or the actions are written
+        # to bulk files, the actions carry the JSON form of each document, as
+        # bytes, instead of the document itself, so that each document is
+        # only converted to JSON once.
+        self.raw_sources = self.bulk_options["in_flight"] > 0 or bool(
+            getattr(options, "bulk_dir", None)
+        )
 
         # We expose the pbench.server module's internal _time() method here
         # for convenience, allowing us to more easily mock out "time" for unit
@@ -4420,8 +5658,17 @@ class IdxContext:
             self.logger,
             _known_tool_handlers,
             _dbg=_dbg,
+            cache_file=template_cache_file(self.config, self.idx_prefix),
         )
+        self.sosreport_cache = sosreport_cache_dir(self.config)
+        # When (per time.monotonic()) the index templates were last put in
+        # place in Elasticsearch, None if never; a long-running indexer only
+        # checks them again once the local template cache has expired.
+        self.templates_updated = None
         self.tracking_id = None
+        # The known tool handlers, compiled once for looking up the handler
+        # of each tool data file.
+        self.tool_handlers = compile_tool_handlers()
 
     def dump_opctx(self):
         counters_list = []
@@ -0,0 +1,345 @@
+"""Single pass ingest of pbench tar balls.
+
+A tar ball used to be decompressed by each stage of the pipeline in turn:
+to check its MD5, to unpack it, to find its members, to verify its
+sosreports, and to back it up.  The ingest reads the compressed tar ball
+once, and in that one pass computes its MD5, extracts its hierarchy,
+captures its member list, computes the MD5 of each sosreport it contains,
+and picks up the prefix and user recorded in its metadata.log file.
+
+Everything found out is recorded as the "ingest" object of the header of
+the tar ball's member manifest (see pbench.server.manifest), along with the
+size and modification time of the tar ball, so that later stages can use it
+without reading the tar ball again, for as long as the tar ball does not
+change:
+
+    {
+        "md5": <MD5 of the tar ball>,
+        "size": <size of the tar ball>,
+        "mtime": <modification time of the tar ball, in whole seconds>,
+        "sosreports": [
+            {"name": <member name>, "md5": <MD5>, "status": <status>}, ...
+        ],
+        "metadata": {"prefix": <prefix>, "user": <user>}
+    }
+
+where the status of a sosreport is "ok" when its MD5 matches its ".md5"
+file, "bad-md5" when it does not, and "no-md5" when there is no such file.
+"""
+
+import hashlib
+import lzma
+import os
+import tarfile
+from configparser import ConfigParser
+from configparser import Error as ConfigParserError
+from fnmatch import fnmatchcase
+
+from pbench.common.exceptions import IngestError, ManifestError
+from pbench.server.manifest import (
+    TarballMember,
+    load_manifest_header,
+    write_manifest,
+)
+
+
+# Size of the reads from the compressed tar ball, and from its members.
+_BUFSIZE = 2 ** 20
+
+# Largest metadata.log, or sosreport ".md5" file, kept in memory.
+_SMALL_FILE = 2 ** 16
+
+
+class _HashingReader:
+    """Wrap a file object, computing the MD5 of, and counting, all the bytes
+    read through it.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def read(self, size=-1):
+        buf = self.fp.read(size)
+        self.md5.update(buf)
+        self.size += len(buf)
+        return buf
+
+    def drain(self):
+        """Read whatever is left of the file, which the tar ball reader does
+        not need, like the padding at the end of the tar archive.
+        """
+        while self.read(_BUFSIZE):
+            pass
+
+
+def read_md5_file(md5_path):
+    """Return the MD5 recorded in the given ".md5" file, or None if there is
+    no such file.
+    """
+    try:
+        with open(md5_path, "r") as fp:
+            line = fp.readline()
+    except FileNotFoundError:
+        return None
+    return line.split(" ")[0].strip()
+
+
+def is_sosreport(name):
+    """Return True if the given member name is that of a sosreport.
+
+    Sosreports are looked for beneath a "sysinfo" directory at any of the
+    top three levels of a tar ball, as pbench-copy-sosreports always did.
+    """
+    parts = name.split("/")
+    if not fnmatchcase(parts[-1], "sosreport*.tar.xz"):
+        return False
+    return "sysinfo" in parts[1 : min(4, len(parts) - 1)]
+
+
+def _safe_name(name):
+    """Return the given member name without any leading "/" or "."
+    components, refusing any name with a ".." component, as GNU tar does.
+    """
+    parts = [p for p in name.split("/") if p and p != "."]
+    if not parts or ".." in parts:
+        raise IngestError(f"Refusing to extract member {name!r}")
+    return "/".join(parts)
+
+
+class _Extractor:
+    """Extract the members of a tar ball, in the order they are read, the
+    way pbench-unpack-tarballs had tar do it: owned by the current user,
+    with modification times of the time of extraction, modes masked by the
+    umask, and all files readable and directories readable and searchable
+    by all.  As with tar's --delay-directory-restore, the modes of the
+    directories are only set once all the members are extracted.
+    """
+
+    def __init__(self, root, umask):
+        self.root = root
+        self.umask = umask
+        # Map of the relative path of each directory created to its final
+        # mode.
+        self.dirs = {}
+        # The relative paths of the symlinks created, through which nothing
+        # is extracted.
+        self.symlinks = set()
+        # Map of a sosreport member name to its MD5.
+        self.sosreports = {}
+        # Map of a sosreport member name to the contents of its ".md5" file.
+        self.sos_md5_files = {}
+        # The contents of the metadata.log file.
+        self.metadata = None
+
+    def _dir_mode(self, mode):
+        return (mode & 0o777 & ~self.umask) | 0o555
+
+    def _ensure_dir(self, rel):
+        if not rel or rel in self.dirs:
+            return
+        parent = rel.rpartition("/")[0]
+        self._ensure_dir(parent)
+        path = os.path.join(self.root, rel)
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            if not os.path.isdir(path) or os.path.islink(path):
+                raise IngestError(f"Member directory {rel!r} is not a directory")
+        self.dirs[rel] = self._dir_mode(0o777)
+
+    def _clear(self, path):
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.unlink(path)
+
+    def _check_path(self, rel):
+        if not self.symlinks:
+            return
+        parts = rel.split("/")
+        for i in range(1, len(parts)):
+            if "/".join(parts[:i]) in self.symlinks:
+                raise IngestError(f"Refusing to extract {rel!r} through a symlink")
+
+    def member(self, tb, tarinfo):
+        rel = _safe_name(tarinfo.name)
+        self._check_path(rel)
+        parent = rel.rpartition("/")[0]
+        path = os.path.join(self.root, rel)
+        if tarinfo.isdir():
+            self._ensure_dir(rel)
+            self.dirs[rel] = self._dir_mode(tarinfo.mode)
+            return
+        self._ensure_dir(parent)
+        if tarinfo.isfile():
+            self._file(tb, tarinfo, rel, path)
+        elif tarinfo.issym():
+            self._clear(path)
+            os.symlink(tarinfo.linkname, path)
+            self.symlinks.add(rel)
+        elif tarinfo.islnk():
+            # The target must not be reached through a symlink extracted
+            # earlier, so that nothing outside the unpack directory is ever
+            # hard linked into it.
+            linkrel = _safe_name(tarinfo.linkname)
+            self._check_path(linkrel)
+            target = os.path.join(self.root, linkrel)
+            root = os.path.realpath(self.root)
+            real = os.path.realpath(os.path.dirname(target))
+            if real != root and not real.startswith(root + os.sep):
+                raise IngestError(
+                    f"Refusing to extract {rel!r} as a hard link outside the"
+                    " unpack directory"
+                )
+            self._clear(path)
+            # A hard link to a symlink links the symlink itself, as tar does.
+            os.link(target, path, follow_symlinks=False)
+        # Other member types (devices, FIFOs) are not extracted, they are
+        # only recorded in the manifest.
+
+    def _file(self, tb, tarinfo, rel, path):
+        is_sos = is_sosreport(rel)
+        md5 = hashlib.md5() if is_sos else None
+        is_metadata = rel.count("/") == 1 and rel.endswith("/metadata.log")
+        is_sos_md5 = rel.endswith(".md5") and is_sosreport(rel[: -len(".md5")])
+        # Small files we need the contents of are kept as they go by.
+        keep = (is_metadata or is_sos_md5) and tarinfo.size <= _SMALL_FILE
+        kept = []
+        self._clear(path)
+        mode = (tarinfo.mode & 0o777 & ~self.umask) | 0o444
+        src = tb.extractfile(tarinfo)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as dst:
+            while True:
+                buf = src.read(_BUFSIZE)
+                if not buf:
+                    break
+                dst.write(buf)
+                if md5 is not None:
+                    md5.update(buf)
+                if keep:
+                    kept.append(buf)
+            os.fchmod(dst.fileno(), mode)
+        if is_sos:
+            self.sosreports[rel] = md5.hexdigest()
+        elif keep and is_sos_md5:
+            self.sos_md5_files[rel[: -len(".md5")]] = b"".join(kept)
+        elif keep:
+            self.metadata = b"".join(kept)
+
+    def finish(self):
+        """Set the final modes of all the directories extracted.
+        """
+        for rel, mode in self.dirs.items():
+            os.chmod(os.path.join(self.root, rel), mode)
+
+    def sosreport_records(self):
+        records = []
+        for name in sorted(self.sosreports):
+            md5 = self.sosreports[name]
+            expected = self.sos_md5_files.get(name)
+            if expected is None:
+                status = "no-md5"
+            elif expected.decode("utf-8", errors="replace").strip() == md5:
+                status = "ok"
+            else:
+                status = "bad-md5"
+            records.append(dict(name=name, md5=md5, status=status))
+        return records
+
+    def metadata_record(self):
+        """Return the prefix and user found in the "run" section of the
+        metadata.log file, if any.
+        """
+        if self.metadata is None:
+            return {}
+        mdconf = ConfigParser(interpolation=None)
+        try:
+            mdconf.read_string(self.metadata.decode("utf-8"))
+        except (ConfigParserError, UnicodeDecodeError):
+            return {}
+        return {
+            key: mdconf.get("run", key)
+            for key in ("prefix", "user")
+            if mdconf.has_option("run", key)
+        }
+
+
+def ingest_tarball(tbname, unpack_dir, check_md5=True):
+    """Ingest the given tar ball in a single pass over its compressed form,
+    extracting it beneath the given unpack directory, and writing its member
+    manifest, with the ingest record in its header.  Returns the ingest
+    record.
+
+    When check_md5 is True, the MD5 of the tar ball is checked against its
+    ".md5" file, if it has one, and IngestError is raised if they do not
+    match, without writing the manifest.  IngestError is also raised if the
+    tar ball cannot be read, or one of its members cannot be extracted; the
+    caller is responsible for removing whatever was extracted.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    os.makedirs(unpack_dir, exist_ok=True)
+    extractor = _Extractor(unpack_dir, umask)
+    members = []
+    with open(tbname, "rb") as fp:
+        st = os.fstat(fp.fileno())
+        reader = _HashingReader(fp)
+        try:
+            # Like tar, recognize the compression of the tar ball, whatever
+            # its name says.
+            with tarfile.open(fileobj=reader, mode="r|*") as tb:
+                for tarinfo in tb:
+                    members.append(TarballMember.from_tarinfo(tarinfo))
+                    extractor.member(tb, tarinfo)
+            reader.drain()
+        except (tarfile.TarError, lzma.LZMAError, EOFError) as exc:
+            raise IngestError(f"Unable to read tar ball {tbname}: {exc}")
+        except OSError as exc:
+            raise IngestError(f"Unable to extract tar ball {tbname}: {exc}")
+    extractor.finish()
+    md5 = reader.md5.hexdigest()
+    if check_md5:
+        expected = read_md5_file(f"{tbname}.md5")
+        if expected is not None and expected != md5:
+            raise IngestError(
+                f"MD5 of tar ball {tbname}, {md5}, does not match its .md5"
+                f" file, {expected}"
+            )
+    ingest = dict(
+        md5=md5,
+        size=reader.size,
+        mtime=int(st.st_mtime),
+        sosreports=extractor.sosreport_records(),
+        metadata=extractor.metadata_record(),
+    )
+    write_manifest(tbname, members, ingest=ingest)
+    return ingest
+
+
+def load_ingest_record(tbname):
+    """Return the ingest record of the given tar ball, or None if it was not
+    ingested, or has changed since (by size or modification time).
+    """
+    try:
+        header = load_manifest_header(tbname)
+    except ManifestError:
+        return None
+    ingest = header.get("ingest") if header else None
+    if not ingest:
+        return None
+    try:
+        st = os.stat(tbname)
+    except OSError:
+        return None
+    if (st.st_size, int(st.st_mtime)) != (ingest["size"], ingest["mtime"]):
+        return None
+    return ingest
+
+
+def recorded_md5(tbname):
+    """Return the MD5 of the given tar ball computed when it was ingested,
+    or None if it was not ingested, or has changed since.
+    """
+    ingest = load_ingest_record(tbname)
+    return ingest["md5"] if ingest else None
@@ -0,0 +1,133 @@
+"""Incremental reading of large JSON array files.
+
+The result.json files of long benchmark runs, and the JSON payloads of some
+tools, are made up of a single top-level JSON array which can be hundreds of
+MB in size.  Loading such a file with `json.load()` holds the entire decoded
+document in memory at once, where the indexer only ever needs one element of
+the array at a time.
+
+A `JsonArrayReader` decodes the elements of the top-level array one at a
+time from fixed size chunks read from the file, so that the memory required
+is bounded by the size of the largest single element instead of the whole
+file.  Only the standard library's JSON decoder is used, so each element is
+decoded exactly as `json.load()` would decode it.
+"""
+
+import json
+import re
+
+
+# Default number of characters read from the file at a time.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Insignificant white space between JSON tokens.
+_ws = re.compile(r"[ \t\n\r]*")
+
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayReader:
+    """Iterate over the elements of the top-level JSON array of a file object.
+
+    Iteration stops early, without raising, on any error reading or decoding
+    the file; the error is recorded in the `error` attribute so that callers
+    can report it after handling the elements successfully decoded before it.
+    """
+
+    def __init__(self, fp, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.error = None
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size):
+        """Append at least `size` more characters to the buffer, dropping the
+        characters already consumed, returning False at the end of the file.
+        """
+        if self._eof:
+            return False
+        chunk = self.fp.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Skip white space, returning the next character, or "" at the end
+        of the file.
+        """
+        while True:
+            self._pos = _ws.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill(self.chunk_size):
+                return ""
+
+    def _value(self):
+        """Decode the next array element, reading more of the file as needed.
+
+        An element is only accepted once the delimiter following it is in the
+        buffer, since a number split across two chunks decodes successfully
+        as a different, shorter number.
+        """
+        self._peek()
+        while True:
+            try:
+                val, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                end = None
+            else:
+                nxt = _ws.match(self._buf, end).end()
+                if nxt < len(self._buf) and self._buf[nxt] in ",]":
+                    self._pos = end
+                    return val
+            # Read at least as much again as is buffered so that decoding a
+            # very large element is not quadratic in its size.
+            if not self._fill(max(self.chunk_size, len(self._buf) - self._pos)):
+                if end is None:
+                    # Raise the decoding error on the complete remainder.
+                    _decoder.raw_decode(self._buf, self._pos)
+                self._pos = end
+                return val
+
+    def is_array(self):
+        """Return True if the file holds a JSON array, decoding nothing."""
+        try:
+            return self._peek() == "["
+        except (OSError, ValueError) as e:
+            self.error = e
+            return False
+
+    def _elements(self):
+        if self._peek() != "[":
+            raise ValueError("expected a JSON array")
+        self._pos += 1
+        if self._peek() == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield self._value()
+                delim = self._peek()
+                if delim == "]":
+                    self._pos += 1
+                    break
+                if delim != ",":
+                    raise json.JSONDecodeError(
+                        "Expecting ',' delimiter", self._buf, self._pos
+                    )
+                self._pos += 1
+        if self._peek():
+            raise json.JSONDecodeError("Extra data", self._buf, self._pos)
+
+    def __iter__(self):
+        if self.error is not None:
+            return
+        try:
+            yield from self._elements()
+        except (OSError, ValueError) as e:
+            # Includes json.JSONDecodeError and UnicodeDecodeError.
+            self.error = e
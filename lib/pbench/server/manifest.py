@@ -0,0 +1,343 @@
+"""Pbench tar ball member manifests.
+
+A member manifest is a small sidecar file, written once when a tar ball is
+unpacked, which records the name, size, mode, modification time, type, and
+link path of every member of the tar ball.  Consumers, like the indexer, load
+the manifest instead of re-reading all the headers of the compressed tar
+ball, which requires decompressing the entire tar ball.
+
+The manifest for a tar ball, `<controller>/<name>.tar.xz`, is stored in the
+ARCHIVE hierarchy as `<controller>/.manifest/<name>.manifest` (similar to the
+`.prefix` directory used by version 001 agents).  The file is made up of JSON
+lines: the first line is a header object, each following line is an array of
+the form:
+
+    [ <name>, <size>, <mode>, <mtime>, <type>, <linkpath> ]
+
+When the manifest is written by the single pass ingest of the tar ball (see
+pbench.server.ingest), the header also carries an "ingest" object recording
+what that pass found out about the tar ball, so later stages need not read
+the tar ball again.
+"""
+
+import json
+import os
+import stat
+import tarfile
+import tempfile
+
+from pbench.common.exceptions import ManifestError
+
+
+# Version of the manifest file format.
+MANIFEST_VERSION = 1
+
+# Name of the directory, relative to the controller directory holding the tar
+# ball, where manifests are kept.
+MANIFEST_DIR = ".manifest"
+
+# Map of the file type bits of a "stat" mode to tar member types, used when
+# we have to construct the member list by scanning an extracted tar ball.
+_stat_type_table = (
+    (stat.S_ISDIR, tarfile.DIRTYPE),
+    (stat.S_ISLNK, tarfile.SYMTYPE),
+    (stat.S_ISREG, tarfile.REGTYPE),
+    (stat.S_ISFIFO, tarfile.FIFOTYPE),
+    (stat.S_ISCHR, tarfile.CHRTYPE),
+    (stat.S_ISBLK, tarfile.BLKTYPE),
+)
+
+
+class TarballMember:
+    """A lightweight stand-in for a tarfile.TarInfo object, providing only
+    the attributes and methods the pbench server uses.
+    """
+
+    __slots__ = ("name", "size", "mode", "mtime", "type", "linkpath")
+
+    def __init__(self, name, size, mode, mtime, type, linkpath=""):
+        self.name = name
+        self.size = size
+        self.mode = mode
+        self.mtime = mtime
+        self.type = type
+        self.linkpath = linkpath
+
+    @classmethod
+    def from_tarinfo(cls, tarinfo):
+        return cls(
+            tarinfo.name,
+            tarinfo.size,
+            tarinfo.mode,
+            tarinfo.mtime,
+            tarinfo.type,
+            tarinfo.linkname,
+        )
+
+    def isfile(self):
+        return self.type in tarfile.REGULAR_TYPES
+
+    def isdir(self):
+        return self.type == tarfile.DIRTYPE
+
+    def issym(self):
+        return self.type == tarfile.SYMTYPE
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+
+class MemberIndex:
+    """A directory index over the members of a tar ball.
+
+    Members are recorded by their position in the member list, keyed by the
+    directory which contains them, so that the lookups made while indexing a
+    tar ball only visit the part of the hierarchy they are interested in,
+    instead of scanning the entire member list each time.  All lookups
+    return members in the order they appear in the member list.
+    """
+
+    def __init__(self, members):
+        self.members = members
+        # Positions of all the directory members.
+        self._directories = []
+        # Map of directory path to the positions of its immediate children.
+        self._children = {}
+        # Map of a file's base name to the positions of all files with that
+        # name.
+        self._by_basename = {}
+        for idx, m in enumerate(members):
+            name = m.name.rstrip("/")
+            parent, _, basename = name.rpartition("/")
+            self._children.setdefault(parent, []).append(idx)
+            if m.isdir():
+                self._directories.append(idx)
+                self._children.setdefault(name, [])
+            elif m.isfile():
+                self._by_basename.setdefault(basename, []).append(idx)
+
+    def _basename(self, idx):
+        return self.members[idx].name.rstrip("/").rpartition("/")[2]
+
+    def iter_directories(self):
+        """Generate all the directory members.
+        """
+        for idx in self._directories:
+            yield self.members[idx]
+
+    def children(self, path):
+        """Return the members immediately contained in the given directory.
+        """
+        return [self.members[idx] for idx in self._children.get(path, [])]
+
+    def subdirs(self, path):
+        """Return the base names of the directories immediately contained
+        in the given directory.
+        """
+        return [
+            self._basename(idx)
+            for idx in self._children.get(path, [])
+            if self.members[idx].isdir()
+        ]
+
+    def files_by_prefix(self, path):
+        """Return the names of all files whose name begins with the given
+        path.
+
+        The path is split into its directory and a partial last component,
+        so "<dir>/csv" finds both "<dir>/csv/a.csv" and "<dir>/csv.txt".
+        """
+        parent, _, partial = path.rpartition("/")
+        found = set()
+        pending = set()
+        for idx in self._children.get(parent, []):
+            if not self._basename(idx).startswith(partial):
+                continue
+            m = self.members[idx]
+            if m.isfile():
+                found.add(idx)
+            elif m.isdir():
+                pending.add(m.name.rstrip("/"))
+        # A directory can be listed more than once in a tar ball, so we keep
+        # track of the ones we have already visited.
+        visited = set()
+        while pending:
+            dpath = pending.pop()
+            visited.add(dpath)
+            for idx in self._children.get(dpath, []):
+                m = self.members[idx]
+                if m.isfile():
+                    found.add(idx)
+                elif m.isdir():
+                    subdir = m.name.rstrip("/")
+                    if subdir not in visited:
+                        pending.add(subdir)
+        return [self.members[idx].name for idx in sorted(found)]
+
+    def files_named(self, basename):
+        """Return the names of all files with the given base name.
+        """
+        return [self.members[idx].name for idx in self._by_basename.get(basename, [])]
+
+
+def manifest_path(tbname):
+    """Return the path of the manifest for the given tar ball path.
+
+    The tar ball path is expected to be the real location of the tar ball in
+    the ARCHIVE hierarchy, and not a state directory symlink.
+    """
+    controller_dir, name = os.path.split(tbname)
+    if name.endswith(".tar.xz"):
+        name = name[: -len(".tar.xz")]
+    return os.path.join(controller_dir, MANIFEST_DIR, f"{name}.manifest")
+
+
+def _write_line(fp, obj):
+    fp.write(json.dumps(obj, separators=(",", ":")))
+    fp.write("\n")
+
+
+def write_manifest(tbname, members=None, ingest=None):
+    """Write the manifest for the given tar ball, returning its path.
+
+    If a list of members is not provided, the tar ball headers are read to
+    construct it.  The optional ingest record is stored in the header.  The
+    manifest is written to a temporary file which is then renamed into place,
+    so a reader never sees a partial manifest.
+    """
+    if members is None:
+        with tarfile.open(tbname) as tb:
+            members = [TarballMember.from_tarinfo(m) for m in tb]
+    mpath = manifest_path(tbname)
+    mdir = os.path.dirname(mpath)
+    os.makedirs(mdir, exist_ok=True)
+    header = {
+        "version": MANIFEST_VERSION,
+        "tar-ball": os.path.basename(tbname),
+        "members": len(members),
+    }
+    if ingest is not None:
+        header["ingest"] = ingest
+    fd, tmp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=mdir)
+    try:
+        with os.fdopen(fd, "w") as fp:
+            _write_line(fp, header)
+            for m in members:
+                _write_line(
+                    fp,
+                    [
+                        m.name,
+                        m.size,
+                        m.mode,
+                        m.mtime,
+                        m.type.decode("ascii"),
+                        m.linkpath,
+                    ],
+                )
+        os.chmod(tmp_name, 0o664)
+        os.rename(tmp_name, mpath)
+    except Exception:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return mpath
+
+
+def load_manifest_header(tbname):
+    """Load only the header of the manifest of the given tar ball.
+
+    Returns None if the tar ball does not have a manifest, and raises
+    ManifestError if the header is not valid.
+    """
+    mpath = manifest_path(tbname)
+    try:
+        fp = open(mpath, "r")
+    except FileNotFoundError:
+        return None
+    with fp:
+        try:
+            header = json.loads(fp.readline())
+        except Exception as exc:
+            raise ManifestError(f"{mpath}: {exc}")
+    if not isinstance(header, dict) or header.get("version") != MANIFEST_VERSION:
+        raise ManifestError(f"{mpath}: unsupported manifest header")
+    return header
+
+
+def load_manifest(tbname):
+    """Load the member list of the given tar ball from its manifest.
+
+    Returns None if the tar ball does not have a manifest, and raises
+    ManifestError if the manifest exists but is not valid.
+    """
+    mpath = manifest_path(tbname)
+    try:
+        fp = open(mpath, "r")
+    except FileNotFoundError:
+        return None
+    with fp:
+        try:
+            header = json.loads(fp.readline())
+            if header["version"] != MANIFEST_VERSION:
+                raise ManifestError(
+                    f"{mpath}: unsupported manifest version, {header['version']}"
+                )
+            members = []
+            for line in fp:
+                name, size, mode, mtime, mtype, linkpath = json.loads(line)
+                members.append(
+                    TarballMember(
+                        name, size, mode, mtime, mtype.encode("ascii"), linkpath
+                    )
+                )
+        except ManifestError:
+            raise
+        except Exception as exc:
+            raise ManifestError(f"{mpath}: {exc}")
+    if len(members) != header["members"]:
+        raise ManifestError(
+            f"{mpath}: expected {header['members']} members, found {len(members)}"
+        )
+    return members
+
+
+def _member_from_lstat(path, name):
+    st = os.lstat(path)
+    for test, mtype in _stat_type_table:
+        if test(st.st_mode):
+            break
+    else:
+        mtype = tarfile.REGTYPE
+    if mtype == tarfile.SYMTYPE:
+        linkpath = os.readlink(path)
+    else:
+        linkpath = ""
+    # Tar records sizes only for regular files, and whole seconds for
+    # modification times.
+    size = st.st_size if mtype == tarfile.REGTYPE else 0
+    return TarballMember(
+        name, size, stat.S_IMODE(st.st_mode), int(st.st_mtime), mtype, linkpath
+    )
+
+
+def scan_extracted_tree(extracted_root, dirname):
+    """Construct the member list of a tar ball by walking its extracted
+    directory hierarchy, `<extracted_root>/<dirname>`.
+
+    Members are named as they would be in the tar ball, and returned sorted
+    by name, which guarantees a directory is always listed before any of its
+    contents.  Note the modes and modification times are those of the
+    extracted files, which need not match the tar ball headers.
+    """
+    top = os.path.join(extracted_root, dirname)
+    members = [_member_from_lstat(top, dirname)]
+    for root, dirs, files in os.walk(top):
+        rel = dirname + root[len(top) :]
+        for entry in dirs + files:
+            members.append(
+                _member_from_lstat(os.path.join(root, entry), f"{rel}/{entry}")
+            )
+    members.sort(key=lambda m: m.name)
+    return members
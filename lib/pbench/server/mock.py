@@ -1,11 +1,23 @@
 """
 Module for mocking out behaviors of Elasticsearch.
+
+MockElasticsearch stands in for the Elasticsearch client object in the unit
+tests, capturing a sample of the actions indexed for the gold files, while
+MockBulkServer is a local HTTP stand-in for the Elasticsearch bulk API, for
+load testing the indexing path without a real cluster.
 """
 
+import fnmatch
 import re
 import sys
 import json
+import threading
+import time
+from argparse import ArgumentParser
 from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from random import Random
+from socketserver import ThreadingMixIn
 
 
 class MockElasticsearch:
@@ -326,3 +338,355 @@ class _MockStreamingBulk:
         print(json.dumps(self.actions_l, indent=4, sort_keys=True))
         sys.stdout.flush()
         self.reset()
+
+
+class MockBulkServer:
+    """A local HTTP stand-in for the bulk API of an Elasticsearch cluster,
+    for load testing the pipelining, retries, and concurrency of the indexing
+    path.
+
+    Each bulk request is held for the configured latency, plus the time to
+    transfer its body at the configured throughput.  Only "capacity" bulk
+    requests are serviced at one time, with up to "queue" more waiting their
+    turn; any other request is rejected with a 429 status, as a cluster whose
+    write thread pool queue is full would.  On top of that, a random fraction
+    of the requests are throttled (429), and of the documents of the other
+    requests, a random fraction are rejected (429) or fail (400).  A document
+    whose ID was already created gets a 409 status.
+
+    Every document received is counted (see stats()).  The templates put are
+    kept, so that they are found again by later template requests.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        throughput=None,
+        capacity=4,
+        queue=200,
+        throttle_rate=0.0,
+        reject_rate=0.0,
+        failure_rate=0.0,
+        seed=None,
+    ):
+        self.latency = latency
+        # Bytes per second, None for no limit.
+        self.throughput = throughput
+        self.capacity = capacity
+        self.queue = queue
+        self.throttle_rate = throttle_rate
+        self.reject_rate = reject_rate
+        self.failure_rate = failure_rate
+        self._random = Random(seed)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(capacity)
+        self._waiting = 0
+        self.templates = {}
+        self.reset()
+        self._server = _ThreadingHTTPServer((host, port), _MockBulkHandler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def address(self):
+        """The (host, port) tuple the server is listening on.
+        """
+        return self._server.server_address[:2]
+
+    def reset(self):
+        """Forget all the documents received, and zero all the counters.
+        """
+        with self._lock:
+            self.ids = set()
+            self.counters = Counter()
+            self.by_index = Counter()
+            self.max_concurrent = 0
+            self._concurrent = 0
+
+    def stats(self):
+        """Return the counters of the requests and documents received.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["unique_ids"] = len(self.ids)
+            stats["max_concurrent"] = self.max_concurrent
+            stats["by_index"] = dict(self.by_index)
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _chance(self, rate):
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _admit(self):
+        """Wait for a slot to service a bulk request, returning False if the
+        request has to be rejected because too many are already waiting.
+        """
+        with self._lock:
+            if self._waiting >= self.capacity + self.queue:
+                self.counters["rejected_requests"] += 1
+                return False
+            self._waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        return True
+
+    def _release(self):
+        with self._lock:
+            self._concurrent -= 1
+            self._waiting -= 1
+        self._slots.release()
+
+    def bulk(self, body):
+        """Return the status and response of a bulk request with the given
+        body, or None for the status and the response if the request has to
+        be rejected.
+        """
+        beg = time.time()
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["bytes"] += len(body)
+        if not self._admit():
+            return None, None
+        try:
+            delay = self.latency
+            if self.throughput:
+                delay += len(body) / self.throughput
+            if delay > 0:
+                time.sleep(delay)
+            if self._chance(self.throttle_rate):
+                with self._lock:
+                    self.counters["throttled_requests"] += 1
+                return None, None
+            items = []
+            lines = body.split(b"\n")
+            for meta_line in lines[::2]:
+                if not meta_line.strip():
+                    continue
+                items.append(self._item(json.loads(meta_line)))
+        finally:
+            self._release()
+        took = int((time.time() - beg) * 1000)
+        errors = any(next(iter(item.values()))["status"] >= 300 for item in items)
+        return 200, {"took": took, "errors": errors, "items": items}
+
+    def _item(self, meta):
+        """Return the response to one document of a bulk request, given its
+        action metadata.
+        """
+        op_type, params = next(iter(meta.items()))
+        index = params.get("_index")
+        _id = params.get("_id")
+        resp = {"_index": index, "_id": _id}
+        if self._chance(self.reject_rate):
+            status, error = 429, "es_rejected_execution_exception"
+        elif self._chance(self.failure_rate):
+            status, error = 400, "mapper_parsing_exception"
+        else:
+            status, error = 201, None
+        with self._lock:
+            self.counters["docs"] += 1
+            if status == 201 and op_type == "create" and _id in self.ids:
+                status, error = 409, "version_conflict_engine_exception"
+            if status == 201:
+                self.ids.add(_id)
+                self.by_index[index] += 1
+                self.counters["created"] += 1
+            else:
+                self.counters[
+                    {429: "rejected", 400: "failed", 409: "duplicates"}[status]
+                ] += 1
+        resp["status"] = status
+        if error is None:
+            resp["result"] = "created"
+        else:
+            resp["error"] = {"type": error, "reason": f"mock {error}"}
+        return {op_type: resp}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MockBulkHandler(BaseHTTPRequestHandler):
+    """The handler of the requests made to a MockBulkServer.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Don't log every request to stderr.
+        pass
+
+    def _reply(self, status, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length > 0 else b""
+
+    def _template_name(self):
+        path = self.path.split("?", 1)[0]
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "_template":
+            return parts[1]
+        return None
+
+    def do_HEAD(self):
+        self._reply(200)
+
+    def do_GET(self):
+        mock = self.server.mock
+        name = self._template_name()
+        if name is not None:
+            with mock._lock:
+                found = {
+                    key: val
+                    for key, val in mock.templates.items()
+                    if fnmatch.fnmatchcase(key, name)
+                }
+            self._reply(200 if found else 404, found)
+        elif self.path.split("?", 1)[0] == "/_mock/stats":
+            self._reply(200, mock.stats())
+        else:
+            self._reply(
+                200,
+                {
+                    "name": "mock",
+                    "cluster_name": "pbench-mock",
+                    "version": {"number": "7.9.1"},
+                    "tagline": "You Know, for Search",
+                },
+            )
+
+    def do_PUT(self):
+        mock = self.server.mock
+        body = self._body()
+        name = self._template_name()
+        if name is None:
+            self._reply(404, {"error": f"no handler for {self.path}", "status": 404})
+            return
+        with mock._lock:
+            mock.templates[name] = json.loads(body)
+        self._reply(200, {"acknowledged": True})
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self._body()
+        path = self.path.split("?", 1)[0]
+        if path == "/_mock/reset":
+            mock.reset()
+            self._reply(200, {"acknowledged": True})
+        elif path.endswith("/_bulk"):
+            status, resp = mock.bulk(body)
+            if status is None:
+                self._reply(
+                    429,
+                    {
+                        "error": {
+                            "type": "es_rejected_execution_exception",
+                            "reason": "mock rejected execution",
+                        },
+                        "status": 429,
+                    },
+                )
+            else:
+                self._reply(status, resp)
+        else:
+            self._reply(404, {"error": f"no handler for {self.path}", "status": 404})
+
+
+def main(argv=None):
+    """Serve a MockBulkServer until interrupted, so that pbench-index can be
+    pointed at it (via the [elasticsearch] host and port of its
+    configuration file).
+    """
+    parser = ArgumentParser(
+        prog="python3 -m pbench.server.mock",
+        description="Serve a mock Elasticsearch bulk API for load testing",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each request"
+    )
+    parser.add_argument(
+        "--throughput",
+        type=float,
+        default=None,
+        help="Megabytes per second at which request bodies are handled",
+    )
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=4,
+        help="Number of bulk requests serviced at one time",
+    )
+    parser.add_argument(
+        "--queue",
+        type=int,
+        default=200,
+        help="Number of bulk requests waiting for service before rejecting" " requests",
+    )
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    options = parser.parse_args(argv)
+    server = MockBulkServer(
+        host=options.host,
+        port=options.port,
+        latency=options.latency,
+        throughput=options.throughput * 1024 * 1024 if options.throughput else None,
+        capacity=options.capacity,
+        queue=options.queue,
+        throttle_rate=options.throttle_rate,
+        reject_rate=options.reject_rate,
+        failure_rate=options.failure_rate,
+        seed=options.seed,
+    )
+    host, port = server.address
+    print(f"Serving a mock bulk API on {host}:{port}, stats at /_mock/stats")
+    sys.stdout.flush()
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+    print(json.dumps(server.stats(), indent=4, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,7 +14,14 @@ from pathlib import Path
 
 from pbench.common.logger import get_pbench_logger
 from pbench.server import tstos
-from pbench.server.indexer import PbenchTemplates, get_es, es_index, _op_type
+from pbench.server.bulk import BULK_FILE_SUFFIX, write_bulk_file
+from pbench.server.indexer import (
+    PbenchTemplates,
+    get_es,
+    es_index,
+    _op_type,
+    template_cache_file,
+)
 
 
 class Report:
@@ -37,6 +44,7 @@ class Report:
         hostname=None,
         version=None,
         templates=None,
+        bulk_dir=None,
     ):
         self.config = config
         self.name = name
@@ -91,11 +99,19 @@ class Report:
                     self.es = None
             else:
                 self.es = es
+        # When a bulk directory is given, the status documents are written to
+        # bulk files in its "reports" sub-directory, to be replayed later,
+        # instead of being indexed.
+        self.bulk_dir = bulk_dir
+        self._bulk_seq = 0
         if templates is not None:
             self.templates = templates
         else:
             self.templates = PbenchTemplates(
-                self.config.BINDIR, self.idx_prefix, self.logger
+                self.config.BINDIR,
+                self.idx_prefix,
+                self.logger,
+                cache_file=template_cache_file(self.config, self.idx_prefix),
             )
 
     def init_report_template(self):
@@ -145,9 +161,10 @@ class Report:
         """
         yield self._make_json_payload(base_source)
 
-    def post_status(self, timestamp, doctype, file_to_index=None):
+    def post_status(self, timestamp, doctype, file_to_index=None, metrics=None):
         """Post a status record, with an optional file payload to index along
-        with the base tracking document.
+        with the base tracking document, and optional metrics about the
+        operation reported (e.g. see pbench.server.indexer.summarize_metrics()).
 
         We return the tracking ID use for this report object.
         """
@@ -164,6 +181,10 @@ class Report:
                 "name": self.name,
                 "doctype": doctype,
             }
+            if metrics and not self.config._unittests:
+                # Timings and memory use vary from one run to the next, so
+                # they are left out of unit test reports.
+                base_source["metrics"] = metrics
             if file_to_index:
                 payload_gen = self._gen_json_payload(base_source, file_to_index)
             else:
@@ -208,9 +229,19 @@ class Report:
                         }
                         yield action
 
-                es_res = es_index(
-                    self.es, _es_payload_gen(payload_gen), sys.stderr, self.logger
-                )
+                if self.bulk_dir:
+                    self._bulk_seq += 1
+                    bulk_path = Path(
+                        self.bulk_dir,
+                        "reports",
+                        f"{self.name}.{timestamp_noutc}.{doctype}.{self._bulk_seq:d}"
+                        f"{BULK_FILE_SUFFIX}",
+                    )
+                    es_res = write_bulk_file(bulk_path, _es_payload_gen(payload_gen))
+                else:
+                    es_res = es_index(
+                        self.es, _es_payload_gen(payload_gen), sys.stderr, self.logger
+                    )
                 beg, end, successes, duplicates, failures, retries = es_res
                 if failures > 0:
                     log_action = self.logger.error
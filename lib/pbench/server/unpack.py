@@ -0,0 +1,586 @@
+"""Concurrent unpacking of pbench tar balls.
+
+pbench-unpack-tarballs unpacks the tar balls waiting in the TO-UNPACK state
+one after the other, and was run as one cron job per size "bucket" so that
+small tar balls would not wait behind large ones.  Small tar balls still
+waited behind large ones in the same bucket, though, and no more tar balls
+were ever unpacked at once than there were buckets.
+
+The Unpacker unpacks them in worker processes instead, several at once,
+handing them out smallest first, while aging each tar ball by how long it has been
+waiting, so that large tar balls are not starved by a steady stream of small
+ones: the priority of a tar ball is its size, less the aging rate times the
+time since its link was put in TO-UNPACK.
+
+The number of bytes of the tar balls being unpacked at once is capped by an
+"I/O budget".  The tar ball at the head of the queue waits for enough of the
+budget to free up, rather than letting smaller tar balls pass it, unless
+nothing else is being unpacked, so that it always gets its turn.
+
+Each tar ball goes through the same state transitions as it does with
+pbench-unpack-tarballs: it is ingested (see pbench.server.ingest) beneath
+INCOMING, linked to from the RESULTS and USERS hierarchies, and its link is
+moved from TO-UNPACK to UNPACKED, with links added in each of the configured
+"unpacked-states", or to WONT-UNPACK if anything goes wrong.
+
+Run with a stop event (see pbench-dispatcher), the Unpacker keeps running
+until it is set, looking for new tar balls whenever notify() is called, as
+well as every "rescan" seconds.  Given a report name, it then posts a status
+report of the tar balls it handled every "rescan" seconds (when there is
+anything to report), and when it stops, instead of accumulating them all.
+"""
+
+import glob
+import heapq
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from configparser import NoOptionError, NoSectionError
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+from pbench.common.exceptions import BadConfig, WorkerDied
+import pbench.server
+from pbench.server.catalog import open_catalog
+from pbench.server.ingest import ingest_tarball
+from pbench.server.report import Report
+from pbench.server.utils import rename_tb_link
+
+
+# The link source and destinations of the tar balls unpacked.
+LINKSRC = "TO-UNPACK"
+LINKDEST = "UNPACKED"
+LINKERR = "WONT-UNPACK"
+
+tb_pat_r = (
+    r"\S+_(\d\d\d\d)[._-](\d\d)[._-](\d\d)[T_](\d\d)[._:](\d\d)[._:](\d\d)\.tar\.xz"
+)
+tb_pat = re.compile(tb_pat_r)
+
+
+class UnpackJob:
+    """A tar ball waiting to be unpacked, known by its link in TO-UNPACK.
+    """
+
+    def __init__(self, link, size, since):
+        self.link = link
+        # Size of the tar ball in bytes (0 when the link is dangling).
+        self.size = size
+        # Time the link was put in TO-UNPACK, in seconds since the epoch.
+        self.since = since
+        self.name = os.path.basename(link)
+        self.resultname = self.name[: -len(".tar.xz")]
+        self.controller_dir = os.path.dirname(os.path.dirname(link))
+
+
+class UnpackQueue:
+    """Priority queue of the tar balls waiting to be unpacked, smallest first,
+    aged by how long they have been waiting.
+
+    With an aging rate of R bytes per second, the priority of a tar ball of S
+    bytes waiting since time T is, at time t, S - R * (t - T).  As R * t is
+    the same for all tar balls at any one time, they are ordered by S + R * T,
+    which does not change while they wait.
+    """
+
+    def __init__(self, aging):
+        self.aging = aging
+        self._heap = []
+        # Ties are broken by the order the tar balls were queued.
+        self._seq = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, job):
+        key = job.size + self.aging * job.since
+        heapq.heappush(self._heap, (key, next(self._seq), job))
+
+    def peek(self):
+        return self._heap[0][2]
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2]
+
+
+def _ingest_worker(conn, tb, unpack_dir):
+    """Ingest the given tar ball in a worker process, sending back the ingest
+    record, or the exception raised, through the given connection.
+    """
+    try:
+        res = (ingest_tarball(tb, unpack_dir), None)
+    except Exception as exc:
+        res = (None, exc)
+    conn.send(res)
+    conn.close()
+
+
+class Unpacker:
+    """Unpack the tar balls in the TO-UNPACK state of every controller of the
+    ARCHIVE hierarchy, using up to "workers" worker processes at once, one
+    per tar ball.
+
+    The "aging" rate is given in bytes per second of waiting, and the
+    "io_budget" in bytes (None for no limit).  New tar balls are looked for
+    every "rescan" seconds while there is work in progress.  The worker
+    processes are started using the given multiprocessing context, if any
+    (e.g. "forkserver" when running alongside other threads).  When a
+    report name is given, a running Unpacker posts its status reports under
+    that name (see post_report()).
+    """
+
+    def __init__(
+        self,
+        config,
+        logger,
+        workers=4,
+        io_budget=None,
+        aging=0,
+        rescan=60,
+        mp_context=None,
+        report_name=None,
+    ):
+        self.config = config
+        self.logger = logger
+        self.workers = workers
+        self.mp_context = mp_context if mp_context is not None else multiprocessing
+        self.io_budget = io_budget
+        self.rescan = rescan
+        self.report_name = report_name
+        # The pbench.server module's _time() method is used to time the
+        # unpacking of each tar ball, so that it is mocked out in unit test
+        # environments.
+        self.time = pbench.server._time
+        self.queue = UnpackQueue(aging)
+        try:
+            self.max_unpacked_age = int(config.get("pbench-server", "max-unpacked-age"))
+        except (NoOptionError, NoSectionError, ValueError) as exc:
+            raise BadConfig(f"Bad maximum unpacked age: {exc}")
+        try:
+            states = config.get("pbench-server", "unpacked-states")
+        except (NoOptionError, NoSectionError):
+            states = ""
+        self.unpacked_states = [s.strip() for s in states.split(",") if s.strip()]
+        # The links queued or being unpacked during this run, which are not
+        # queued again when seen by a later scan.
+        self._known = set()
+        # Results of the workers, and wake-ups from notify(), for run().
+        self._events = queue.Queue()
+        self._wake = threading.Event()
+        # Counters for the status report, and its messages, since the last
+        # one was posted.
+        self.ntotal = 0
+        self.ntb = 0
+        self.nwarn = 0
+        self.nerrs = 0
+        self.messages = []
+        self._reported = time.monotonic()
+
+    def _error(self, msg, *args):
+        self.logger.error(msg, *args)
+        self.messages.append(msg.format(*args))
+        self.nerrs += 1
+
+    def _warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+        self.messages.append(msg.format(*args))
+        self.nwarn += 1
+
+    def post_report(self, name):
+        """Post a status report, under the given name, of the tar balls
+        handled since the last one, and reset its counters and messages.
+        """
+        try:
+            self._post_report(name)
+        finally:
+            self.ntotal = 0
+            self.ntb = 0
+            self.nwarn = 0
+            self.nerrs = 0
+            self.messages = []
+            self._reported = time.monotonic()
+
+    def _post_report(self, name):
+        config = self.config
+        with tempfile.NamedTemporaryFile(
+            mode="w+t", prefix=f"{name}.", suffix=".report", dir=config.TMP
+        ) as tfp:
+            print(
+                f"{name}.{config.TS}({config.PBENCH_ENV}) - w/ {self.nerrs:d}"
+                " errors",
+                file=tfp,
+            )
+            print(
+                f"Processed {self.ntotal:d} result tar balls, {self.ntb:d}"
+                f" successfully, {self.nwarn:d} warnings, {self.nerrs:d}"
+                " errors, and 0 duplicates\n",
+                file=tfp,
+            )
+            for msg in self.messages:
+                print(msg, file=tfp)
+            tfp.flush()
+            tfp.seek(0)
+            report = Report(config, name)
+            report.init_report_template()
+            try:
+                report.post_status(config.timestamp(), "status", tfp.name)
+            except Exception:
+                pass
+
+    def _maybe_report(self, final=False):
+        """Post a status report if there is anything to report, and it is
+        time to, when running with a report name.
+        """
+        if self.report_name is None or not (self.ntotal or self.messages):
+            return
+        if final or time.monotonic() - self._reported >= self.rescan:
+            try:
+                self.post_report(self.report_name)
+            except Exception as exc:
+                # Don't let a failure to reach the report index stop the
+                # unpacking; the counts are dropped along with the report.
+                self.logger.warning("failed to post the status report: {}", exc)
+
+    def scan(self):
+        """Queue the tar balls newly found in TO-UNPACK, returning how many
+        were found.
+        """
+        found = 0
+        catalog = open_catalog(self.config)
+        if catalog is None:
+            pattern = os.path.join(self.config.ARCHIVE, "*", LINKSRC, "*.tar.xz")
+            links = sorted(glob.iglob(pattern))
+        else:
+            with catalog:
+                catalog.refresh([LINKSRC])
+                links = catalog.links(LINKSRC, order="name")
+        # Forget the links handled since the last scan.
+        self._known.intersection_update(links)
+        for link in links:
+            if link in self._known:
+                continue
+            if os.path.basename(link).startswith("DUPLICATE__NAME"):
+                # For now, just punt on duplicate names, without an error.
+                continue
+            try:
+                since = os.lstat(link).st_mtime
+            except FileNotFoundError:
+                # Handled by someone else since we globbed.
+                continue
+            try:
+                size = os.stat(link).st_size
+            except OSError:
+                # A dangling link, accounted as an error when its turn comes.
+                size = 0
+            self._known.add(link)
+            self.queue.push(UnpackJob(link, size, since))
+            found += 1
+        return found
+
+    def _move_link(self, job, state):
+        """Move the link of the tar ball from TO-UNPACK to the given state,
+        returning True on success.
+        """
+        try:
+            rename_tb_link(
+                job.link, os.path.join(job.controller_dir, state), self.logger
+            )
+        except Exception as exc:
+            self._error(
+                "Cannot move symlink {} from {} to {}: {}",
+                job.link,
+                LINKSRC,
+                state,
+                exc,
+            )
+            return False
+        return True
+
+    def _too_old(self, tb):
+        """Return True if the tar ball is older than the configured maximum
+        age for an unpacked tar ball (by the date in its name), and is not
+        marked to be kept, as pbench-check-tb-age does.
+        """
+        match = tb_pat.fullmatch(tb.name)
+        if not match:
+            return True
+        curr_dt = self.config._ref_datetime or datetime.utcnow()
+        tb_dt = datetime(*(int(match.group(i)) for i in range(1, 7)))
+        if (curr_dt - tb_dt).days <= self.max_unpacked_age:
+            return False
+        keep = Path(self.config.INCOMING, tb.parent.name, tb.name, ".__pbench_keep__")
+        return not keep.is_file()
+
+    def _prepare(self, job):
+        """Check that the given tar ball can be unpacked, and make its unpack
+        directory, returning the tar ball's path and its INCOMING directory,
+        or None if it can't be unpacked.
+        """
+        self.ntotal += 1
+        try:
+            tb = Path(job.link).resolve(strict=True)
+        except (OSError, RuntimeError):
+            self._error("symlink target for {} does not exist", job.link)
+            self._move_link(job, LINKERR)
+            return None
+        if self._too_old(tb):
+            self._warning(
+                "{} is older than the configured maximum age, or has an"
+                " unrecognized name",
+                job.link,
+            )
+            self._move_link(job, LINKERR)
+            return None
+        controller = tb.parent.name
+        try:
+            for state in self.config.LINKDIRS.split():
+                os.makedirs(
+                    os.path.join(self.config.ARCHIVE, controller, state), exist_ok=True
+                )
+        except OSError as exc:
+            self._error(
+                "Creation of {} processing directories failed for {}: {}",
+                controller,
+                job.link,
+                exc,
+            )
+            return None
+        incoming = Path(self.config.INCOMING, controller, job.resultname)
+        if os.path.lexists(incoming):
+            self._error(
+                "Incoming result, {}, already exists, skipping {}", incoming, job.link
+            )
+            self._move_link(job, LINKERR)
+            return None
+        try:
+            os.makedirs(f"{incoming}.unpack")
+        except OSError as exc:
+            self._error("'mkdir {}.unpack' failed for {}: {}", incoming, job.link, exc)
+            return None
+        return tb, incoming
+
+    def _link(self, incoming, hierarchy, controller, prefix, resultname):
+        """Link to the unpacked tar ball from the given hierarchy, returning
+        the link.
+        """
+        link_dir = Path(hierarchy, controller, prefix)
+        link_dir.mkdir(parents=True, exist_ok=True)
+        link = link_dir / resultname
+        self.logger.info("ln -s {} {}", incoming, link)
+        os.symlink(incoming, link)
+        return link
+
+    def _finish(self, job, tb, incoming, ingest, started):
+        """Move the unpacked tar ball into place, link to it from the RESULTS
+        and USERS hierarchies, and move its link to UNPACKED, adding links in
+        each of the unpacked states.
+        """
+        unpack = Path(f"{incoming}.unpack")
+        try:
+            os.rename(unpack / job.resultname, incoming)
+        except OSError:
+            self._error(
+                "'{}' does not contain {} directory at the top level; skipping",
+                job.link,
+                job.resultname,
+            )
+            shutil.rmtree(unpack, ignore_errors=True)
+            self._move_link(job, LINKERR)
+            return
+        try:
+            os.rmdir(unpack)
+        except OSError:
+            self._warning(
+                "WARNING - '{}' should only contain the {} directory at the top"
+                " level, ignoring other content",
+                job.link,
+                job.resultname,
+            )
+            shutil.rmtree(unpack, ignore_errors=True)
+
+        # Version 002 agents use the metadata log to store a prefix, and may
+        # also store a user; version 001 agents use a prefix file, which
+        # pbench-dispatch has already moved to the .prefix directory.
+        prefix = ingest["metadata"].get("prefix", "")
+        user = ingest["metadata"].get("user", "")
+        prefix_file = tb.parent / ".prefix" / f"{job.resultname}.prefix"
+        if prefix_file.is_file():
+            prefix = prefix_file.read_text().rstrip("\n")
+        if prefix and not prefix.endswith("/"):
+            prefix = f"{prefix}/"
+
+        controller = tb.parent.name
+        links = []
+        try:
+            links.append(
+                self._link(
+                    incoming, self.config.RESULTS, controller, prefix, job.resultname
+                )
+            )
+            if user:
+                links.append(
+                    self._link(
+                        incoming,
+                        Path(self.config.USERS, user),
+                        controller,
+                        prefix,
+                        job.resultname,
+                    )
+                )
+        except OSError as exc:
+            self._error("Linking to {} for {} failed: {}", incoming, job.link, exc)
+        else:
+            if self._move_link(job, LINKDEST):
+                links = None
+        if links is not None:
+            shutil.rmtree(incoming, ignore_errors=True)
+            for link in links:
+                os.unlink(link)
+            self._move_link(job, LINKERR)
+            return
+
+        # Create a link in each of the unpacked states, counting any failures
+        # as one error since they are for a single tar ball.
+        errors = 0
+        for state in self.unpacked_states:
+            state_link = Path(tb.parent, state, tb.name)
+            try:
+                if os.path.lexists(state_link):
+                    os.unlink(state_link)
+                os.symlink(tb, state_link)
+            except OSError as exc:
+                self.logger.error(
+                    "Cannot create {} link in state {}: {}", tb, state, exc
+                )
+                self.messages.append(f"Cannot create {tb} link in state {state}: {exc}")
+                errors += 1
+        if errors:
+            self.nerrs += 1
+
+        self.logger.info(
+            "{}/{}: success - elapsed time (secs): {:0.2f} - size (bytes): {:d}",
+            controller,
+            job.resultname,
+            self.time() - started,
+            job.size,
+        )
+        self.ntb += 1
+
+    def _failed(self, job, incoming, exc):
+        self._error("Ingest of {} failed: {}", job.link, exc)
+        shutil.rmtree(f"{incoming}.unpack", ignore_errors=True)
+        self._move_link(job, LINKERR)
+
+    def _start(self, job, tb, incoming):
+        """Unpack the given job's tar ball in a worker process of its own,
+        with a thread waiting for its result, or for its death, to post it
+        to run().
+
+        A worker process which dies without sending back a result (e.g.
+        killed by the OOM killer) fails its job with WorkerDied, rather than
+        leaving run() waiting for it forever.
+        """
+        recv, send = self.mp_context.Pipe(duplex=False)
+        proc = self.mp_context.Process(
+            target=_ingest_worker,
+            args=(send, str(tb), f"{incoming}.unpack"),
+            daemon=True,
+        )
+        proc.start()
+        # Only the worker process writes to the pipe, so that the end of
+        # file is seen as soon as it exits.
+        send.close()
+        threading.Thread(target=self._wait, args=(job, proc, recv), daemon=True).start()
+
+    def _wait(self, job, proc, conn):
+        try:
+            ingest, exc = conn.recv()
+        except EOFError:
+            ingest = None
+            exc = None
+        conn.close()
+        proc.join()
+        if ingest is None and exc is None:
+            exc = WorkerDied(
+                f"worker process {proc.pid} died, exit status {proc.exitcode}"
+            )
+        self._events.put((job, ingest, exc))
+
+    def notify(self):
+        """Have run() look for new tar balls right away, rather than waiting
+        for its next rescan; wake-ups not yet acted upon are coalesced.
+        """
+        if not self._wake.is_set():
+            self._wake.set()
+            self._events.put(None)
+
+    def run(self, stop=None):
+        """Unpack tar balls until there are none left in TO-UNPACK, or, given
+        a threading.Event, until it is set (and notify() is called), returning
+        the number successfully unpacked since the last status report.
+
+        Once the stop event is set, no more tar balls are started, but those
+        being unpacked are finished.
+        """
+
+        def stopping():
+            return stop is not None and stop.is_set()
+
+        # Map of each job being unpacked to its tar ball path, INCOMING
+        # directory, and start time.
+        running = {}
+        in_flight = 0
+        while True:
+            self._wake.clear()
+            if not stopping():
+                self.scan()
+            scanned = time.monotonic()
+            self._maybe_report()
+            if not running and (stopping() or (stop is None and not self.queue)):
+                break
+            while running or (not stopping() and (self.queue or stop is not None)):
+                # Hand out as many tar balls as there are idle workers,
+                # and room in the I/O budget.
+                while self.queue and len(running) < self.workers and not stopping():
+                    job = self.queue.peek()
+                    if (
+                        running
+                        and self.io_budget is not None
+                        and in_flight + job.size > self.io_budget
+                    ):
+                        break
+                    self.queue.pop()
+                    prepared = self._prepare(job)
+                    if prepared is None:
+                        continue
+                    tb, incoming = prepared
+                    running[job] = (tb, incoming, self.time())
+                    in_flight += job.size
+                    self._start(job, tb, incoming)
+                if not running and (stop is None or stopping()):
+                    continue
+                timeout = self.rescan - (time.monotonic() - scanned)
+                try:
+                    event = self._events.get(timeout=max(timeout, 0))
+                except queue.Empty:
+                    # Time to look for new tar balls.
+                    break
+                if event is None:
+                    # Woken up by notify().
+                    break
+                job, ingest, exc = event
+                tb, incoming, started = running.pop(job)
+                in_flight -= job.size
+                if exc is not None:
+                    self._failed(job, incoming, exc)
+                else:
+                    self._finish(job, tb, incoming, ingest, started)
+        ntb = self.ntb
+        self._maybe_report(final=True)
+        return ntb
@@ -0,0 +1,8 @@
+"""Synthetic pbench tar balls, and a harness benchmarking the indexer on them.
+
+See pbench.test.benchmark.tarball for the generator of the tar balls, and
+pbench.test.benchmark.harness for the scenarios benchmarked, which can be run
+with:
+
+    python3 -m pbench.test.benchmark --config <pbench-server.cfg> [scenario ...]
+"""
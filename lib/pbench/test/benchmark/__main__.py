@@ -0,0 +1,6 @@
+import sys
+
+from pbench.test.benchmark.harness import main
+
+
+sys.exit(main())
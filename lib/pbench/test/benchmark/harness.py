@@ -0,0 +1,511 @@
+"""Benchmark the indexer's generation of documents for synthetic tar balls.
+
+Each scenario is a synthetic tar ball (see pbench.test.benchmark.tarball),
+generated once and cached, along with its extracted hierarchy and member
+manifest, in a work directory.  A run of a scenario constructs the
+PbenchTarBall object, and consumes all the actions of both indexing passes,
+PbenchTarBall.make_all_actions() and PbenchTarBall.mk_tool_data_actions(),
+with a null sink which only counts the documents and their bytes, so the
+measurements are of the indexer alone, and not of Elasticsearch.
+
+With "--sink bulk", the actions are instead indexed by the pipelined bulk
+indexer (see pbench.server.bulk) into a MockBulkServer (see
+pbench.server.mock), a local HTTP stand-in for the Elasticsearch bulk API
+with a configurable latency, throughput, and rate of throttled, rejected,
+and failed requests and documents, so that the pipelining, retries, and
+concurrency of the whole indexing path can be load tested without a cluster.
+
+Each run takes place in its own worker process, so that the peak RSS
+reported is that of the scenario alone.  The documents/sec, bytes/sec, wall
+clock and CPU time, and peak RSS of each run are reported, along with the
+time spent in each phase of indexing (see pbench.server.indexer.PhaseMetrics),
+and can be appended to a history file of JSON lines, against which later runs
+of the same scenario are compared.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from datetime import datetime
+from multiprocessing import Pool
+
+from elasticsearch import Elasticsearch
+
+from pbench.server.indexer import IdxContext, PbenchTarBall, VERSION, es_index
+from pbench.server.manifest import write_manifest
+from pbench.server.mock import MockBulkServer
+from pbench.test.benchmark.tarball import (
+    KNOWN_TOOLS,
+    TarBallSpec,
+    generate,
+    tarball_name,
+)
+
+
+# The scenarios benchmarked, each stressing a different part of the indexer.
+SCENARIOS = {
+    # A typical small run.
+    "small": TarBallSpec(),
+    # Many units of tool data, each of a modest size.
+    "many-samples": TarBallSpec(iterations=5, samples=5, hosts=2),
+    # Few units of tool data, each very wide.
+    "wide-tools": TarBallSpec(
+        samples=1, disks=32, cpus=64, processes=200, interrupts=64
+    ),
+    # Long running samples, with lots of tool data records.
+    "long-samples": TarBallSpec(
+        iterations=1, samples=2, sample_seconds=3600, interval=1
+    ),
+    # A large result.json file, and no tool data.
+    "large-result": TarBallSpec(
+        iterations=10, samples=5, tools=(), result_metrics=8, result_points=600
+    ),
+    # Lots of files, exercising the member manifest and the TOC.
+    "many-files": TarBallSpec(tools=(), files=50000),
+    # All of the above, a little.
+    "mixed": TarBallSpec(
+        iterations=3,
+        samples=3,
+        hosts=3,
+        tools=KNOWN_TOOLS,
+        cpus=16,
+        result_metrics=4,
+        result_points=300,
+        files=5000,
+    ),
+}
+
+# The name of the controller directory of all the synthetic tar balls.
+_CONTROLLER = "bench-controller"
+
+
+class NullSink:
+    """Consume actions as quickly as possible, counting the documents and the
+    bytes of their JSON form.
+
+    Actions generated for the pipelined bulk indexer, or for bulk files,
+    carry the JSON form of their document, otherwise the document is
+    converted to JSON here, as the bulk indexer would.
+    """
+
+    def __init__(self):
+        self.docs = 0
+        self.bytes = 0
+
+    def counted(self, actions):
+        """Yield the given actions, counting them as they go by.
+        """
+        for action in actions:
+            source = action["_source"]
+            if not isinstance(source, bytes):
+                source = json.dumps(source).encode("utf-8")
+            self.docs += 1
+            self.bytes += len(source)
+            yield action
+
+    def consume(self, actions):
+        for _ in self.counted(actions):
+            pass
+
+
+def prepare(workdir, name, spec):
+    """Generate (or reuse) the tar ball of the given scenario, along with its
+    extracted hierarchy and member manifest, returning the path of the tar
+    ball and of the directory holding its extracted hierarchy.
+
+    The tar balls are named after the scenario and the digest of its spec,
+    so a change to the spec of a scenario generates a new tar ball.
+    """
+    controller_dir = os.path.join(workdir, "archive", _CONTROLLER)
+    extracted_root = os.path.join(workdir, "incoming", _CONTROLLER)
+    tb_name = f"{name}-{spec.digest()}"
+    tb_path = os.path.join(controller_dir, f"{tarball_name(tb_name)}.tar.xz")
+    if not os.path.exists(f"{tb_path}.md5"):
+        tb_path = generate(spec, tb_name, controller_dir, tmpdir=workdir)
+    dirname = os.path.basename(tb_path)[: -len(".tar.xz")]
+    if not os.path.isdir(os.path.join(extracted_root, dirname)):
+        os.makedirs(extracted_root, exist_ok=True)
+        tmp_root = tempfile.mkdtemp(prefix=".", dir=extracted_root)
+        with tarfile.open(tb_path) as tb:
+            tb.extractall(tmp_root)
+        os.rename(
+            os.path.join(tmp_root, dirname), os.path.join(extracted_root, dirname)
+        )
+        os.rmdir(tmp_root)
+        write_manifest(tb_path)
+    return tb_path, extracted_root
+
+
+def _cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_once(cfg_name, tb_path, extracted_root, es_address=None, bulk_options=None):
+    """Construct the PbenchTarBall object of the given tar ball and consume
+    all its actions, returning the measurements of doing so.
+
+    The actions are consumed by a null sink, unless the (host, port) address
+    of an Elasticsearch stand-in is given, in which case they are indexed
+    there by the pipelined bulk indexer, using the bulk indexing options of
+    the configuration file, overridden by any given bulk options.
+
+    This is expected to run in a worker process of its own.
+    """
+    idxctx = IdxContext(
+        Namespace(cfg_name=cfg_name, tool_data_workers=1), "pbench-index-benchmark"
+    )
+    sink = NullSink()
+    if es_address is None:
+        index = sink.consume
+        bulk = None
+    else:
+        host, port = es_address
+        es = Elasticsearch([dict(host=host, port=port)], max_retries=0)
+        options = dict(idxctx.bulk_options)
+        options.update(bulk_options or {})
+        if options["in_flight"] <= 0:
+            options["in_flight"] = 1
+        bulk = Counter()
+        errorsfp = open(os.devnull, "w")
+
+        def index(actions):
+            res = es_index(
+                es, sink.counted(actions), errorsfp, idxctx.logger, **options
+            )
+            _, _, successes, duplicates, failures, retries = res
+            bulk.update(
+                successes=successes,
+                duplicates=duplicates,
+                failures=failures,
+                retries=retries,
+            )
+
+    usage_beg = resource.getrusage(resource.RUSAGE_SELF)
+    beg = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="pbench-index-benchmark.") as tmpdir:
+        ptb = PbenchTarBall(idxctx, tb_path, tmpdir, extracted_root)
+        index(ptb.make_all_actions())
+        index(ptb.mk_tool_data_actions())
+    seconds = time.perf_counter() - beg
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    if bulk is not None:
+        errorsfp.close()
+    return dict(
+        docs=sink.docs,
+        bytes=sink.bytes,
+        seconds=seconds,
+        cpu_seconds=_cpu_seconds(usage_end) - _cpu_seconds(usage_beg),
+        docs_per_sec=sink.docs / seconds if seconds > 0 else None,
+        bytes_per_sec=sink.bytes / seconds if seconds > 0 else None,
+        max_rss_kb=usage_end.ru_maxrss,
+        phases=ptb.metrics.as_list(),
+        # Any problems the indexer encountered with the synthetic data.
+        errors=[
+            dict(object=ctx["object"], counters=dict(ctx["counters"]))
+            for ctx in idxctx.opctx
+            if ctx["counters"]
+        ],
+        bulk=None if bulk is None else dict(bulk),
+    )
+
+
+def run_scenario(
+    cfg_name, tb_path, extracted_root, repeat, mock=None, bulk_options=None
+):
+    """Run the given scenario the given number of times, each time in a new
+    worker process, returning the measurements of the fastest run, with the
+    peak RSS of all the runs.
+
+    When a (running) MockBulkServer is given, the actions are indexed there,
+    and the server's counters for each run are reported with it.
+    """
+    best = None
+    max_rss_kb = 0
+    for _ in range(repeat):
+        if mock is None:
+            args = (cfg_name, tb_path, extracted_root)
+        else:
+            mock.reset()
+            args = (cfg_name, tb_path, extracted_root, mock.address, bulk_options)
+        with Pool(1) as pool:
+            res = pool.apply(run_once, args)
+        if mock is not None:
+            res["server"] = mock.stats()
+        max_rss_kb = max(max_rss_kb, res["max_rss_kb"])
+        if best is None or res["seconds"] < best["seconds"]:
+            best = res
+    best["max_rss_kb"] = max_rss_kb
+    return best
+
+
+def _commit_id():
+    """Return the abbreviated commit ID of the source tree being benchmarked,
+    or None when it can't be determined.
+    """
+    try:
+        cp = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+    except OSError:
+        return None
+    return cp.stdout.strip() if cp.returncode == 0 else None
+
+
+def load_history(history_file):
+    """Return the records of the given history file, or an empty list if
+    there is no such file.
+    """
+    records = []
+    try:
+        with open(history_file) as fp:
+            for line in fp:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def previous_record(records, scenario, digest):
+    """Return the last of the given history records of the given scenario
+    and spec digest, or None.
+    """
+    for rec in reversed(records):
+        if rec["scenario"] == scenario and rec["digest"] == digest:
+            return rec
+    return None
+
+
+def _change(cur, prev):
+    if not prev:
+        return ""
+    return f"{(cur - prev) * 100.0 / prev:+.1f}%"
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog="python3 -m pbench.test.benchmark",
+        description="Benchmark the indexer's generation of documents for"
+        " synthetic tar balls",
+    )
+    parser.add_argument(
+        "-C",
+        "--config",
+        dest="cfg_name",
+        default=os.environ.get("_PBENCH_SERVER_CONFIG"),
+        help="Specify config file",
+    )
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "pbench-index-benchmark"),
+        help="Directory where the synthetic tar balls are generated and kept",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times each scenario is run, the fastest run is reported",
+    )
+    parser.add_argument(
+        "--history",
+        default=None,
+        help="File of JSON lines to which the results are appended, and"
+        " against which they are compared",
+    )
+    parser.add_argument(
+        "--label", default=None, help="Label recorded with the results in the history"
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        default=False,
+        help="List the scenarios and their specs",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=("null", "bulk"),
+        default="null",
+        help="Consume the actions with a null sink, or index them into a mock"
+        " Elasticsearch bulk API",
+    )
+    bulk_group = parser.add_argument_group(
+        "bulk sink", "Behavior of the mock bulk API, and of the bulk indexer"
+    )
+    bulk_group.add_argument(
+        "--latency",
+        type=float,
+        default=0.005,
+        help="Seconds added to each bulk request (default %(default)s)",
+    )
+    bulk_group.add_argument(
+        "--throughput",
+        type=float,
+        default=50.0,
+        help="Megabytes per second at which bulk requests are handled, 0 for"
+        " no limit (default %(default)s)",
+    )
+    bulk_group.add_argument(
+        "--capacity",
+        type=int,
+        default=4,
+        help="Number of bulk requests serviced at one time (default %(default)s)",
+    )
+    bulk_group.add_argument(
+        "--queue",
+        type=int,
+        default=200,
+        help="Number of bulk requests waiting for service before requests are"
+        " rejected (default %(default)s)",
+    )
+    bulk_group.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of bulk requests throttled (429)",
+    )
+    bulk_group.add_argument(
+        "--reject-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of documents rejected (429)",
+    )
+    bulk_group.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of documents failing (400)",
+    )
+    bulk_group.add_argument(
+        "--in-flight",
+        type=int,
+        default=None,
+        help="Maximum number of bulk requests in flight (default from the"
+        " configuration file)",
+    )
+    bulk_group.add_argument(
+        "--chunk-docs",
+        type=int,
+        default=None,
+        help="Maximum number of documents in one bulk request (default from"
+        " the configuration file)",
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="Names of the scenarios to run (all of them by default)",
+    )
+    options = parser.parse_args(argv)
+
+    if options.list:
+        for name, spec in SCENARIOS.items():
+            print(f"{name}: {json.dumps(spec.as_dict(), sort_keys=True)}")
+        return 0
+    if not options.cfg_name:
+        parser.error(
+            "a pbench server configuration file is required (--config, or the"
+            " _PBENCH_SERVER_CONFIG environment variable)"
+        )
+    unknown = [name for name in options.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    names = options.scenarios or list(SCENARIOS)
+
+    mock = None
+    bulk_options = {}
+    if options.sink == "bulk":
+        mock = MockBulkServer(
+            latency=options.latency,
+            throughput=options.throughput * 1024 * 1024 or None,
+            capacity=options.capacity,
+            queue=options.queue,
+            throttle_rate=options.throttle_rate,
+            reject_rate=options.reject_rate,
+            failure_rate=options.failure_rate,
+            seed=0,
+        ).start()
+        if options.in_flight is not None:
+            bulk_options["in_flight"] = options.in_flight
+        if options.chunk_docs is not None:
+            bulk_options["chunk_docs"] = options.chunk_docs
+
+    history = load_history(options.history) if options.history else []
+    ts = datetime.utcnow().isoformat()
+    commit = _commit_id()
+    os.makedirs(options.workdir, exist_ok=True)
+    print(
+        f"{'scenario':<14} {'docs':>9} {'secs':>8} {'docs/s':>10} {'MB/s':>8}"
+        f" {'cpu s':>8} {'RSS MB':>8} {'vs prev':>8}"
+    )
+    records = []
+    try:
+        for name in names:
+            rec = _bench(options, name, mock, bulk_options, history)
+            rec.update(ts=ts, label=options.label, commit=commit, version=VERSION)
+            records.append(rec)
+    finally:
+        if mock is not None:
+            mock.stop()
+    if options.history:
+        with open(options.history, "a") as fp:
+            for rec in records:
+                fp.write(json.dumps(rec, sort_keys=True) + "\n")
+    return 0
+
+
+def _bench(options, name, mock, bulk_options, history):
+    """Run the named scenario, print its results, and return its record.
+    """
+    spec = SCENARIOS[name]
+    tb_path, extracted_root = prepare(options.workdir, name, spec)
+    res = run_scenario(
+        options.cfg_name,
+        tb_path,
+        extracted_root,
+        options.repeat,
+        mock=mock,
+        bulk_options=bulk_options,
+    )
+    rec = dict(
+        scenario=name,
+        sink=options.sink,
+        digest=spec.digest(),
+        spec=spec.as_dict(),
+        **res,
+    )
+    # Only compare against previous runs using the same sink.
+    prev = previous_record(
+        [r for r in history if r.get("sink", "null") == options.sink],
+        name,
+        rec["digest"],
+    )
+    print(
+        f"{name:<14} {res['docs']:>9d} {res['seconds']:>8.2f}"
+        f" {res['docs_per_sec'] or 0:>10.0f}"
+        f" {(res['bytes_per_sec'] or 0) / (1024 * 1024):>8.2f}"
+        f" {res['cpu_seconds']:>8.2f} {res['max_rss_kb'] / 1024:>8.1f}"
+        f" {_change(res['docs_per_sec'], prev and prev['docs_per_sec']):>8}"
+    )
+    if mock is not None:
+        bulk, server = res["bulk"], res["server"]
+        print(
+            f"{'':<14} indexed {bulk['successes']}, duplicates"
+            f" {bulk['duplicates']}, failed {bulk['failures']}, retries"
+            f" {bulk['retries']}; server: requests {server.get('requests', 0)},"
+            f" throttled {server.get('throttled_requests', 0)}, rejected"
+            f" {server.get('rejected_requests', 0)}, max concurrent"
+            f" {server['max_concurrent']}"
+        )
+    sys.stdout.flush()
+    return rec
@@ -0,0 +1,464 @@
+"""Generate synthetic pbench tar balls for benchmarking the indexer.
+
+The tar balls generated have the layout of a tar ball produced by the pbench
+agent for a pbench-uperf run:
+
+    <name>/metadata.log
+    <name>/result.json
+    <name>/sysinfo/{beg,end}/<host>/sosreport-<host>-pbench-{beg,end}.tar.xz[.md5]
+    <name>/<iteration>/result.json
+    <name>/<iteration>/<sample>/result.json
+    <name>/<iteration>/<sample>/tools-default/<host>/<tool>/...
+    <name>/tmp/filler/<dir>/<file>
+
+with the number of iterations, samples, hosts, and tools, the amount of tool
+data and result data, and the number of files, given by a TarBallSpec.  The
+tool data files have the formats the indexer handles: iostat, mpstat, and
+pidstat CSV files, proc-interrupts periodic time stamp stdout, and
+prometheus-metrics JSON.  The content is pseudo-random, but repeatable for a
+given seed.
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tarfile
+import tempfile
+from datetime import datetime, timedelta
+
+
+# The tools for which data can be generated.
+KNOWN_TOOLS = ("iostat", "mpstat", "pidstat", "proc-interrupts", "prometheus-metrics")
+
+# The start of every generated run.
+_START = datetime(2020, 1, 1, 0, 0, 0)
+_START_EPOCH = 1577836800
+
+_IOSTAT_FILES = (
+    "disk_IOPS.csv",
+    "disk_Queue_Size.csv",
+    "disk_Request_Merges_per_sec.csv",
+    "disk_Request_Size_in_512_byte_sectors.csv",
+    "disk_Throughput_MB_per_sec.csv",
+    "disk_Utilization_percent.csv",
+    "disk_Wait_Time_msec.csv",
+)
+
+_PIDSTAT_FILES = (
+    "context_switches_nonvoluntary_switches_sec.csv",
+    "context_switches_voluntary_switches_sec.csv",
+    "cpu_usage_percent_cpu.csv",
+    "file_io_io_reads_KB_sec.csv",
+    "file_io_io_writes_KB_sec.csv",
+    "memory_faults_major_faults_sec.csv",
+    "memory_faults_minor_faults_sec.csv",
+    "memory_usage_resident_set_size.csv",
+    "memory_usage_virtual_size.csv",
+)
+
+_MPSTAT_COLUMNS = (
+    "guest",
+    "idle",
+    "iowait",
+    "irq",
+    "nice",
+    "softirq",
+    "steal",
+    "sys",
+    "usr",
+)
+
+
+class TarBallSpec:
+    """The shape and size of a synthetic tar ball.
+
+    iterations         - number of iterations of the benchmark
+    samples            - number of samples of each iteration
+    hosts              - number of hosts running tools
+    tools              - names of the tools run on each host (see KNOWN_TOOLS)
+    sample_seconds     - duration of each sample
+    interval           - seconds between tool data records
+    disks              - number of disks reported by iostat
+    cpus               - number of CPUs reported by mpstat and proc-interrupts
+    processes          - number of processes reported by pidstat
+    interrupts         - number of interrupt lines reported by proc-interrupts
+    prometheus_series  - number of time series of prometheus-metrics
+    result_metrics     - number of metrics of each result data class
+    result_points      - number of points of each result time series
+    files              - number of extra (filler) files
+    files_per_dir      - number of filler files in each directory
+    sosreports         - whether sosreports are included
+    seed               - seed of the pseudo-random content
+    """
+
+    def __init__(
+        self,
+        iterations=2,
+        samples=2,
+        hosts=1,
+        tools=KNOWN_TOOLS,
+        sample_seconds=60,
+        interval=3,
+        disks=4,
+        cpus=4,
+        processes=20,
+        interrupts=16,
+        prometheus_series=10,
+        result_metrics=2,
+        result_points=60,
+        files=0,
+        files_per_dir=100,
+        sosreports=True,
+        seed=0,
+    ):
+        unknown = set(tools) - set(KNOWN_TOOLS)
+        if unknown:
+            raise ValueError(f"Unknown tools: {', '.join(sorted(unknown))}")
+        self.iterations = iterations
+        self.samples = samples
+        self.hosts = hosts
+        self.tools = tuple(tools)
+        self.sample_seconds = sample_seconds
+        self.interval = interval
+        self.disks = disks
+        self.cpus = cpus
+        self.processes = processes
+        self.interrupts = interrupts
+        self.prometheus_series = prometheus_series
+        self.result_metrics = result_metrics
+        self.result_points = result_points
+        self.files = files
+        self.files_per_dir = files_per_dir
+        self.sosreports = sosreports
+        self.seed = seed
+
+    def as_dict(self):
+        d = vars(self).copy()
+        d["tools"] = list(self.tools)
+        return d
+
+    def digest(self):
+        """Return a short digest of the spec, identifying the tar balls
+        generated from it.
+        """
+        return hashlib.md5(
+            json.dumps(self.as_dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+
+def _iteration_name(number):
+    return f"{number:d}-tcp_rr-{64 * number:d}B-8i"
+
+
+def _host_name(number):
+    return f"host{number:d}"
+
+
+class _Generator:
+    """The state of generating one synthetic tar ball hierarchy.
+    """
+
+    def __init__(self, spec, name, root):
+        self.spec = spec
+        self.name = name
+        self.root = root
+        self.rand = random.Random(spec.seed)
+        self.hosts = [_host_name(i) for i in range(spec.hosts)]
+        self.iterations = [_iteration_name(i) for i in range(1, spec.iterations + 1)]
+        # The run is made up of all the samples of all the iterations one
+        # after the other, with some slack before and after.
+        self.duration = spec.iterations * spec.samples * spec.sample_seconds + 20
+
+    def path(self, *parts):
+        p = os.path.join(self.root, self.name, *parts)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        return p
+
+    def sample_start(self, iteration_idx, sample_idx):
+        """Return the start of the given sample in seconds since the epoch.
+        """
+        n = iteration_idx * self.spec.samples + sample_idx
+        return _START_EPOCH + 10 + n * self.spec.sample_seconds
+
+    def timestamps(self, start):
+        """Return the time stamps of the tool data records of a sample
+        starting at the given time, in seconds since the epoch.
+        """
+        count = max(1, self.spec.sample_seconds // self.spec.interval)
+        return [start + i * self.spec.interval for i in range(count)]
+
+    def generate(self):
+        os.makedirs(os.path.join(self.root, self.name))
+        self.metadata_log()
+        if self.spec.sosreports:
+            for when in ("beg", "end"):
+                for host in self.hosts:
+                    self.sosreport(when, host)
+        iterations = []
+        for i_idx, iteration in enumerate(self.iterations):
+            samples = []
+            for s_idx in range(self.spec.samples):
+                sample = f"sample{s_idx + 1:d}"
+                start = self.sample_start(i_idx, s_idx)
+                for host in self.hosts:
+                    for tool in self.spec.tools:
+                        tool_dir = (iteration, sample, "tools-default", host, tool)
+                        getattr(self, tool.replace("-", "_"))(tool_dir, start)
+                samples.append(start)
+            it = self.iteration_result(i_idx + 1, samples)
+            with open(self.path(iteration, "result.json"), "w") as fp:
+                json.dump(it["iteration_data"], fp)
+            for s_idx in range(self.spec.samples):
+                with open(
+                    self.path(iteration, f"sample{s_idx + 1:d}", "result.json"), "w"
+                ) as fp:
+                    json.dump({"sample": s_idx + 1}, fp)
+            iterations.append(it)
+        with open(self.path("result.json"), "w") as fp:
+            json.dump(iterations, fp, indent=3)
+        for i in range(self.spec.files):
+            d = i // max(1, self.spec.files_per_dir)
+            with open(
+                self.path("tmp", "filler", f"d{d:04d}", f"f{i:06d}.txt"), "w"
+            ) as fp:
+                fp.write(f"filler {i:d}\n")
+
+    def metadata_log(self):
+        spec = self.spec
+        start = _START + timedelta(seconds=1)
+        end = _START + timedelta(seconds=self.duration)
+        lines = [
+            "[pbench]",
+            f"name = {self.name}",
+            "script = uperf",
+            "config = synthetic",
+            f"date = {start.isoformat()}",
+            "rpm-version = 0.69.0-1",
+            f"iterations = {', '.join(self.iterations)}",
+            "",
+            "[tools]",
+            f"hosts = {' '.join(self.hosts)}",
+            "group = default",
+            "",
+        ]
+        for host in self.hosts:
+            lines.append(f"[tools/{host}]")
+            lines.append(f"hostname-s = {host}")
+            for tool in spec.tools:
+                lines.append(f"{tool} = --interval={spec.interval:d}")
+            lines.append("")
+        lines += [
+            "[run]",
+            "controller = bench-controller.example.com",
+            f"start_run = {start.isoformat()}.000000000",
+            f"end_run = {end.isoformat()}.000000000",
+            "",
+        ]
+        for number, iteration in enumerate(self.iterations, 1):
+            lines += [
+                f"[iterations/{iteration}]",
+                f"iteration_number = {number:d}",
+                "protocol = tcp",
+                "test_type = rr",
+                f"message_size_bytes = {64 * number:d}",
+                "instances = 8",
+                f"iteration_name = {iteration}",
+                "",
+            ]
+        with open(self.path("metadata.log"), "w") as fp:
+            fp.write("\n".join(lines))
+
+    def sosreport(self, when, host):
+        name = f"sosreport-{host}.example.com-pbench-{when}"
+        sos_path = self.path("sysinfo", when, host, f"{name}.tar.xz")
+        with tarfile.open(sos_path, "w:xz", preset=0) as tb:
+            for member, data in (
+                ("sos_commands/general/hostname", f"{host}\n"),
+                ("sos_commands/general/hostname_-f", f"{host}.example.com\n"),
+                (
+                    "sos_commands/networking/ip_-o_addr",
+                    "1: lo    inet 127.0.0.1/8 scope host lo\n"
+                    f"2: eth0    inet 10.0.0.{self.hosts.index(host) + 1:d}/24"
+                    " scope global eth0\n",
+                ),
+            ):
+                info = tarfile.TarInfo(f"{name}/{member}")
+                info.size = len(data)
+                tb.addfile(info, io.BytesIO(data.encode("utf-8")))
+        with open(sos_path, "rb") as fp:
+            md5 = hashlib.md5(fp.read()).hexdigest()
+        with open(f"{sos_path}.md5", "w") as fp:
+            fp.write(f"{md5}\n")
+
+    def csv(self, path, columns, timestamps, scale):
+        """Write a CSV file of the given columns with a row of random values,
+        which are integers when the scale is, at each of the time stamps.
+        """
+        rand = self.rand
+        fmt = "{:.0f}" if isinstance(scale, int) else "{:.2f}"
+        with open(path, "w") as fp:
+            fp.write(",".join(["timestamp_ms"] + columns) + "\n")
+            for ts in timestamps:
+                values = ",".join(fmt.format(rand.random() * scale) for _ in columns)
+                fp.write(f"{ts * 1000:d},{values}\n")
+
+    def iostat(self, tool_dir, start):
+        columns = [
+            f"sd{chr(ord('a') + d % 26)}{d // 26 or ''}-{rw}"
+            for d in range(self.spec.disks)
+            for rw in ("read", "write")
+        ]
+        timestamps = self.timestamps(start)
+        for fname in _IOSTAT_FILES:
+            self.csv(self.path(*tool_dir, "csv", fname), columns, timestamps, 100.0)
+
+    def mpstat(self, tool_dir, start):
+        timestamps = self.timestamps(start)
+        cpus = ["all"] + [str(c) for c in range(self.spec.cpus)]
+        for cpu in cpus:
+            self.csv(
+                self.path(*tool_dir, "csv", f"cpu{cpu}_cpu{cpu}.csv"),
+                list(_MPSTAT_COLUMNS),
+                timestamps,
+                100.0,
+            )
+
+    def pidstat(self, tool_dir, start):
+        columns = [
+            f"{1000 + p:d}-/usr/bin/proc{p:d}" for p in range(self.spec.processes)
+        ]
+        timestamps = self.timestamps(start)
+        for fname in _PIDSTAT_FILES:
+            # Memory usage is reported in whole kilobytes.
+            scale = 1000000 if fname.startswith("memory_usage") else 1000.0
+            self.csv(self.path(*tool_dir, "csv", fname), columns, timestamps, scale)
+
+    def proc_interrupts(self, tool_dir, start):
+        spec = self.spec
+        header = "      " + "".join(f"CPU{c:<8d}" for c in range(spec.cpus))
+        counts = [[0] * spec.cpus for _ in range(spec.interrupts)]
+        rand = self.rand
+        with open(self.path(*tool_dir, "proc-interrupts-stdout.txt"), "w") as fp:
+            for ts in self.timestamps(start):
+                fp.write(f"timestamp: {ts:d}.000000000\n{header}\n")
+                for i, row in enumerate(counts):
+                    for c in range(spec.cpus):
+                        row[c] += rand.randrange(1000)
+                    values = "".join(f"{v:11d}" for v in row)
+                    fp.write(f"{i:3d}:{values}   IO-APIC  {i:d}-edge      dev{i:d}\n")
+                fp.write(f"ERR:{0:11d}\nMIS:{0:11d}\n")
+
+    def prometheus_metrics(self, tool_dir, start):
+        rand = self.rand
+        with open(self.path(*tool_dir, "json", "metrics.json"), "w") as fp:
+            fp.write("[\n")
+            sep = ""
+            for ts in self.timestamps(start):
+                for series in range(self.spec.prometheus_series):
+                    doc = {
+                        "@timestamp": float(ts),
+                        "prometheus-metrics": {
+                            "name": f"metric_{series:d}",
+                            "labels": {"instance": "localhost:9100"},
+                            "value": rand.random() * 100.0,
+                        },
+                    }
+                    fp.write(sep + json.dumps(doc))
+                    sep = ",\n"
+            fp.write("\n]\n")
+
+    def iteration_result(self, number, sample_starts):
+        """Return the result data of the given iteration, as it appears in
+        the top-level result.json file.
+        """
+        spec = self.spec
+        rand = self.rand
+        iteration_data = {
+            "parameters": {
+                "benchmark": [
+                    {
+                        "benchmark_name": "uperf",
+                        "benchmark_version": "1.0.4",
+                        "clients": "host0.example.com",
+                        "instances": 8,
+                        "message_size_bytes": 64 * number,
+                        "primary_metric": "trans_sec",
+                        "protocol": "tcp",
+                        "servers": "server.example.com",
+                        "test_type": "rr",
+                        "uid": "benchmark_name:%benchmark_name%-controller_host:"
+                        "%controller_host%",
+                    }
+                ]
+            }
+        }
+        step_ms = max(1, spec.sample_seconds * 1000 // max(1, spec.result_points))
+        for result_type, title in (("throughput", "trans_sec"), ("latency", "usec")):
+            metrics = []
+            for m in range(spec.result_metrics):
+                samples = []
+                for start in sample_starts:
+                    timeseries = [
+                        {"date": start * 1000 + i * step_ms, "value": rand.random()}
+                        for i in range(spec.result_points)
+                    ]
+                    value = sum(p["value"] for p in timeseries) / max(
+                        1, len(timeseries)
+                    )
+                    samples.append({"timeseries": timeseries, "value": value})
+                metrics.append(
+                    {
+                        "client_hostname": f"host{m:d}.example.com",
+                        "closest sample": 1,
+                        "description": f"Synthetic {title} metric",
+                        "mean": samples[0]["value"] if samples else 0,
+                        "role": "client",
+                        "samples": samples,
+                        "server_hostname": "server.example.com",
+                        "server_port": "20010",
+                        "stddev": 0,
+                        "stddevpct": 0,
+                        "uid": "client_hostname:%client_hostname%-server_hostname:"
+                        "%server_hostname%-server_port:%server_port%",
+                    }
+                )
+            iteration_data[result_type] = {title: metrics}
+        return {
+            "iteration_data": iteration_data,
+            "iteration_name": self.iterations[number - 1],
+            "iteration_number": number,
+        }
+
+
+def tarball_name(name):
+    """Return the name of the run of a synthetic tar ball with the given name.
+    """
+    return f"uperf_{name}_{_START.strftime('%Y.%m.%dT%H.%M.%S')}"
+
+
+def generate(spec, name, controller_dir, tmpdir=None):
+    """Generate a synthetic tar ball, and its .md5 file, of the given spec in
+    the given controller directory, returning the path of the tar ball.
+    """
+    run_name = tarball_name(name)
+    os.makedirs(controller_dir, exist_ok=True)
+    tb_path = os.path.join(controller_dir, f"{run_name}.tar.xz")
+    root = tempfile.mkdtemp(prefix="pbench-synthetic.", dir=tmpdir)
+    try:
+        _Generator(spec, run_name, root).generate()
+        # A low compression preset keeps the generation of large tar balls
+        # quick; indexing works from the extracted hierarchy anyway.
+        with tarfile.open(tb_path, "w:xz", preset=0) as tb:
+            tb.add(os.path.join(root, run_name), arcname=run_name)
+    finally:
+        shutil.rmtree(root)
+    md5 = hashlib.md5()
+    with open(tb_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            md5.update(chunk)
+    with open(f"{tb_path}.md5", "w") as fp:
+        fp.write(f"{md5.hexdigest()}  {run_name}.tar.xz\n")
+    return tb_path
@@ -9,7 +9,7 @@ from pathlib import Path
 
 from pbench import PbenchConfig
 from pbench.common.exceptions import BadConfig
-from pbench.common.logger import get_pbench_logger, _handlers
+from pbench.common.logger import get_pbench_logger, reset_pbench_logger, _handlers
 
 
 class TestLoggingSetup:
@@ -138,3 +138,30 @@ class TestLoggingSetup:
         assert (
             logger.logger.getEffectiveLevel() == logging.CRITICAL
         ), f"Unexpected logging level, {logger.logger.getEffectiveLevel()}"
+
+    def test_reset_logger(self):
+        """Test the handler is rebuilt per the new configuration after a reset."""
+        fname = "test_reset_logger"
+        self.config.logger_type = "file"
+        with tempfile.TemporaryDirectory(
+            suffix=".d", prefix="pbench-common-unit-tests."
+        ) as TMP:
+            self.config.log_dir = str(Path(TMP) / "log-dir")
+            logger = get_pbench_logger(fname, self.config)
+            handler = _handlers[fname]
+            self.config.log_dir = str(Path(TMP) / "new-log-dir")
+            # Without a reset, the first handler is kept.
+            assert get_pbench_logger(fname, self.config).logger.handlers == [handler]
+            reset_pbench_logger(fname)
+            assert fname not in _handlers
+            assert logger.logger.handlers == []
+            logger = get_pbench_logger(fname, self.config)
+            assert logger.logger.handlers == [_handlers[fname]]
+            assert _handlers[fname] is not handler
+            logger.info("{} message", "new")
+            reset_pbench_logger(fname)
+            assert (
+                (Path(self.config.log_dir) / f"{fname}.log")
+                .read_text()
+                .endswith("-- new message\n")
+            )
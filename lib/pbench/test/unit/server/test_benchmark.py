@@ -0,0 +1,112 @@
+import hashlib
+import json
+import tarfile
+from configparser import ConfigParser
+
+import pytest
+
+from pbench.test.benchmark.harness import NullSink, previous_record
+from pbench.test.benchmark.tarball import TarBallSpec, generate, tarball_name
+
+
+_SPEC = dict(
+    iterations=2,
+    samples=1,
+    hosts=2,
+    sample_seconds=9,
+    interval=3,
+    disks=1,
+    cpus=2,
+    processes=2,
+    interrupts=2,
+    prometheus_series=2,
+    result_metrics=1,
+    result_points=3,
+    files=3,
+    files_per_dir=2,
+    sosreports=False,
+)
+
+
+def _members(tb_path):
+    with tarfile.open(tb_path) as tb:
+        return {
+            m.name: tb.extractfile(m).read() if m.isfile() else None
+            for m in tb.getmembers()
+        }
+
+
+class TestSyntheticTarBall:
+    @staticmethod
+    def test_generate(tmp_path):
+        tb_path = generate(TarBallSpec(**_SPEC), "t", str(tmp_path / "ctrl"))
+        name = tarball_name("t")
+        assert tb_path == str(tmp_path / "ctrl" / f"{name}.tar.xz")
+        with open(tb_path, "rb") as fp:
+            md5 = hashlib.md5(fp.read()).hexdigest()
+        with open(f"{tb_path}.md5") as fp:
+            assert fp.read().split()[0] == md5
+
+        members = _members(tb_path)
+        assert all(m.split("/")[0] == name for m in members)
+        md = ConfigParser()
+        md.read_string(members[f"{name}/metadata.log"].decode("utf-8"))
+        assert md.get("tools", "hosts") == "host0 host1"
+        iterations = md.get("pbench", "iterations").split(", ")
+        assert iterations == ["1-tcp_rr-64B-8i", "2-tcp_rr-128B-8i"]
+
+        tool_dir = f"{name}/{iterations[0]}/sample1/tools-default/host1"
+        iops = members[f"{tool_dir}/iostat/csv/disk_IOPS.csv"].decode("utf-8")
+        lines = iops.splitlines()
+        assert lines[0] == "timestamp_ms,sda-read,sda-write"
+        assert len(lines) == 4
+        assert f"{tool_dir}/mpstat/csv/cpuall_cpuall.csv" in members
+        assert f"{tool_dir}/mpstat/csv/cpu1_cpu1.csv" in members
+        procint = members[f"{tool_dir}/proc-interrupts/proc-interrupts-stdout.txt"]
+        assert procint.decode("utf-8").count("timestamp: ") == 3
+        metrics = json.loads(
+            members[f"{tool_dir}/prometheus-metrics/json/metrics.json"]
+        )
+        assert len(metrics) == 6
+
+        results = json.loads(members[f"{name}/result.json"])
+        assert [it["iteration_name"] for it in results] == iterations
+        samples = results[1]["iteration_data"]["throughput"]["trans_sec"][0]["samples"]
+        assert len(samples) == 1
+        assert len(samples[0]["timeseries"]) == 3
+
+        assert f"{name}/tmp/filler/d0001/f000002.txt" in members
+
+    @staticmethod
+    def test_repeatable(tmp_path):
+        spec = TarBallSpec(**_SPEC)
+        assert spec.digest() == TarBallSpec(**_SPEC).digest()
+        assert spec.digest() != TarBallSpec(**dict(_SPEC, seed=1)).digest()
+        first = _members(generate(spec, "t", str(tmp_path / "a")))
+        second = _members(generate(spec, "t", str(tmp_path / "b")))
+        assert first == second
+
+    @staticmethod
+    def test_unknown_tool():
+        with pytest.raises(ValueError, match="Unknown tools: sar"):
+            TarBallSpec(tools=("iostat", "sar"))
+
+
+class TestHarness:
+    @staticmethod
+    def test_null_sink():
+        sink = NullSink()
+        sink.consume([dict(_source=b'{"a": 1}'), dict(_source={"b": [1, 2]})])
+        assert sink.docs == 2
+        assert sink.bytes == 8 + len('{"b": [1, 2]}')
+
+    @staticmethod
+    def test_previous_record():
+        records = [
+            dict(scenario="small", digest="d1", docs_per_sec=1),
+            dict(scenario="small", digest="d2", docs_per_sec=2),
+            dict(scenario="small", digest="d1", docs_per_sec=3),
+            dict(scenario="mixed", digest="d1", docs_per_sec=4),
+        ]
+        assert previous_record(records, "small", "d1")["docs_per_sec"] == 3
+        assert previous_record(records, "small", "d3") is None
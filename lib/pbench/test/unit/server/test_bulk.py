@@ -0,0 +1,211 @@
+import gzip
+import io
+import json
+import threading
+
+import pytest
+from elasticsearch.exceptions import TransportError
+
+from pbench.common.exceptions import BulkFileError
+from pbench.server.bulk import (
+    PipelinedBulk,
+    action_lines,
+    load_progress,
+    read_bulk_file,
+    save_progress,
+    write_bulk_file,
+)
+
+
+def _action(i, index="idx"):
+    return {
+        "_op_type": "create",
+        "_index": index,
+        "_id": f"id{i:04d}",
+        "_source": {"n": i, "name": f"dóc {i}"},
+    }
+
+
+class FakeES:
+    """Record the bulk requests made, responding to each document with the
+    status returned by the given function of the document ID and the number
+    of times it was seen before.
+    """
+
+    def __init__(self, status_of=None, fail_requests=0):
+        self.status_of = status_of or (lambda _id, seen: 201)
+        self.fail_requests = fail_requests
+        self.bodies = []
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def bulk(self, body, request_timeout=None):
+        with self.lock:
+            self.bodies.append(body)
+            if self.fail_requests > 0:
+                self.fail_requests -= 1
+                raise TransportError(429, "es_rejected_execution_exception", {})
+            lines = body.decode("utf-8").splitlines()
+            items = []
+            for meta_line, source_line in zip(lines[::2], lines[1::2]):
+                meta = json.loads(meta_line)["create"]
+                json.loads(source_line)
+                seen = self.seen.get(meta["_id"], 0)
+                self.seen[meta["_id"]] = seen + 1
+                status = self.status_of(meta["_id"], seen)
+                resp = {"_index": meta["_index"], "_id": meta["_id"], "status": status}
+                if status >= 300:
+                    resp["error"] = {"type": "some_exception"}
+                items.append({"create": resp})
+            return {"errors": False, "items": items}
+
+
+class FakeLogger:
+    """Collect the messages logged, which use "{}" formatting.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, msg, *args):
+        self.messages.append(msg.format(*args))
+
+
+def _bulk(es, errorsfp=None, **kwargs):
+    return PipelinedBulk(
+        es, errorsfp or io.StringIO(), FakeLogger(), sleep=lambda secs: None, **kwargs,
+    )
+
+
+class TestPipelinedBulk:
+    @staticmethod
+    def test_chunk_docs():
+        es = FakeES()
+        res = _bulk(es, in_flight=3, chunk_docs=10).run(_action(i) for i in range(95))
+        assert res[2:] == (95, 0, 0, 0)
+        assert [body.count(b"\n") // 2 for body in es.bodies] == [10] * 9 + [5]
+        assert b"".join(es.bodies) == b"".join(
+            action_lines(_action(i)) for i in range(95)
+        )
+
+    @staticmethod
+    def test_chunk_bytes():
+        es = FakeES()
+        size = len(action_lines(_action(0)))
+        res = _bulk(es, chunk_bytes=3 * size).run(_action(i) for i in range(10))
+        assert res[2:] == (10, 0, 0, 0)
+        assert [body.count(b"\n") // 2 for body in es.bodies] == [3, 3, 3, 1]
+
+    @staticmethod
+    def test_statuses():
+        def status_of(_id, seen):
+            n = int(_id[2:])
+            if n % 10 == 1:
+                return 409
+            if n % 10 == 2:
+                return 400
+            if n % 10 == 3 and seen == 0:
+                return 429
+            if n % 10 == 4 and seen == 0:
+                return 503
+            if n % 10 == 5 and seen == 1:
+                # A retried document which made it in the first time.
+                return 409
+            if n % 10 == 5 and seen == 0:
+                return 500
+            return 201
+
+        es = FakeES(status_of)
+        errorsfp = io.StringIO()
+        bulk = _bulk(es, errorsfp, in_flight=4, chunk_docs=7)
+        beg, end, successes, duplicates, failures, retries = bulk.run(
+            _action(i) for i in range(100)
+        )
+        assert beg <= end
+        assert (successes, duplicates, failures) == (80, 10, 10)
+        assert retries > 0
+        assert errorsfp.getvalue().count('"status": 400') == 10
+        # Every document was sent once, and the 429, 503, and 500 ones twice.
+        assert sorted(set(es.seen.values())) == [1, 2]
+        assert sum(es.seen.values()) == 130
+        assert len(bulk.logger.messages) == 30
+
+    @staticmethod
+    def test_request_rejected():
+        es = FakeES(fail_requests=2)
+        res = _bulk(es, in_flight=2, chunk_docs=5).run(_action(i) for i in range(20))
+        assert res[2:4] == (20, 0)
+        assert res[4] == 0
+        assert res[5] > 0
+        assert len(es.bodies) == 6
+
+    @staticmethod
+    def test_serialized_sources():
+        def status_of(_id, seen):
+            return 400 if _id == "id0003" else 201
+
+        def serialized(i):
+            action = _action(i)
+            action["_source"] = json.dumps(action["_source"]).encode("utf-8")
+            return action
+
+        es = FakeES(status_of)
+        errorsfp = io.StringIO()
+        res = _bulk(es, errorsfp, chunk_docs=4).run(serialized(i) for i in range(10))
+        assert res[2:] == (9, 0, 1, 0)
+        assert b"".join(es.bodies) == b"".join(
+            action_lines(serialized(i)) for i in range(10)
+        )
+        # The reported action holds the document, not its JSON form.
+        report = json.loads(errorsfp.getvalue())
+        assert report["action"]["_source"] == _action(3)["_source"]
+
+
+class TestBulkFiles:
+    @staticmethod
+    def test_round_trip(tmp_path):
+        path = tmp_path / "ctrl" / "tb.ndjson.gz"
+        res = write_bulk_file(path, (_action(i) for i in range(25)))
+        assert res[2:] == (25, 0, 0, 0)
+        assert list(tmp_path.joinpath("ctrl").iterdir()) == [path]
+        with gzip.open(path, "rb") as fp:
+            assert fp.read() == b"".join(action_lines(_action(i)) for i in range(25))
+        actions = list(read_bulk_file(path, skip=20))
+        assert [a["_id"] for a in actions] == [f"id{i:04d}" for i in range(20, 25)]
+        assert json.loads(actions[0]["_source"]) == _action(20)["_source"]
+
+    @staticmethod
+    def test_truncated(tmp_path):
+        path = tmp_path / "tb.ndjson.gz"
+        with gzip.open(path, "wb") as fp:
+            fp.write(action_lines(_action(0)))
+            fp.write(action_lines(_action(1))[:-10])
+        with pytest.raises(BulkFileError):
+            list(read_bulk_file(path))
+        path.write_bytes(path.read_bytes()[:-20])
+        with pytest.raises(BulkFileError):
+            list(read_bulk_file(path))
+
+    @staticmethod
+    def test_resume(tmp_path):
+        path = tmp_path / "tb.ndjson.gz"
+        write_bulk_file(path, (_action(i) for i in range(50)))
+        assert load_progress(path) == (0, False)
+        save_progress(path, 30)
+        skip, complete = load_progress(path)
+        assert (skip, complete) == (30, False)
+
+        reported = []
+        es = FakeES()
+        bulk = _bulk(es, in_flight=2, chunk_docs=4, progress=reported.append)
+        res = bulk.run(read_bulk_file(path, skip))
+        assert res[2:] == (20, 0, 0, 0)
+        assert es.seen == {f"id{i:04d}": 1 for i in range(30, 50)}
+        assert reported == sorted(reported)
+        assert reported[-1] == 20
+
+        # Writing the bulk file again discards the recorded progress.
+        save_progress(path, 50, complete=True)
+        assert load_progress(path) == (50, True)
+        write_bulk_file(path, (_action(i) for i in range(5)))
+        assert load_progress(path) == (0, False)
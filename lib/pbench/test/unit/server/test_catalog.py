@@ -0,0 +1,157 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pbench.server.catalog import StateCatalog
+
+
+_STATES = ("TO-UNPACK", "UNPACKED", "TO-INDEX")
+
+
+def _tarball(archive, controller, name, size, state):
+    controller_dir = archive / controller
+    (controller_dir / state).mkdir(parents=True, exist_ok=True)
+    tb = controller_dir / f"{name}.tar.xz"
+    tb.write_bytes(b"x" * size)
+    (controller_dir / f"{name}.tar.xz.md5").write_text(f"{name}-md5  {tb.name}\n")
+    os.symlink(tb, controller_dir / state / tb.name)
+    return tb
+
+
+def _move(archive, controller, name, src, dest):
+    controller_dir = archive / controller
+    (controller_dir / dest).mkdir(exist_ok=True)
+    os.rename(
+        controller_dir / src / f"{name}.tar.xz",
+        controller_dir / dest / f"{name}.tar.xz",
+    )
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    with StateCatalog(tmp_path / "catalog.db", archive, _STATES) as catalog:
+        yield catalog
+
+
+class TestStateCatalog:
+    @staticmethod
+    def test_refresh(catalog):
+        archive = Path(catalog.archive)
+        _tarball(archive, "c1", "big", 300, "TO-UNPACK")
+        _tarball(archive, "c1", "small", 100, "TO-UNPACK")
+        _tarball(archive, "c2", "mid", 200, "TO-UNPACK")
+        assert catalog.refresh() == 3
+        assert catalog.links("TO-UNPACK") == [
+            str(archive / "c1" / "TO-UNPACK" / "small.tar.xz"),
+            str(archive / "c2" / "TO-UNPACK" / "mid.tar.xz"),
+            str(archive / "c1" / "TO-UNPACK" / "big.tar.xz"),
+        ]
+        assert catalog.links("TO-UNPACK", limit=1, order="name") == [
+            str(archive / "c1" / "TO-UNPACK" / "big.tar.xz")
+        ]
+        assert catalog.tarball("c1", "small.tar.xz") == dict(
+            size=100, md5="small-md5", states=["TO-UNPACK"]
+        )
+
+        _move(archive, "c1", "small", "TO-UNPACK", "UNPACKED")
+        (archive / "c1" / "TO-INDEX").mkdir()
+        os.symlink(
+            archive / "c1" / "small.tar.xz",
+            archive / "c1" / "TO-INDEX" / "small.tar.xz",
+        )
+        catalog.refresh()
+        assert catalog.tarball("c1", "small.tar.xz")["states"] == [
+            "TO-INDEX",
+            "UNPACKED",
+        ]
+        assert [os.path.basename(p) for p in catalog.links("TO-UNPACK")] == [
+            "mid.tar.xz",
+            "big.tar.xz",
+        ]
+        assert catalog.check() == []
+
+        # Tar balls of controllers which went away are forgotten.
+        shutil.rmtree(archive / "c2")
+        catalog.refresh()
+        assert catalog.tarball("c2", "mid.tar.xz") is None
+        assert catalog.check() == []
+
+    @staticmethod
+    def test_check(catalog):
+        archive = Path(catalog.archive)
+        tb = _tarball(archive, "c1", "one", 100, "TO-UNPACK")
+        catalog.refresh()
+        # Changes made behind the catalog's back, before the next refresh.
+        _tarball(archive, "c1", "two", 100, "TO-INDEX")
+        _move(archive, "c1", "one", "TO-UNPACK", "UNPACKED")
+        tb.write_bytes(b"y" * 10)
+        assert catalog.check() == [
+            "c1/TO-UNPACK/one.tar.xz: no such link",
+            "c1/UNPACKED/one.tar.xz: not in catalog",
+            "c1/TO-INDEX/two.tar.xz: not in catalog",
+            "c1/one.tar.xz: size 10, catalog has 100",
+        ]
+        # The stale link is not handed out.
+        assert catalog.links("TO-UNPACK") == []
+        # The tar ball is seen again in its new state.
+        catalog.refresh()
+        assert catalog.check() == []
+
+    @staticmethod
+    def test_tarball_updated(catalog):
+        archive = Path(catalog.archive)
+        tb = _tarball(archive, "c1", "one", 100, "TO-UNPACK")
+        md5_file = Path(f"{tb}.md5")
+        md5_file.unlink()
+        catalog.refresh()
+        assert catalog.tarball("c1", "one.tar.xz") == dict(
+            size=100, md5=None, states=["TO-UNPACK"]
+        )
+        md5_file.write_text(f"one-md5  {tb.name}\n")
+        _move(archive, "c1", "one", "TO-UNPACK", "UNPACKED")
+        catalog.refresh()
+        assert catalog.tarball("c1", "one.tar.xz") == dict(
+            size=100, md5="one-md5", states=["UNPACKED"]
+        )
+
+    @staticmethod
+    def test_unchanged_dirs_skipped(catalog):
+        archive = Path(catalog.archive)
+        _tarball(archive, "c1", "one", 100, "TO-UNPACK")
+        state_dir = archive / "c1" / "TO-UNPACK"
+        old = (1000 * 10 ** 9, 1000 * 10 ** 9)
+        os.utime(state_dir, ns=old)
+        assert catalog.refresh() == 1
+        # A link added without changing the directory's modification time
+        # is only noticed by a full check.
+        _tarball(archive, "c1", "two", 100, "TO-UNPACK")
+        os.utime(state_dir, ns=old)
+        assert catalog.refresh() == 0
+        assert catalog.check() == ["c1/TO-UNPACK/two.tar.xz: not in catalog"]
+        os.utime(state_dir)
+        assert catalog.refresh() == 1
+        assert catalog.check() == []
+
+    @staticmethod
+    def test_refresh_states(catalog):
+        archive = Path(catalog.archive)
+        _tarball(archive, "c1", "one", 100, "TO-UNPACK")
+        _tarball(archive, "c1", "two", 100, "TO-INDEX")
+        assert catalog.refresh(["TO-UNPACK"]) == 1
+        assert catalog.links("TO-INDEX") == []
+        assert catalog.check() == ["c1/TO-INDEX/two.tar.xz: not in catalog"]
+
+        # Moved out of the refreshed state only, the tar ball is kept until
+        # its new state is refreshed too.
+        _move(archive, "c1", "one", "TO-UNPACK", "UNPACKED")
+        assert catalog.refresh(["TO-UNPACK"]) == 1
+        assert catalog.tarball("c1", "one.tar.xz") == dict(
+            size=100, md5="one-md5", states=[]
+        )
+        assert catalog.refresh() == 2
+        assert catalog.tarball("c1", "one.tar.xz")["states"] == ["UNPACKED"]
+        assert catalog.check() == []
@@ -0,0 +1,91 @@
+import json
+import os
+
+from pbench.server.checkpoint import IndexCheckpoint, checkpoint_path
+from pbench.test.unit.server.test_bulk import FakeES, _action, _bulk
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def debug(self, msg, *args):
+        self.messages.append(msg.format(*args))
+
+    warning = debug
+
+
+# Units of actions, where one action of unit "b" is always rejected, and
+# unit "c" has no actions at all.
+_UNITS = (("a", range(0, 3)), ("b", range(3, 5)), ("c", ()), ("d", range(5, 7)))
+
+
+def _index(checkpoint):
+    generated = []
+
+    def _actions(unit, numbers):
+        for i in numbers:
+            generated.append(i)
+            yield _action(i)
+
+    es = FakeES(lambda _id, seen: 400 if _id == "id0004" else 201)
+    bulk = _bulk(
+        es,
+        in_flight=2,
+        chunk_docs=1,
+        progress=checkpoint.progress,
+        failed=checkpoint.failed,
+    )
+    bulk.run(
+        action
+        for unit, numbers in _UNITS
+        for action in checkpoint.actions(unit, _actions(unit, numbers))
+    )
+    checkpoint.progress(bulk.next_seq)
+    return generated
+
+
+class TestIndexCheckpoint:
+    @staticmethod
+    def test_checkpoint_path():
+        assert (
+            checkpoint_path("/archive/ctrl/tb-name.tar.xz")
+            == "/archive/ctrl/.checkpoint/tb-name.checkpoint"
+        )
+
+    @staticmethod
+    def test_resume(tmp_path):
+        path = str(tmp_path / ".checkpoint" / "tb.checkpoint")
+        assert _index(IndexCheckpoint(path, "key", FakeLogger())) == list(range(7))
+        with open(path) as fp:
+            assert json.load(fp)["units"] == ["a", "c", "d"]
+
+        # Only the unit with a failure is indexed again.
+        checkpoint = IndexCheckpoint(path, "key", FakeLogger())
+        assert checkpoint.done == {"a", "c", "d"}
+        assert _index(checkpoint) == [3, 4]
+
+        checkpoint.remove()
+        assert not os.path.exists(path)
+        checkpoint.remove()
+
+    @staticmethod
+    def test_ignored(tmp_path):
+        path = str(tmp_path / "tb.checkpoint")
+        _index(IndexCheckpoint(path, "key", FakeLogger()))
+
+        # A checkpoint for another key, or version, is ignored.
+        assert IndexCheckpoint(path, "other-key", FakeLogger()).done == set()
+        with open(path) as fp:
+            checkpoint = json.load(fp)
+        checkpoint["version"] += 1
+        with open(path, "w") as fp:
+            json.dump(checkpoint, fp)
+        assert IndexCheckpoint(path, "key", FakeLogger()).done == set()
+
+        # As is a corrupt one.
+        with open(path, "w") as fp:
+            fp.write('{"version": 1, "key": "key", "uni')
+        logger = FakeLogger()
+        assert IndexCheckpoint(path, "key", logger).done == set()
+        assert logger.messages[0].startswith("Ignoring unreadable checkpoint")
@@ -0,0 +1,91 @@
+import csv
+import io
+import re
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from pbench.common.exceptions import BadDate
+from pbench.server.indexer import SourceIdHasher, ToolData
+
+
+class FakeLogger:
+    def info(self, msg, *args):
+        pass
+
+
+class FakeToolData(ToolData):
+    """Just enough of a ToolData object to index one individual .csv file of
+    a run which took place from 1000 to 2000 seconds after the epoch.
+    """
+
+    def __init__(self, text):
+        self.toolname = "iostat"
+        self.run_metadata = {"id": "run"}
+        self.iteration_metadata = {"name": "iter"}
+        self.sample_metadata = {"name": "sample"}
+        self.logger = FakeLogger()
+        self.counters = Counter()
+        self.ptb = SimpleNamespace(
+            start_run_epoch=1000.0,
+            end_run_epoch=2000.0,
+            start_run_ts=datetime(1970, 1, 1, 0, 16, 40),
+            end_run_ts=datetime(1970, 1, 1, 0, 33, 20),
+            _tbctx="tb",
+        )
+        self._hasher = SourceIdHasher(
+            self.run_metadata, self.iteration_metadata, self.sample_metadata
+        )
+        self.files = [
+            dict(
+                header=["timestamp_ms", "sda"],
+                handler_rec={
+                    "class": None,
+                    "metric": "util",
+                    "pattern": re.compile(r"(?P<id>.+)\.csv"),
+                },
+                basename="disk.csv",
+                path="tool/disk.csv",
+                reader=csv.reader(io.StringIO(text)),
+            )
+        ]
+
+
+class TestCsvTimestamps:
+    @staticmethod
+    def test_batch_conversion_counts_nothing():
+        td = FakeToolData("")
+        assert td.mk_abs_timestamps_millis(
+            ["1500000", None, "abc", "3000000", "500"]
+        ) == ["1970-01-01T00:25:00.000000", None, None, None, None]
+        assert td.counters == Counter()
+
+    @staticmethod
+    def test_bad_row_in_block():
+        # An empty row, followed by a row after the end of the run, followed
+        # by more bad rows of the same block, which are never consumed.
+        text = "1100000,1\n1200000,2\n\n5000000,3\n6000000,4\nabc,5\n1300000,6\n"
+        td = FakeToolData(text)
+        docs = []
+        with pytest.raises(BadDate):
+            for source, _, _ in td._make_source_individual():
+                docs.append(source)
+        assert {doc["@timestamp"] for doc in docs} == {
+            "1970-01-01T00:18:20.000000",
+            "1970-01-01T00:20:00.000000",
+        }
+        assert td.counters == Counter(ts_after_end_run_ts=1)
+
+    @staticmethod
+    def test_relative_rows():
+        # Time stamps relative to the start of the run are only converted,
+        # and counted, as they are consumed.
+        td = FakeToolData("1000,1\n2000,2\n")
+        docs = [source for source, _, _ in td._make_source_individual()]
+        assert [doc["@timestamp"] for doc in docs] == [
+            "1970-01-01T00:16:41.000000",
+            "1970-01-01T00:16:42.000000",
+        ]
+        assert td.counters == Counter()
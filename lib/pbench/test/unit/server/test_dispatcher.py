@@ -0,0 +1,138 @@
+import fcntl
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from pbench.common.logger import get_pbench_logger
+from pbench.server import PbenchServerConfig
+from pbench.server.dispatcher import IN_CREATE, Dispatcher, Inotify, Stage
+from pbench.server.unpack import Unpacker
+from pbench.test.unit.server.test_unpack import _tarball
+
+
+def _wait_for(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+@pytest.fixture
+def config(pytestconfig):
+    config = PbenchServerConfig(pytestconfig.cache.get("_PBENCH_SERVER_CONFIG", None))
+    for hierarchy in (config.INCOMING, config.RESULTS, config.USERS):
+        hierarchy.mkdir(parents=True, exist_ok=True)
+    os.makedirs(config.get("pbench-server", "lock-dir"), exist_ok=True)
+    return config
+
+
+class TestInotify:
+    @staticmethod
+    def test_events(tmp_path):
+        try:
+            inotify = Inotify()
+        except OSError as exc:
+            pytest.skip(f"inotify unavailable: {exc}")
+        try:
+            inotify.add_watch(tmp_path, IN_CREATE)
+            assert inotify.read(timeout=0) == []
+            (tmp_path / "one").write_text("")
+            (tmp_path / "two").write_text("")
+            events = inotify.read(timeout=5)
+            assert [(path, name) for path, _, name in events] == [
+                (str(tmp_path), "one"),
+                (str(tmp_path), "two"),
+            ]
+        finally:
+            inotify.close()
+
+
+class TestStage:
+    @staticmethod
+    def test_triggers_coalesced(tmp_path, config):
+        logger = get_pbench_logger("pbench-dispatcher", config)
+        runs = tmp_path / "runs"
+        script = f"import time; time.sleep(1); open({str(runs)!r}, 'a').write('x')"
+        stage = Stage(
+            "test", [sys.executable, "-c", script], str(tmp_path / "lock"), logger
+        )
+        stop = threading.Event()
+        thread = threading.Thread(target=stage.run, args=(stop,))
+        thread.start()
+        try:
+            stage.trigger()
+            assert _wait_for(lambda: stage._trigger.is_set() is False)
+            # Triggers arriving while the stage runs make for one more run.
+            for _ in range(5):
+                stage.trigger()
+            assert _wait_for(lambda: stage.runs == 2)
+            time.sleep(1.5)
+        finally:
+            stop.set()
+            stage.trigger()
+            thread.join()
+        assert runs.read_text() == "xx"
+
+    @staticmethod
+    def test_daemon_woken_up(tmp_path, config):
+        logger = get_pbench_logger("pbench-dispatcher", config)
+        lock_path = tmp_path / "lock"
+        sock_path = str(tmp_path / "sock")
+        stage = Stage(
+            "index", ["false"], str(lock_path), logger, wakeup_socket=sock_path
+        )
+        stop = threading.Event()
+        thread = threading.Thread(target=stage.run, args=(stop,))
+        # The lock is held by the "daemon" listening on the socket.
+        with lock_path.open("a") as lock, socket.socket(
+            socket.AF_UNIX, socket.SOCK_DGRAM
+        ) as sock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            sock.bind(sock_path)
+            sock.settimeout(10)
+            thread.start()
+            try:
+                stage.trigger()
+                assert sock.recv(4096) == b"index"
+            finally:
+                stop.set()
+                stage.trigger()
+                thread.join()
+        assert stage.runs == 0
+
+
+class TestDispatcher:
+    @staticmethod
+    def test_unpack_on_arrival(config):
+        try:
+            Inotify().close()
+        except OSError as exc:
+            pytest.skip(f"inotify unavailable: {exc}")
+        logger = get_pbench_logger("pbench-dispatcher", config)
+        unpacker = Unpacker(config, logger, workers=1, rescan=3600)
+        dispatcher = Dispatcher(
+            config, logger, unpacker=unpacker, rescan=3600, stages=[]
+        )
+        stop = threading.Event()
+        thread = threading.Thread(target=dispatcher.run, args=(stop,))
+        thread.start()
+        try:
+            assert _wait_for(lambda: str(config.ARCHIVE) in dispatcher._roles)
+            # A new controller, whose first tar ball is only noticed by way
+            # of the watches, as the next rescan is an hour away.
+            controller_dir = config.ARCHIVE / "dispatch-ctrl"
+            ts = datetime.utcnow().strftime("%Y.%m.%dT%H.%M.%S")
+            tb = _tarball(controller_dir, f"tb_{ts}")
+            unpacked = controller_dir / "UNPACKED" / tb.name
+            assert _wait_for(lambda: os.path.lexists(unpacked))
+        finally:
+            stop.set()
+            thread.join()
+        assert unpacker.ntotal == 1
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import os
+import stat
+import tarfile
+
+import pytest
+
+from pbench.common.exceptions import IngestError
+from pbench.server.ingest import (
+    ingest_tarball,
+    is_sosreport,
+    load_ingest_record,
+    recorded_md5,
+)
+from pbench.server.manifest import load_manifest
+
+
+_prefix = "pbench-user-benchmark_ex-tb_2018.10.24T14.38.18"
+
+_sosreport = b"not really an xz compressed sosreport"
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+@pytest.fixture
+def tarball(tmp_path):
+    """Construct a tar ball with a metadata.log file, two sosreports, only one
+    with a matching .md5 file, a read-only directory, and a symlink, along
+    with its .md5 file.
+    """
+    src = tmp_path / "src"
+    top = src / _prefix
+    (top / "1" / "sample1").mkdir(parents=True)
+    (top / "sysinfo" / "end" / "host1").mkdir(parents=True)
+    (top / "metadata.log").write_text(
+        "[pbench]\nname = ex-tb\n\n[run]\nprefix = a/b\nuser = me\n"
+    )
+    (top / "1" / "sample1" / "result.json").write_text("[]\n")
+    os.symlink("sample1", top / "1" / "reference-result")
+    sos_dir = top / "sysinfo" / "end" / "host1"
+    (sos_dir / "sosreport-host1.tar.xz").write_bytes(_sosreport)
+    (sos_dir / "sosreport-host1.tar.xz.md5").write_text(_md5(_sosreport))
+    (sos_dir / "sosreport-host2.tar.xz").write_bytes(_sosreport + b"!")
+    (sos_dir / "sosreport-host2.tar.xz.md5").write_text(_md5(_sosreport))
+    (top / "1" / "sample1").chmod(0o500)
+    controller = tmp_path / "archive" / "controller"
+    controller.mkdir(parents=True)
+    tbname = controller / f"{_prefix}.tar.xz"
+    with tarfile.open(tbname, "w:xz") as tb:
+        tb.add(top, arcname=_prefix)
+    (top / "1" / "sample1").chmod(0o755)
+    with open(tbname, "rb") as fp:
+        md5 = _md5(fp.read())
+    (controller / f"{_prefix}.tar.xz.md5").write_text(f"{md5}  {tbname.name}\n")
+    return str(tbname), md5
+
+
+class TestIngest:
+    @staticmethod
+    def test_ingest(tarball, tmp_path):
+        tbname, md5 = tarball
+        unpack = tmp_path / "incoming" / "controller" / f"{_prefix}.unpack"
+        ingest = ingest_tarball(tbname, str(unpack))
+
+        assert ingest["md5"] == md5
+        assert ingest["size"] == os.stat(tbname).st_size
+        assert ingest["metadata"] == {"prefix": "a/b", "user": "me"}
+        sos_dir = f"{_prefix}/sysinfo/end/host1"
+        assert ingest["sosreports"] == [
+            dict(
+                name=f"{sos_dir}/sosreport-host1.tar.xz",
+                md5=_md5(_sosreport),
+                status="ok",
+            ),
+            dict(
+                name=f"{sos_dir}/sosreport-host2.tar.xz",
+                md5=_md5(_sosreport + b"!"),
+                status="bad-md5",
+            ),
+        ]
+        assert load_ingest_record(tbname) == ingest
+        assert recorded_md5(tbname) == md5
+
+        # The manifest lists the same members as the tar ball.
+        with tarfile.open(tbname) as tb:
+            expected = [m.name for m in tb.getmembers()]
+        assert [m.name for m in load_manifest(tbname)] == expected
+
+        top = unpack / _prefix
+        assert (top / "1" / "sample1" / "result.json").read_text() == "[]\n"
+        assert os.readlink(top / "1" / "reference-result") == "sample1"
+        assert (
+            top / sos_dir[len(_prefix) + 1 :] / "sosreport-host1.tar.xz"
+        ).read_bytes() == _sosreport
+        # Directories are always readable and searchable, and files
+        # readable, by all.
+        mode = stat.S_IMODE(os.stat(top / "1" / "sample1").st_mode)
+        assert mode & 0o555 == 0o555
+        mode = stat.S_IMODE(os.stat(top / "metadata.log").st_mode)
+        assert mode & 0o444 == 0o444
+
+    @staticmethod
+    def test_changed(tarball, tmp_path):
+        tbname, md5 = tarball
+        ingest_tarball(tbname, str(tmp_path / "unpack"))
+        with open(tbname, "ab") as fp:
+            fp.write(b"\0")
+        assert load_ingest_record(tbname) is None
+        assert recorded_md5(tbname) is None
+
+    @staticmethod
+    def test_bad_md5(tarball, tmp_path):
+        tbname, md5 = tarball
+        with open(f"{tbname}.md5", "w") as fp:
+            fp.write(f"{'0' * 32}  {os.path.basename(tbname)}\n")
+        with pytest.raises(IngestError, match="does not match"):
+            ingest_tarball(tbname, str(tmp_path / "unpack"))
+        assert load_ingest_record(tbname) is None
+
+    @staticmethod
+    def test_unsafe_member(tmp_path):
+        tbname = tmp_path / "bad.tar.xz"
+        with tarfile.open(tbname, "w:xz") as tb:
+            info = tarfile.TarInfo("top/../../escape.txt")
+            info.size = 3
+            tb.addfile(info, io.BytesIO(b"bad"))
+        with pytest.raises(IngestError, match="Refusing"):
+            ingest_tarball(str(tbname), str(tmp_path / "unpack"))
+        assert not (tmp_path / "escape.txt").exists()
+
+    @staticmethod
+    def test_hardlink_through_symlink(tmp_path):
+        outside = tmp_path / "outside"
+        outside.mkdir()
+        (outside / "shadow").write_bytes(b"secret")
+        tbname = tmp_path / "bad.tar.xz"
+        with tarfile.open(tbname, "w:xz") as tb:
+            info = tarfile.TarInfo("run/s")
+            info.type = tarfile.SYMTYPE
+            info.linkname = str(outside)
+            tb.addfile(info)
+            info = tarfile.TarInfo("run/h")
+            info.type = tarfile.LNKTYPE
+            info.linkname = "run/s/shadow"
+            tb.addfile(info)
+        unpack = tmp_path / "unpack"
+        with pytest.raises(IngestError, match="Refusing"):
+            ingest_tarball(str(tbname), str(unpack))
+        assert not os.path.lexists(unpack / "run" / "h")
+        assert os.stat(outside / "shadow").st_nlink == 1
+
+    @staticmethod
+    def test_not_a_tarball(tmp_path):
+        tbname = tmp_path / "bad.tar.xz"
+        tbname.write_bytes(b"not a tar ball")
+        with pytest.raises(IngestError, match="Unable to read"):
+            ingest_tarball(str(tbname), str(tmp_path / "unpack"))
+
+    @staticmethod
+    def test_is_sosreport():
+        assert is_sosreport("d/sysinfo/sosreport-h.tar.xz")
+        assert is_sosreport("d/1/2/sysinfo/end/h/sosreport-h.tar.xz")
+        assert not is_sosreport("d/1/2/3/sysinfo/sosreport-h.tar.xz")
+        assert not is_sosreport("d/sysinfo/sosreport-h.tar.xz.md5")
+        assert not is_sosreport("d/sosreport-h.tar.xz")
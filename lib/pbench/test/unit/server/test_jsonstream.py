@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from pbench.server.jsonstream import JsonArrayReader
+
+
+_DOCS = [
+    {"@timestamp": 1588160934.5, "a": [1, 2.5e-3, -7], "b": {"c": "x,]y"}},
+    12345678901234567890,
+    -1.25e10,
+    'a "quoted" \\u00e9 string',
+    [],
+    {},
+    None,
+    True,
+    False,
+    [[1, [2, [3]]], {"d": [{"e": None}]}],
+]
+
+
+def _read(text, chunk_size):
+    reader = JsonArrayReader(io.StringIO(text), chunk_size=chunk_size)
+    return list(reader), reader.error
+
+
+class TestJsonArrayReader:
+    @staticmethod
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1024 * 1024])
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_same_as_load(chunk_size, indent):
+        text = json.dumps(_DOCS, indent=indent)
+        docs, error = _read(f" \n{text}\n ", chunk_size)
+        assert error is None
+        assert docs == json.loads(text)
+
+    @staticmethod
+    @pytest.mark.parametrize("text", ["[]", " [ ] ", "[\n]\n"])
+    def test_empty(text):
+        assert _read(text, 1) == ([], None)
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "text,good",
+        [
+            ('[{"a": 1}, {"b": 2}', 2),
+            ('[{"a": 1}, {"b": 2', 1),
+            ('[{"a": 1}, {"b": 2},]', 2),
+            ('[{"a": 1} {"b": 2}]', 1),
+            ('[{"a": 1}, {"b": 2}] []', 2),
+            ("[1, 2e]", 2),
+            ("", 0),
+        ],
+    )
+    def test_errors(text, good):
+        for chunk_size in (1, 4, 1024):
+            docs, error = _read(text, chunk_size)
+            assert len(docs) == good
+            assert isinstance(error, ValueError)
+            with pytest.raises(ValueError):
+                json.loads(text)
+
+    @staticmethod
+    def test_is_array():
+        reader = JsonArrayReader(io.StringIO('  {"a": [1]}'), chunk_size=1)
+        assert not reader.is_array()
+        assert reader.error is None
+        assert list(reader) == []
+        assert isinstance(reader.error, ValueError)
+
+        reader = JsonArrayReader(io.StringIO("  [1, 2]"), chunk_size=1)
+        assert reader.is_array()
+        assert list(reader) == [1, 2]
@@ -0,0 +1,155 @@
+import os
+import tarfile
+
+import pytest
+
+from pbench.common.exceptions import ManifestError
+from pbench.server.manifest import (
+    MemberIndex,
+    TarballMember,
+    load_manifest,
+    manifest_path,
+    scan_extracted_tree,
+    write_manifest,
+)
+
+
+_prefix = "pbench-user-benchmark_ex-tb_2018.10.24T14.38.18"
+
+
+@pytest.fixture
+def tarball(tmp_path):
+    """Construct a small tar ball, and its extracted form, with a directory,
+    a regular file, and a symlink.
+    """
+    src = tmp_path / "src"
+    top = src / _prefix
+    (top / "1" / "sample1").mkdir(parents=True)
+    (top / "metadata.log").write_text("[pbench]\nname = ex-tb\n")
+    (top / "1" / "sample1" / "result.json").write_text("[]\n")
+    os.symlink("sample1", top / "1" / "reference-result")
+    controller = tmp_path / "archive" / "controller"
+    controller.mkdir(parents=True)
+    tbname = controller / f"{_prefix}.tar.xz"
+    with tarfile.open(tbname, "w:xz") as tb:
+        tb.add(top, arcname=_prefix)
+    return str(tbname), str(src)
+
+
+class TestManifest:
+    @staticmethod
+    def test_manifest_path():
+        assert (
+            manifest_path("/archive/ctrl/a_1970.01.01T00.00.00.tar.xz")
+            == "/archive/ctrl/.manifest/a_1970.01.01T00.00.00.manifest"
+        )
+
+    @staticmethod
+    def test_round_trip(tarball):
+        tbname, _ = tarball
+        assert load_manifest(tbname) is None
+        mpath = write_manifest(tbname)
+        assert mpath == manifest_path(tbname)
+        members = load_manifest(tbname)
+        with tarfile.open(tbname) as tb:
+            expected = tb.getmembers()
+        assert [m.name for m in members] == [m.name for m in expected]
+        for m, e in zip(members, expected):
+            assert (m.size, m.mode, m.mtime, m.type, m.linkpath) == (
+                e.size,
+                e.mode,
+                e.mtime,
+                e.type,
+                e.linkname,
+            )
+            assert (m.isfile(), m.isdir(), m.issym()) == (
+                e.isfile(),
+                e.isdir(),
+                e.issym(),
+            )
+
+    @staticmethod
+    def test_truncated(tarball):
+        tbname, _ = tarball
+        mpath = write_manifest(tbname)
+        with open(mpath, "r") as fp:
+            lines = fp.readlines()
+        with open(mpath, "w") as fp:
+            fp.writelines(lines[:-1])
+        with pytest.raises(ManifestError):
+            load_manifest(tbname)
+
+    @staticmethod
+    def test_scan_extracted_tree(tarball):
+        tbname, src = tarball
+        members = scan_extracted_tree(src, _prefix)
+        with tarfile.open(tbname) as tb:
+            expected = sorted(tb.getmembers(), key=lambda m: m.name)
+        assert [m.name for m in members] == [m.name for m in expected]
+        for m, e in zip(members, expected):
+            assert (m.size, m.type, m.linkpath) == (e.size, e.type, e.linkname)
+
+
+def _members(*specs):
+    members = []
+    for name in specs:
+        if name.endswith("/"):
+            members.append(TarballMember(name[:-1], 0, 0o755, 0, tarfile.DIRTYPE))
+        else:
+            members.append(TarballMember(name, 1, 0o644, 0, tarfile.REGTYPE))
+    return members
+
+
+class TestMemberIndex:
+    members = _members(
+        "d/",
+        "d/metadata.log",
+        "d/1-a/",
+        "d/1-a/sample1/",
+        "d/1-a/sample1/tools-default/",
+        "d/1-a/sample1/tools-default/h/",
+        "d/1-a/sample1/tools-default/h/iostat/",
+        "d/1-a/sample1/tools-default/h/iostat/csv/",
+        "d/1-a/sample1/tools-default/h/iostat/csv/disk.csv",
+        "d/1-a/sample1/tools-default/h/iostat/iostat-stdout.txt",
+        "d/1-a/sample1/tools-default/h/iostat/csv.txt",
+        "d/1-a/sample1/result.json",
+        "d/1-a/sample2/",
+        "d/11-a/",
+        "d/11-a/sample1/",
+        "d/11-a/sample1/result.json",
+    )
+
+    def test_files_by_prefix(self):
+        index = MemberIndex(self.members)
+        base = "d/1-a/sample1/tools-default/h/iostat"
+        # Prefix matching returns the same names, in the same order, as a
+        # linear scan of the member list.
+        for path in (
+            f"{base}/csv",
+            f"{base}/iostat-stdout.txt",
+            f"{base}/json",
+            "d/1-a",
+            "d/",
+        ):
+            expected = [
+                m.name for m in self.members if m.isfile() and m.name.startswith(path)
+            ]
+            assert index.files_by_prefix(path) == expected, path
+
+    def test_subdirs(self):
+        index = MemberIndex(self.members)
+        assert index.subdirs("d") == ["1-a", "11-a"]
+        assert index.subdirs("d/1-a") == ["sample1", "sample2"]
+        assert index.subdirs("d/2-a") == []
+
+    def test_files_named(self):
+        index = MemberIndex(self.members)
+        assert index.files_named("result.json") == [
+            "d/1-a/sample1/result.json",
+            "d/11-a/sample1/result.json",
+        ]
+
+    def test_duplicate_directory(self):
+        index = MemberIndex(self.members + _members("d/11-a/"))
+        assert index.files_by_prefix("d/11-a") == ["d/11-a/sample1/result.json"]
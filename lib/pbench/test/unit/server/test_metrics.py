@@ -0,0 +1,78 @@
+from pbench.server.indexer import PhaseMetrics, summarize_metrics
+
+
+class FakeTime:
+    """A clock which advances one second every time it is read.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def _phases(metrics):
+    return {p["name"]: p for p in metrics.as_list()}
+
+
+class TestPhaseMetrics:
+    @staticmethod
+    def test_timed():
+        clock = FakeTime()
+        metrics = PhaseMetrics(clock)
+        for item in metrics.timed("gen", "abc", nbytes=30):
+            # Time spent by the caller is not counted.
+            clock.now += 100.0
+        phases = _phases(metrics)
+        # One second for each of the three items, and for the end.
+        assert phases["gen"]["seconds"] == 4.0
+        assert phases["gen"]["docs"] == 3
+        assert phases["gen"]["bytes"] == 30
+        assert phases["gen"]["docs_per_sec"] == 0.75
+        assert phases["gen"]["bytes_per_sec"] == 7.5
+
+    @staticmethod
+    def test_timed_closed():
+        metrics = PhaseMetrics(FakeTime())
+        gen = metrics.timed("gen", "abc")
+        assert next(gen) == "a"
+        gen.close()
+        assert metrics.seconds("gen") == 1.0
+        assert _phases(metrics)["gen"]["docs"] == 1
+
+    @staticmethod
+    def test_add():
+        metrics = PhaseMetrics(FakeTime())
+        metrics.add("open", 0.0)
+        metrics.add("tool-data:iostat", 2.0, 10, 100)
+        metrics.add("tool-data:iostat", 3.0, 15, 150)
+        assert metrics.seconds("missing") == 0.0
+        phases = _phases(metrics)
+        assert phases["open"]["docs_per_sec"] is None
+        assert phases["open"]["bytes_per_sec"] is None
+        assert phases["tool-data:iostat"]["seconds"] == 5.0
+        assert phases["tool-data:iostat"]["docs_per_sec"] == 5.0
+        assert phases["tool-data:iostat"]["bytes_per_sec"] == 50.0
+
+    @staticmethod
+    def test_summarize():
+        opctx = [dict(tbname="tb0", object="ToolData", counters={"bad_json_file": 1})]
+        for tbname, seconds in (("tb1", 1.0), ("tb2", 3.0)):
+            metrics = PhaseMetrics(FakeTime())
+            metrics.add("toc", seconds, 4, 0)
+            opctx.append(metrics.opctx(tbname))
+        summary = summarize_metrics(opctx)
+        assert summary["tarballs"] == 2
+        assert summary["max_rss_kb"] > 0
+        assert summary["phases"] == [
+            dict(
+                name="toc",
+                seconds=4.0,
+                docs=8,
+                bytes=0,
+                docs_per_sec=2.0,
+                bytes_per_sec=0.0,
+            )
+        ]
@@ -0,0 +1,143 @@
+import io
+import threading
+
+import pytest
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import TransportError
+
+from pbench.server.bulk import PipelinedBulk
+from pbench.server.mock import MockBulkServer
+
+
+def _action(i, index="idx"):
+    return {
+        "_op_type": "create",
+        "_index": index,
+        "_id": f"id{i:04d}",
+        "_source": {"n": i, "name": f"dóc {i}"},
+    }
+
+
+class FakeLogger:
+    """Collect the messages logged, which use "{}" formatting.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, msg, *args):
+        self.messages.append(msg.format(*args))
+
+
+def _es(mock):
+    host, port = mock.address
+    return Elasticsearch([dict(host=host, port=port)], max_retries=0)
+
+
+def _bulk(mock, errorsfp=None, **kwargs):
+    return PipelinedBulk(
+        _es(mock),
+        errorsfp or io.StringIO(),
+        FakeLogger(),
+        sleep=lambda secs: None,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**kwargs):
+        server = MockBulkServer(seed=0, **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+class TestMockBulkServer:
+    @staticmethod
+    def test_counts(mock_server):
+        mock = mock_server()
+        actions = [_action(i, index=f"idx{i % 2}") for i in range(250)]
+        res = _bulk(mock, in_flight=3, chunk_docs=20).run(actions)
+        assert res[2:] == (250, 0, 0, 0)
+        stats = mock.stats()
+        assert stats["requests"] == 13
+        assert stats["docs"] == stats["created"] == stats["unique_ids"] == 250
+        assert stats["by_index"] == {"idx0": 125, "idx1": 125}
+        assert 1 <= stats["max_concurrent"] <= 3
+
+        # Creating the same documents again only yields duplicates.
+        res = _bulk(mock, in_flight=3, chunk_docs=20).run(actions[:30])
+        assert res[2:] == (0, 30, 0, 0)
+        assert mock.stats()["duplicates"] == 30
+
+        mock.reset()
+        assert mock.stats() == dict(unique_ids=0, max_concurrent=0, by_index={})
+
+    @staticmethod
+    def test_throttled_and_rejected(mock_server):
+        mock = mock_server(throttle_rate=0.3, reject_rate=0.1)
+        bulk = _bulk(mock, in_flight=2, chunk_docs=10)
+        res = bulk.run(_action(i) for i in range(200))
+        # Every document is eventually indexed, after retries.
+        assert res[2:4] == (200, 0)
+        assert res[4] == 0
+        assert res[5] > 0
+        stats = mock.stats()
+        assert stats["throttled_requests"] > 0
+        assert stats["rejected"] > 0
+        assert stats["created"] == stats["unique_ids"] == 200
+        assert stats["docs"] == 200 + stats["rejected"]
+
+    @staticmethod
+    def test_failed(mock_server):
+        mock = mock_server(failure_rate=0.2)
+        errorsfp = io.StringIO()
+        res = _bulk(mock, errorsfp=errorsfp, chunk_docs=25).run(
+            _action(i) for i in range(100)
+        )
+        stats = mock.stats()
+        assert 0 < stats["failed"] < 100
+        assert res[2:] == (100 - stats["failed"], 0, stats["failed"], 0)
+        assert errorsfp.getvalue().count('"status": 400') == stats["failed"]
+
+    @staticmethod
+    def test_queue_full(mock_server):
+        mock = mock_server(latency=0.2, capacity=1, queue=0)
+        es = _es(mock)
+        body = b"".join(
+            b'{"create": {"_index": "idx", "_id": "%d"}}\n{}\n' % i for i in range(2)
+        )
+        errors = []
+
+        def send():
+            try:
+                es.bulk(body=body)
+            except TransportError as exc:
+                errors.append(exc.status_code)
+
+        threads = [threading.Thread(target=send) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Only one request is serviced at a time, and none wait their turn.
+        assert errors == [429, 429]
+        assert mock.stats()["rejected_requests"] == 2
+
+    @staticmethod
+    def test_templates(mock_server):
+        mock = mock_server()
+        es = _es(mock)
+        assert es.info()["version"]["number"].startswith("7.")
+        body = {"index_patterns": ["p.v1.run.*"], "mappings": {}}
+        assert es.indices.put_template(name="p.v1.run", body=body)["acknowledged"]
+        assert es.indices.get_template(name="p.*") == {"p.v1.run": body}
+        with pytest.raises(TransportError) as exc:
+            es.indices.get_template(name="q.*")
+        assert exc.value.status_code == 404
@@ -0,0 +1,26 @@
+import os
+import time
+from multiprocessing import Pool
+
+import pytest
+
+from pbench.common.exceptions import WorkerDied
+from pbench.server.indexer import _PoolWatch
+
+
+class TestPoolWatch:
+    @staticmethod
+    def test_worker_death():
+        with Pool(2) as pool:
+            watch = _PoolWatch(pool)
+            watch.check()
+            assert pool.apply(os.getpid) in watch.pids
+            # A worker process dying while running a task, as one killed by
+            # the OOM killer would, rather than while waiting for one.
+            result = pool.apply_async(os._exit, (9,))
+            deadline = time.time() + 10
+            with pytest.raises(WorkerDied):
+                while time.time() < deadline:
+                    watch.check()
+                    time.sleep(0.1)
+            assert not result.ready()
@@ -0,0 +1,66 @@
+import json
+import os
+
+from pbench.common.logger import get_pbench_logger
+from pbench.server import PbenchServerConfig
+from pbench.server.bulk import read_bulk_file
+from pbench.server.indexer import PhaseMetrics, PbenchTemplates, summarize_metrics
+from pbench.server.report import Report
+
+
+def _mapped(value, mapping):
+    """Return the names of the fields of the given document value which have
+    no explicit mapping.
+    """
+    unmapped = []
+    for key, val in value.items():
+        field = mapping["properties"].get(key)
+        if field is None:
+            unmapped.append(key)
+        elif isinstance(val, dict):
+            unmapped.extend(f"{key}.{sub}" for sub in _mapped(val, field))
+        elif isinstance(val, list):
+            for item in val:
+                unmapped.extend(f"{key}.{sub}" for sub in _mapped(item, field))
+    return unmapped
+
+
+class TestReport:
+    @staticmethod
+    def test_status_with_metrics(pytestconfig, tmp_path):
+        config = PbenchServerConfig(
+            pytestconfig.cache.get("_PBENCH_SERVER_CONFIG", None)
+        )
+        logger = get_pbench_logger("pbench-index", config)
+        templates = PbenchTemplates(
+            os.path.abspath("./server/bin"), "unit-test", logger
+        )
+        report = Report(
+            config,
+            "pbench-index",
+            es=object(),
+            templates=templates,
+            bulk_dir=str(tmp_path),
+        )
+        metrics = PhaseMetrics(None)
+        metrics.add("open", 0.5)
+        metrics.add("generate", 2.0, 100, 4096)
+        opctx = [metrics.opctx("tb.tar.xz")]
+        summary = summarize_metrics(opctx)
+
+        report.post_status("run-1970-01-01T00:00:42-UTC", "status", metrics=summary)
+
+        (bulk_path,) = (tmp_path / "reports").iterdir()
+        (action,) = read_bulk_file(bulk_path)
+        assert action["_index"] == "unit-test.v5.server-reports.1970-01"
+        source = json.loads(action["_source"])
+        assert source["doctype"] == "status"
+        assert source["metrics"]["tarballs"] == 1
+        phases = {phase["name"]: phase for phase in source["metrics"]["phases"]}
+        assert phases["generate"]["docs"] == 100
+        assert phases["generate"]["docs_per_sec"] == 50.0
+        assert phases["open"]["docs"] == 0
+        # Every field of the document is explicitly mapped.
+        with open("./server/lib/mappings/server-reports.json") as fp:
+            mapping = json.load(fp)
+        assert _mapped(source, mapping) == []
@@ -0,0 +1,147 @@
+import io
+import os
+import tarfile
+import time
+from types import SimpleNamespace
+
+import pbench.server.indexer
+from pbench.server.indexer import PbenchTarBall, PhaseMetrics, cull_sosreport_cache
+
+
+_TB = "pbench-user-benchmark_ex-tb_2018.10.24T14.38.18"
+_SOS = f"{_TB}/sysinfo/beg/host/sosreport-host-1.tar.xz"
+_MD5 = "603eed4c94f4aa613e259cd0f075eda6"
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def debug(self, msg, *args):
+        self.messages.append(msg.format(*args))
+
+    warning = debug
+
+
+class FakeTarBall(PbenchTarBall):
+    """Just enough of a PbenchTarBall object to gather its sosreports.
+    """
+
+    def __init__(self, extracted_root, cache_dir):
+        self.idxctx = SimpleNamespace(
+            logger=FakeLogger(), sosreport_cache=cache_dir, time=time.time
+        )
+        self.extracted_root = str(extracted_root)
+        self.members = [SimpleNamespace(name=f"{_SOS}.md5")]
+        self._tbctx = "tb"
+        self._sosreports = None
+        self.metrics = PhaseMetrics(time.time)
+
+
+def _add(tb, name, data):
+    info = tarfile.TarInfo(f"sosreport-host-1/{name}")
+    info.size = len(data)
+    tb.addfile(info, io.BytesIO(data))
+
+
+def _extracted_root(tmp_path):
+    root = tmp_path / "extracted"
+    sos = root / _SOS
+    sos.parent.mkdir(parents=True)
+    with tarfile.open(sos, "w:xz") as tb:
+        _add(tb, "sos_commands/general/hostname", b"host\n")
+        _add(tb, "sos_commands/general/hostname_-f", b"host.example.com\n")
+        _add(
+            tb,
+            "sos_commands/networking/ip_-o_addr",
+            b"1: lo    inet 127.0.0.1/8 scope host lo\n",
+        )
+    (root / f"{_SOS}.md5").write_text(f"{_MD5}\n")
+    return root
+
+
+def _counting(monkeypatch):
+    calls = []
+    hostnames = pbench.server.indexer.hostnames_if_ip_from_sosreport
+
+    def _hostnames(sos_file_name):
+        calls.append(sos_file_name)
+        return hostnames(sos_file_name)
+
+    monkeypatch.setattr(
+        pbench.server.indexer, "hostnames_if_ip_from_sosreport", _hostnames
+    )
+    return calls
+
+
+class TestSosreports:
+    @staticmethod
+    def test_memoized(tmp_path, monkeypatch):
+        calls = _counting(monkeypatch)
+        ptb = FakeTarBall(_extracted_root(tmp_path), None)
+        sos_d = ptb.mk_sosreports()
+        assert sos_d == [
+            {
+                "name": _SOS,
+                "md5": _MD5,
+                "hostname-f": "host.example.com",
+                "hostname-s": "host",
+                "inet": [{"ifname": "lo", "ipaddr": "127.0.0.1"}],
+            }
+        ]
+        assert ptb.mk_sosreports() is sos_d
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_cached(tmp_path, monkeypatch):
+        calls = _counting(monkeypatch)
+        root = _extracted_root(tmp_path)
+        cache_dir = tmp_path / "cache"
+        sos_d = FakeTarBall(root, cache_dir).mk_sosreports()
+        assert (cache_dir / f"{_MD5}.json").exists()
+        assert len(calls) == 1
+
+        # Another tar ball with the same sosreport does not examine it.
+        assert FakeTarBall(root, cache_dir).mk_sosreports() == sos_d
+        assert len(calls) == 1
+
+        # A corrupt cache entry is replaced.
+        (cache_dir / f"{_MD5}.json").write_text("[")
+        assert FakeTarBall(root, cache_dir).mk_sosreports() == sos_d
+        assert len(calls) == 2
+        assert FakeTarBall(root, cache_dir).mk_sosreports() == sos_d
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_failure_not_cached(tmp_path, monkeypatch):
+        calls = []
+
+        def _hostnames(sos_file_name):
+            calls.append(sos_file_name)
+            return 1, "Failure to fetch hostnames"
+
+        monkeypatch.setattr(
+            pbench.server.indexer, "hostnames_if_ip_from_sosreport", _hostnames
+        )
+        root = _extracted_root(tmp_path)
+        cache_dir = tmp_path / "cache"
+        sos_d = FakeTarBall(root, cache_dir).mk_sosreports()
+        assert sos_d[0]["sosreport-error"] == "Failure to fetch hostnames"
+        assert not (cache_dir / f"{_MD5}.json").exists()
+
+        # A failure cached by an earlier version is not used either.
+        cache_dir.mkdir(exist_ok=True)
+        (cache_dir / f"{_MD5}.json").write_text('[1, "Failure to fetch hostnames"]')
+        assert FakeTarBall(root, cache_dir).mk_sosreports() == sos_d
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_cull(tmp_path):
+        cache_dir = tmp_path / "cache"
+        assert cull_sosreport_cache(cache_dir, 100, 1000) == 0
+        cache_dir.mkdir()
+        for name, mtime in (("old.json", 800), ("new.json", 950), ("x.json.1", 10)):
+            (cache_dir / name).write_text("[]")
+            os.utime(cache_dir / name, (mtime, mtime))
+        assert cull_sosreport_cache(cache_dir, 100, 1000) == 2
+        assert os.listdir(cache_dir) == ["new.json"]
@@ -0,0 +1,73 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from pbench.server.indexer import PbenchData, SourceIdHasher, _add_json_field
+
+
+_run = OrderedDict(
+    [
+        ("id", "0123456789abcdef0123456789abcdef"),
+        ("controller", "controller.example.com"),
+        ("name", "pbench-user-benchmark_example_2018.10.24T14.38.18"),
+        ("script", "pbench-user-benchmark"),
+        ("date", "2018-10-24T14:38:18"),
+        ("start", "2018-10-24T14:38:18.000000"),
+        ("end", "2018-10-24T14:48:18.000000"),
+        ("config", "café ☃"),
+        ("toolsgroup", "default"),
+    ]
+)
+_iteration = OrderedDict(name="1-default", number=1)
+_sample = OrderedDict(name="sample1", hostname="host.example.com")
+
+
+def _doc(**payload):
+    doc = OrderedDict(
+        [
+            ("@timestamp", "2018-10-24T14:38:20.000000"),
+            ("@timestamp_original", "1540391900000"),
+            ("run", _run),
+            ("iteration", _iteration),
+            ("sample", _sample),
+        ]
+    )
+    doc.update(payload)
+    return doc
+
+
+class TestSourceIdHasher:
+    @staticmethod
+    def test_same_ids():
+        hasher = SourceIdHasher(_run, _iteration, _sample)
+        docs = [
+            _doc(iostat={"id": "sda", "@idx": 3, "disk": {"util": 0.12, "r": 1.5}}),
+            _doc(vmstat={"@idx": 0, "memory": {"free": 1024, "nan": float("nan")}}),
+            _doc(prometheus={"labels": ["a", "b"], "value": None, "up": True}),
+            _doc(),
+            # Shared objects nested below the top-level are encoded as usual.
+            _doc(other={"run": _run, "sample": _sample}),
+            # Equal, but not the same, objects are encoded as usual.
+            _doc(run=OrderedDict(_run), sample=dict(_sample)),
+            {"uniçode": "☃", "run": _run},
+            # Non-string keys are left to the JSON encoder.
+            {1: "one", 2.5: "two and a half"},
+            [_run, _iteration],
+            "not a dictionary",
+        ]
+        for doc in docs:
+            assert hasher.make_source_id(doc) == PbenchData.make_source_id(doc), doc
+            # The key encodings are cached, so check a second time.
+            assert hasher.make_source_id(doc) == PbenchData.make_source_id(doc), doc
+
+    @staticmethod
+    def test_source_json():
+        hasher = SourceIdHasher(_run, _iteration, _sample)
+        for doc in (_doc(iostat={"@idx": 3, "util": 0.12}), {"uniçode": "☃"}, {}):
+            source_id, source_json = hasher.make_source_json(doc)
+            assert (source_id, source_json) == PbenchData.make_source_json(doc)
+            assert source_json == json.dumps(doc, sort_keys=True).encode("utf-8")
+            assert source_id == hashlib.md5(source_json).hexdigest()
+            # Fields which do not contribute to the ID can be added later.
+            tracked = _add_json_field(source_json, "@generated-by", "0123abcd")
+            assert json.loads(tracked) == dict(doc, **{"@generated-by": "0123abcd"})
@@ -0,0 +1,138 @@
+import io
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from pbench.server.indexer import ToolData
+
+
+class FakeLogger:
+    def __init__(self):
+        self.warnings = []
+
+    def info(self, msg, *args):
+        pass
+
+    def warning(self, msg, *args):
+        self.warnings.append(msg.format(*args))
+
+
+class FakeToolData(ToolData):
+    """Just enough of a ToolData object to parse stdout tool data files.
+    """
+
+    def __init__(self, toolname):
+        self.toolname = toolname
+        self.run_metadata = {"id": "run"}
+        self.iteration_metadata = {"name": "iter"}
+        self.sample_metadata = {"name": "sample"}
+        self.logger = FakeLogger()
+        self.counters = Counter()
+        self.ptb = SimpleNamespace(
+            start_run_epoch=0.0,
+            end_run_epoch=4e9,
+            start_run_ts=datetime(1970, 1, 1),
+            end_run_ts=datetime(2096, 1, 1),
+            _tbctx="tb",
+        )
+
+
+_KEYVAL = """junk before the first time stamp
+timestamp: 100.5
+nr_free 10
+allocstall 1
+pgscan_dma 20
+pgscan_normal 30
+timestamp: 102.5
+nr_free 14
+allocstall 3
+pgscan_dma 24
+pgscan_normal 36
+timestamp: 104.5
+nr_free 15
+pgscan_dma 30
+"""
+
+_PROCINT = """timestamp: 100.5
+           CPU0       CPU1
+  0:         10          2   IO-APIC   2-edge      timer
+ERR:          1
+timestamp: 102.5
+           CPU0       CPU1
+  0:         14          6   IO-APIC   2-edge      timer
+ERR:          3
+"""
+
+
+class TestStdoutRecords:
+    @staticmethod
+    def test_chunks():
+        expected = [(" 100.5", "a 1\nb 2"), (" 102.5", "a 3\nb 4"), (" 104.5", "")]
+        text = "x 0\ntimestamp: 100.5\na 1\nb 2\ntimestamp: 102.5\na 3\nb 4\n"
+        text += "timestamp: 104.5\n"
+        for chunk_size in (1, 5, 11, 1024):
+            records = ToolData._stdout_records(io.StringIO(text), chunk_size)
+            assert list(records) == expected
+
+
+class TestStdoutParsers:
+    @staticmethod
+    def test_keyval():
+        td = FakeToolData("proc-vmstat")
+        records = list(td._stdout_keyval(io.StringIO(_KEYVAL), int, "path"))
+        docs = [rec["proc-vmstat"] for rec in records]
+        assert [doc["@idx"] for doc in docs] == [0, 1, 2]
+        assert [rec["@timestamp_original"] for rec in records] == [
+            "100.5",
+            "102.5",
+            "104.5",
+        ]
+        assert docs[0]["gauge"] == {
+            "nr": {"free": 10},
+            "allocstall_": 1,
+            "pgscan": {"dma": 20, "normal": 30},
+        }
+        assert "rate" not in docs[0]
+        # Substat rates have always used a duration in thousands of seconds.
+        rate = docs[1]["rate"]
+        assert rate["allocstall_"] == 1.0
+        assert rate["nr"] == {"free": pytest.approx(2000.0)}
+        assert rate["pgscan"] == {
+            "dma": pytest.approx(2000.0),
+            "normal": pytest.approx(3000.0),
+        }
+        # A record with other keys than the previous one.
+        assert docs[2]["gauge"] == {"nr": {"free": 15}, "pgscan": {"dma": 30}}
+        assert docs[2]["rate"] == {
+            "nr": {"free": pytest.approx(500.0)},
+            "pgscan": {"dma": pytest.approx(3000.0)},
+        }
+
+    @staticmethod
+    def test_procint():
+        td = FakeToolData("proc-interrupts")
+        records = list(td._stdout_procint(io.StringIO(_PROCINT), int, "path"))
+        docs = [rec["proc-interrupts"] for rec in records]
+        assert [(doc["@idx"], doc["int_id"], doc.get("cpu_id")) for doc in docs] == [
+            (1, "0", "0"),
+            (1, "0", "1"),
+            (1, "ERR", None),
+            (2, "0", "0"),
+            (2, "0", "1"),
+            (2, "ERR", None),
+        ]
+        assert docs[0]["desc"] == "IO-APIC   2-edge      timer"
+        assert [doc["gauge"] for doc in docs] == [10, 2, 1, 14, 6, 3]
+        assert [doc.get("rate") for doc in docs] == [None, None, None, 2.0, -2.0, 1.0]
+
+    @staticmethod
+    def test_bad_json_file():
+        td = FakeToolData("prometheus-metrics")
+        td._bad_json_file("tools/metrics.json", ValueError("bad"))
+        assert td.logger.warnings == [
+            "tool-data-indexing: encountered bad JSON file, tools/metrics.json:"
+            " ValueError('bad') (tb)"
+        ]
+        assert td.counters["bad_json_file"] == 1
@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+
+from pbench.server.indexer import PbenchTemplates
+
+
+# The templates are loaded from the mapping and setting files of the source
+# tree, relative to the "bin" directory.
+_BINDIR = Path(__file__).parents[5] / "server" / "bin"
+
+
+class FakeLogger:
+    def __init__(self):
+        self.messages = []
+
+    def debug(self, msg, *args):
+        self.messages.append(msg.format(*args))
+
+    warning = debug
+
+
+class FakeIndices:
+    """Keep the templates put, returning them all for any template request.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self.gets = 0
+        self.puts = []
+
+    def get_template(self, name):
+        self.gets += 1
+        return dict(self.templates)
+
+    def put_template(self, name, body):
+        self.puts.append(name)
+        self.templates[name] = body
+
+
+class FakeES:
+    def __init__(self):
+        self.indices = FakeIndices()
+
+
+def _templates(cache_file=None):
+    return PbenchTemplates(
+        str(_BINDIR), "unit-test", FakeLogger(), cache_file=cache_file
+    )
+
+
+class TestUpdateTemplates:
+    @staticmethod
+    def test_unchanged_skipped():
+        es = FakeES()
+        templates = _templates()
+        templates.update_templates(es)
+        assert sorted(es.indices.puts) == sorted(templates.templates)
+        name = es.indices.puts[0]
+        assert es.indices.templates[name]["mappings"]["_meta"]["hash"]
+        # The hash is only added to the template pushed.
+        assert "hash" not in templates.templates[name]["mappings"]["_meta"]
+
+        es.indices.puts.clear()
+        _templates().update_templates(es)
+        assert es.indices.gets == 2
+        assert es.indices.puts == []
+
+    @staticmethod
+    def test_changed_pushed():
+        es = FakeES()
+        _templates().update_templates(es)
+        es.indices.puts.clear()
+        templates = _templates()
+        name = sorted(templates.templates)[0]
+        templates.templates[name]["settings"] = {"number_of_replicas": 7}
+        templates.update_templates(es)
+        assert es.indices.puts == [name]
+
+    @staticmethod
+    def test_local_cache(tmp_path):
+        es = FakeES()
+        cache_file = tmp_path / "templates.json"
+        _templates(cache_file).update_templates(es)
+        assert es.indices.gets == 1
+        es.indices.puts.clear()
+
+        # A recent local cache saves fetching the templates.
+        _templates(cache_file).update_templates(es, "server-reports")
+        _templates(cache_file).update_templates(es)
+        assert es.indices.gets == 1
+        assert es.indices.puts == []
+
+        # An old one does not.
+        old = os.stat(cache_file).st_mtime - 3600
+        os.utime(cache_file, (old, old))
+        _templates(cache_file).update_templates(es)
+        assert es.indices.gets == 2
+        assert es.indices.puts == []
+
+    @staticmethod
+    def test_corrupt_cache(tmp_path):
+        es = FakeES()
+        cache_file = tmp_path / "templates.json"
+        cache_file.write_text("{")
+        templates = _templates(cache_file)
+        templates.update_templates(es)
+        assert sorted(es.indices.puts) == sorted(templates.templates)
@@ -0,0 +1,86 @@
+import tarfile
+
+import pytest
+
+from pbench.server.indexer import PbenchTarBall
+from pbench.server.manifest import MemberIndex
+
+
+_PREFIX = "pbench-user-benchmark_ex-tb_2018.10.24T14.38.18"
+
+
+def _member(name, mtime, kind=tarfile.REGTYPE, linkname=""):
+    m = tarfile.TarInfo(f"{_PREFIX}/{name}" if name else _PREFIX)
+    m.type = kind
+    m.mtime = mtime
+    m.mode = 0o755 if kind == tarfile.DIRTYPE else 0o644
+    m.size = 0 if kind == tarfile.DIRTYPE else len(name)
+    m.linkname = linkname
+    return m
+
+
+class FakeTarBall(PbenchTarBall):
+    """Just enough of a PbenchTarBall object to generate its TOC.
+    """
+
+    def __init__(self, members):
+        self.dirname = _PREFIX
+        self.index = MemberIndex(members)
+        self.run_metadata = {"id": "run"}
+
+
+class TestGenToc:
+    @staticmethod
+    def test_toc():
+        members = [
+            _member("", 0, tarfile.DIRTYPE),
+            _member("a/", 1, tarfile.DIRTYPE),
+            _member("a/z.txt", 2),
+            _member("a/b.txt", 3),
+            _member("a/l", 4, tarfile.SYMTYPE, "b.txt"),
+            _member("a-b/", 5, tarfile.DIRTYPE),
+            _member("a/c/", 6, tarfile.DIRTYPE),
+            _member("a/c/d.txt", 7),
+        ]
+        toc = list(FakeTarBall(members).gen_toc())
+        assert [d["directory"] for d in toc] == ["/", "/a", "/a-b", "/a/c"]
+        assert "name" not in toc[0]
+        assert "files" not in toc[2]
+        assert toc[3]["name"] == "c"
+        assert toc[3]["parent"] == "/a"
+        assert toc[3]["ancestor_path_elements"] == ["a"]
+        assert toc[3]["run_data_parent"] == "run"
+        assert toc[1]["files"] == [
+            dict(
+                name="b.txt",
+                mtime="1970-01-01T00:00:03",
+                size=7,
+                mode="0o644",
+                type="reg",
+            ),
+            dict(
+                name="l",
+                mtime="1970-01-01T00:00:04",
+                size=3,
+                mode="0o644",
+                type="sym",
+                linkpath="b.txt",
+            ),
+            dict(
+                name="z.txt",
+                mtime="1970-01-01T00:00:02",
+                size=7,
+                mode="0o644",
+                type="reg",
+            ),
+        ]
+
+    @staticmethod
+    def test_duplicate_directory():
+        members = [
+            _member("", 0, tarfile.DIRTYPE),
+            _member("a/", 1, tarfile.DIRTYPE),
+            _member("a/", 2, tarfile.DIRTYPE),
+        ]
+        with pytest.raises(Exception, match="Logic bomb"):
+            next(FakeTarBall(members).gen_toc())
@@ -0,0 +1,123 @@
+import re
+
+import pytest
+
+from pbench.server import indexer
+from pbench.server.indexer import (
+    ToolHandlerDispatch,
+    compile_tool_handlers,
+    register_tool_handler,
+)
+
+
+def _sequential(handler, fname):
+    """The handler record lookup of a .csv file, one pattern after another.
+    """
+    for name in (fname, indexer._aliases.get(fname)):
+        if name is None:
+            continue
+        for rec in handler["patterns"]:
+            if rec["pattern"].match(name):
+                return rec
+    return None
+
+
+_FILE_NAMES = [
+    "disk_IOPS.csv",
+    "disk_Throughput.csv",
+    "disk_Wait_Time_msec.csv",
+    "disk_IOPS.csvx",
+    "xdisk_IOPS.csv",
+    "cpu_usage_percent_cpu.csv",
+    "memory_usage_virtual_size.csv",
+    "vmstat_cpu.csv",
+    "cpu_all_cpu_busy.csv",
+    "cpu3_cpu_busy.csv",
+    "cpu3_cpu.csv",
+    "proc-vmstat-stdout.txt",
+    "proc-interrupts-stdout.txt",
+    "unknown.csv",
+]
+
+
+class TestToolHandlerDispatch:
+    @staticmethod
+    def test_same_as_sequential():
+        for tool, dispatch in compile_tool_handlers().items():
+            if dispatch is None:
+                continue
+            handler = indexer._known_tool_handlers[tool]
+            if "patterns" not in handler:
+                continue
+            for fname in _FILE_NAMES:
+                # Twice, to check the remembered handler records as well.
+                assert dispatch.lookup(fname) is _sequential(handler, fname)
+                assert dispatch.lookup(fname) is _sequential(handler, fname)
+
+    @staticmethod
+    def test_first_pattern_wins():
+        handler = {
+            "@prospectus": {"handling": "csv", "method": "individual"},
+            "patterns": [
+                {"pattern": re.compile(r"^(?P<id>disk.*)\.csv$")},
+                {"pattern": re.compile(r"^disk_IOPS\.csv$")},
+                {"pattern": re.compile(r"^(?P<id>.*)\.csv$")},
+            ],
+        }
+        dispatch = ToolHandlerDispatch(handler)
+        assert "disk_IOPS.csv" in dispatch.exact
+        recs = handler["patterns"]
+        assert dispatch.lookup("disk_IOPS.csv") is recs[0]
+        assert dispatch.lookup("cpu.csv") is recs[2]
+        assert dispatch.lookup("cpu.txt") is None
+
+    @staticmethod
+    def test_register(monkeypatch):
+        monkeypatch.setattr(indexer, "_known_tool_handlers", {})
+        monkeypatch.setattr(indexer, "_aliases", {})
+        rec = {"pattern": re.compile(r"^pcp_cpu\.csv$")}
+        register_tool_handler(
+            "pcp",
+            {"@prospectus": {"handling": "csv", "method": "unify"}, "patterns": [rec]},
+            aliases={"cpu.csv": "pcp_cpu.csv"},
+        )
+        register_tool_handler("sar", None)
+        handlers = compile_tool_handlers()
+        assert handlers["sar"] is None
+        assert handlers["pcp"].lookup("cpu.csv") is rec
+        with pytest.raises(ValueError):
+            register_tool_handler("bad", {"@prospectus": {"handling": "xml"}})
+        with pytest.raises(ValueError):
+            register_tool_handler(
+                "bad",
+                {
+                    "@prospectus": {"handling": "csv", "method": "unify"},
+                    "patterns": [{"pattern": r"^bad\.csv$"}],
+                },
+            )
+
+    @staticmethod
+    def test_flagged_patterns():
+        handler = {
+            "@prospectus": {"handling": "csv", "method": "individual"},
+            "patterns": [
+                {"pattern": re.compile(r"^(?P<id>net.*)\.csv$")},
+                {"pattern": re.compile(r"^disk_iops\.csv$", re.IGNORECASE)},
+                {"pattern": re.compile(r"(?i)^(?P<id>cpu.*)\.csv$")},
+                {"pattern": re.compile(r"^(?P<id>.*)\.csv$")},
+            ],
+        }
+        dispatch = ToolHandlerDispatch(handler)
+        assert dispatch.exact == {}
+        assert [idx for idx, _ in dispatch.flagged] == [1, 2]
+        recs = handler["patterns"]
+        for fname, idx in (
+            ("DISK_IOPS.csv", 1),
+            ("disk_IOPS.csv", 1),
+            ("CPU0.csv", 2),
+            ("net0.csv", 0),
+            ("mem.csv", 3),
+        ):
+            assert dispatch.lookup(fname) is recs[idx]
+            assert _sequential(handler, fname) is recs[idx]
+        assert dispatch.lookup("CPU0.txt") is None
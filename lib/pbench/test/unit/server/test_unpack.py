@@ -0,0 +1,201 @@
+import hashlib
+import os
+import re
+import tarfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from pbench.common.logger import get_pbench_logger
+from pbench.server import PbenchServerConfig
+from pbench.server import unpack
+from pbench.server.unpack import UnpackJob, UnpackQueue, Unpacker
+
+
+_MB = 1024 * 1024
+
+
+def _job(name, size, since):
+    return UnpackJob(f"/archive/ctrl/TO-UNPACK/{name}.tar.xz", size, since)
+
+
+class TestUnpackQueue:
+    @staticmethod
+    def test_smallest_first():
+        q = UnpackQueue(aging=0)
+        for name, size in (("big", 20 * 1024 * _MB), ("small", _MB), ("mid", 50 * _MB)):
+            q.push(_job(name, size, 100))
+        assert [q.pop().name for _ in range(len(q))] == [
+            "small.tar.xz",
+            "mid.tar.xz",
+            "big.tar.xz",
+        ]
+
+    @staticmethod
+    def test_aging():
+        # At 10 MB per second of waiting, a 20 GB tar ball waiting since
+        # time 0 goes ahead of a 1 MB tar ball arriving more than 2047.9
+        # seconds later, but not of one arriving sooner.
+        q = UnpackQueue(aging=10 * _MB)
+        q.push(_job("big", 20 * 1024 * _MB, 0))
+        q.push(_job("early", _MB, 2000))
+        q.push(_job("late", _MB, 2100))
+        assert [q.pop().name for _ in range(len(q))] == [
+            "early.tar.xz",
+            "big.tar.xz",
+            "late.tar.xz",
+        ]
+
+
+def _tarball(controller_dir, name, prefix=None, user=None, corrupt=False):
+    """Create a tar ball, its .md5 file, and its link in TO-UNPACK.
+    """
+    src = controller_dir / "src" / name
+    src.mkdir(parents=True)
+    run = ""
+    if prefix:
+        run += f"prefix = {prefix}\n"
+    if user:
+        run += f"user = {user}\n"
+    (src / "metadata.log").write_text(f"[pbench]\nname = {name}\n\n[run]\n{run}")
+    tb_path = controller_dir / f"{name}.tar.xz"
+    with tarfile.open(tb_path, "w:xz") as tb:
+        tb.add(src, arcname=name)
+    md5 = hashlib.md5(tb_path.read_bytes()).hexdigest()
+    if corrupt:
+        md5 = "0" * 32
+    (controller_dir / f"{name}.tar.xz.md5").write_text(f"{md5}  {tb_path.name}\n")
+    link_dir = controller_dir / "TO-UNPACK"
+    link_dir.mkdir(exist_ok=True)
+    os.symlink(tb_path, link_dir / tb_path.name)
+    return tb_path
+
+
+@pytest.fixture
+def config(pytestconfig):
+    config = PbenchServerConfig(pytestconfig.cache.get("_PBENCH_SERVER_CONFIG", None))
+    for hierarchy in (config.INCOMING, config.RESULTS, config.USERS):
+        hierarchy.mkdir(parents=True, exist_ok=True)
+    return config
+
+
+class TestUnpacker:
+    @staticmethod
+    def test_unpack(config):
+        controller_dir = config.ARCHIVE / "unpack-ctrl"
+        ts = datetime.utcnow().strftime("%Y.%m.%dT%H.%M.%S")
+        names = [f"tb{i}_{ts}" for i in range(4)]
+        _tarball(controller_dir, names[0])
+        _tarball(controller_dir, names[1], prefix="a/b", user="me")
+        _tarball(controller_dir, names[2], corrupt=True)
+        os.symlink(
+            controller_dir / "missing.tar.xz",
+            controller_dir / "TO-UNPACK" / f"{names[3]}.tar.xz",
+        )
+        logger = get_pbench_logger("pbench-unpack-service", config)
+        unpacker = Unpacker(config, logger, workers=2, io_budget=_MB)
+
+        assert unpacker.run() == 2
+        assert (unpacker.ntotal, unpacker.nwarn, unpacker.nerrs) == (4, 0, 2)
+
+        def links(state):
+            return sorted(os.listdir(controller_dir / state))
+
+        assert links("TO-UNPACK") == []
+        assert links("UNPACKED") == [f"{n}.tar.xz" for n in names[:2]]
+        assert links("WONT-UNPACK") == [f"{n}.tar.xz" for n in names[2:]]
+        for state in ("TO-INDEX", "TO-COPY-SOS"):
+            assert links(state) == links("UNPACKED")
+
+        incoming = config.INCOMING / "unpack-ctrl"
+        assert sorted(os.listdir(incoming)) == names[:2]
+        assert (incoming / names[0] / "metadata.log").is_file()
+        results = config.RESULTS / "unpack-ctrl"
+        assert os.readlink(results / names[0]) == str(incoming / names[0])
+        assert os.readlink(results / "a" / "b" / names[1]) == str(incoming / names[1])
+        users = config.USERS / "me" / "unpack-ctrl" / "a" / "b"
+        assert os.readlink(users / names[1]) == str(incoming / names[1])
+
+        # Nothing is left to do.
+        assert unpacker.run() == 2
+        assert unpacker.ntotal == 4
+
+    @staticmethod
+    def test_worker_death(config, monkeypatch):
+        def die(tb, unpack_dir):
+            os._exit(9)
+
+        # The worker processes are forked, so they see the replacement.
+        monkeypatch.setattr(unpack, "ingest_tarball", die)
+        controller_dir = config.ARCHIVE / "death-ctrl"
+        name = f"tb0_{datetime.utcnow().strftime('%Y.%m.%dT%H.%M.%S')}"
+        _tarball(controller_dir, name)
+        logger = get_pbench_logger("pbench-unpack-service", config)
+        unpacker = Unpacker(config, logger, workers=1)
+
+        assert unpacker.run() == 0
+        assert (unpacker.ntotal, unpacker.nerrs) == (1, 1)
+        assert "died, exit status 9" in unpacker.messages[0]
+        assert os.listdir(controller_dir / "TO-UNPACK") == []
+        assert os.listdir(controller_dir / "WONT-UNPACK") == [f"{name}.tar.xz"]
+        assert not (config.INCOMING / "death-ctrl" / f"{name}.unpack").exists()
+
+    @staticmethod
+    def test_periodic_reports(config, monkeypatch):
+        posted = []
+
+        class FakeReport:
+            def __init__(self, config, name):
+                self.name = name
+
+            def init_report_template(self):
+                pass
+
+            def post_status(self, timestamp, doctype, file_to_index=None):
+                posted.append((self.name, Path(file_to_index).read_text()))
+
+        monkeypatch.setattr(unpack, "Report", FakeReport)
+        controller_dir = config.ARCHIVE / "report-ctrl"
+        ts = datetime.utcnow().strftime("%Y.%m.%dT%H.%M.%S")
+        logger = get_pbench_logger("pbench-dispatcher", config)
+        unpacker = Unpacker(
+            config, logger, workers=1, rescan=1, report_name="pbench-dispatcher"
+        )
+        stop = threading.Event()
+        thread = threading.Thread(target=unpacker.run, args=(stop,))
+        thread.start()
+        try:
+            _tarball(controller_dir, f"tb0_{ts}")
+            _tarball(controller_dir, f"tb1_{ts}", corrupt=True)
+            unpacker.notify()
+            deadline = time.monotonic() + 30
+            while len(posted) < 2 and time.monotonic() < deadline:
+                time.sleep(0.1)
+                processed = sum(
+                    int(n)
+                    for _, text in posted
+                    for n in re.findall(r"Processed (\d+)", text)
+                )
+                if processed == 2 and unpacker.ntotal == 0:
+                    break
+        finally:
+            stop.set()
+            unpacker.notify()
+            thread.join()
+
+        # The counts are reported, once, whichever report they ended up in,
+        # and the counters and messages are reset after each report.
+        assert {name for name, _ in posted} == {"pbench-dispatcher"}
+        text = "".join(text for _, text in posted)
+        counts = re.findall(
+            r"Processed (\d+) result tar balls, (\d+) successfully, \d+ warnings,"
+            r" (\d+) errors",
+            text,
+        )
+        assert [sum(int(c[i]) for c in counts) for i in range(3)] == [2, 1, 1]
+        assert f"tb1_{ts}" in text
+        assert (unpacker.ntotal, unpacker.ntb, unpacker.nerrs) == (0, 0, 0)
+        assert unpacker.messages == []
@@ -16,6 +16,8 @@
 #         flagging *.tar.xz.prefix or prefix.*.tar.xz in the
 #         controller directory
 #       Verify all prefix files in .prefix directories are *.prefix
+#       Ignore the .manifest directory of tar ball member manifests
+#       Ignore the .checkpoint directory of tar ball indexing checkpoints
 #   Review the incoming hierarchy (verify_controllers $INCOMING)
 #     Find "bad" controllers (not a sub-directory of $INCOMING)
 #     For each "good" controller do:
@@ -48,6 +50,10 @@
 #     For each "good" user do:
 #       Review it just like a results hierarchy
 #         (verify_controllers $USER/<user>)
+#   Review the state catalog, if one is configured (pbench-state-catalog check)
+#     Flag state links missing from the catalog, and catalog entries
+#       without a state link
+#     Flag tar balls whose size or .md5 file differ from the catalog's
 
 # load common things
 . $dir/pbench-base.sh
@@ -64,6 +70,7 @@ archive_report=$workdir/archive_report
 incoming_report=$workdir/incoming_report
 results_report=$workdir/results_report
 users_report=$workdir/users_report
+catalog_report=$workdir/catalog_report
 index_content=$workdir/index_content
 bad_controllers=$workdir/badcontrollers
 controllers=$workdir/controllers
@@ -677,7 +684,7 @@ function verify_archive {
         > ${unexpected_objects}.unsorted
         > ${tarballs}
         find ${controller} -maxdepth 1 \
-                \( -type d ! -name . ! -name $(basename -- ${controller}) ! -name .prefix -fprintf ${directories}.unsorted "\t  %f\n" \) \
+                \( -type d ! -name . ! -name $(basename -- ${controller}) ! -name .prefix ! -name .manifest ! -name .checkpoint -fprintf ${directories}.unsorted "\t  %f\n" \) \
                 -o \( -type l -fprintf ${unexpected_symlinks}.unsorted "\t  %f -> %l\n" \) \
                 -o \( -type f ! -name '*.tar.xz.md5' ! -name '*.tar.xz' -fprintf ${unexpected_objects}.unsorted "\t  %f\n" \) \
                 -o \( -type f \( -name '*.tar.xz.md5' -o -name '*.tar.xz' \) -fprintf ${tarballs} "%f\n" \)
@@ -769,6 +776,22 @@ if [[ -s ${users_report} ]]; then
     printf "\nend-${eTS}: users hierarchy: $USERS\n" | tee -a ${report}
 fi
 
+# The state catalog is optional.
+catalog=$(pbench-config state-catalog pbench-server 2>/dev/null)
+if [[ ! -z "${catalog}" ]]; then
+    sTS=$(timestamp)
+    pbench-state-catalog check > ${catalog_report} 2>&1
+    if [[ $? -ne 0 ]]; then
+        let ret=ret+1
+    fi
+    eTS=$(timestamp)
+    if [[ -s ${catalog_report} ]]; then
+        printf "\n\nstart-${sTS}: state catalog: ${catalog}\n" | tee -a ${report}
+        cat ${catalog_report} | tee -a ${report}
+        printf "\nend-${eTS}: state catalog: ${catalog}\n" | tee -a ${report}
+    fi
+fi
+
 log_finish
 
 # send it
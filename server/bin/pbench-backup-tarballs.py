@@ -13,6 +13,8 @@ from pbench.common.exceptions import BadConfig
 from pbench.common.logger import get_pbench_logger
 from pbench.common.utils import md5sum
 from pbench.server import PbenchServerConfig
+from pbench.server.catalog import open_catalog
+from pbench.server.ingest import recorded_md5
 from pbench.server.report import Report
 from pbench.server.s3backup import S3Config, Status, NoSuchKey
 from pbench.server.utils import rename_tb_link, quarantine
@@ -283,7 +285,13 @@ def backup_to_s3(
 def backup_data(lb_obj, s3_obj, config, logger):
     qdir = config.QDIR
 
-    tarlist = glob.iglob(os.path.join(config.ARCHIVE, "*", _linksrc, "*.tar.xz"))
+    catalog = open_catalog(config)
+    if catalog is None:
+        tarlist = glob.iglob(os.path.join(config.ARCHIVE, "*", _linksrc, "*.tar.xz"))
+    else:
+        with catalog:
+            catalog.refresh([_linksrc])
+            tarlist = catalog.links(_linksrc, order="name")
     ntotal = nbackup_success = nbackup_fail = ns3_success = ns3_fail = nquaran = 0
 
     for tb in sorted(tarlist):
@@ -335,9 +343,11 @@ def backup_data(lb_obj, s3_obj, config, logger):
             logger.exception("Quarantine: {}, Could not read {}", tb, archive_md5)
             continue
 
-        # match md5sum of the tarball to its md5 file
+        # match md5sum of the tarball to its md5 file, using the md5sum
+        # computed when the tar ball was ingested if it has not changed
+        # since, instead of reading the entire tar ball again.
         try:
-            archive_tar_hex_value = md5sum(tar)
+            archive_tar_hex_value = recorded_md5(str(tar)) or md5sum(tar)
         except Exception:
             # Could not read file.
             quarantine(qdir, logger, tb)
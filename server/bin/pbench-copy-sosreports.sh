@@ -104,23 +104,45 @@ for result in $list ;do
     incoming=$INCOMING/$hostname/$resultname
 
     typeset -i nsr=0
-    # we look in a few places for the sysinfo/ dir, because we support
-    # multiple versions of the pbench RPM, where the sysinfo/ directory
-    # was located at different places in the hierarchy.
-    sosreports=$(find $incoming/sysinfo $incoming/*/sysinfo $incoming/*/*/sysinfo -name 'sosreport*.tar.xz' 2>/dev/null)
+    # The sosreports, and the check of their MD5s, were recorded when the
+    # tar ball was ingested, so we only have to read that record; otherwise
+    # we look for them, and check their MD5s here.  Each line of the list
+    # is the status of the MD5 check ("ok", "bad-md5", or "no-md5") and the
+    # sosreport's path relative to the controller's incoming directory.
+    sosreports=$TMPDIR/sosreports.lis
+    pbench-tarball-manifest --sosreports $link > $sosreports 2>/dev/null
+    if [[ $? -ne 0 ]] ;then
+        > $sosreports
+        # we look in a few places for the sysinfo/ dir, because we support
+        # multiple versions of the pbench RPM, where the sysinfo/ directory
+        # was located at different places in the hierarchy.
+        for x in $(find $incoming/sysinfo $incoming/*/sysinfo $incoming/*/*/sysinfo -name 'sosreport*.tar.xz' 2>/dev/null) ;do
+            if [ ! -f $x.md5 ] ;then
+                sts=no-md5
+            else
+                md5=$(md5sum $x)
+                md5=${md5%% *}
+                if [ "$md5" != $(cat $x.md5) ] ;then
+                    sts=bad-md5
+                else
+                    sts=ok
+                fi
+            fi
+            echo "$sts ${x#$INCOMING/$hostname/}" >> $sosreports
+        done
+    fi
     src=""
-    for x in $sosreports ;do
+    while read sts name ;do
+        x=$INCOMING/$hostname/$name
         # sosreport should be RO
         chmod 444 $x
-        if [ ! -f $x.md5 ] ;then
+        if [ "$sts" == "no-md5" ] ;then
             log_error "$TS: FAILED: no MD5 file found for $x"
             nerrs=$nerrs+1
             continue
         fi
         chmod 444 $x.md5
-        md5=$(md5sum $x)
-        md5=${md5%% *}
-        if [ "$md5" != $(cat $x.md5) ] ;then
+        if [ "$sts" != "ok" ] ;then
             log_error "$TS: FAILED: MD5 does not match for  $x"
             nerrs=$nerrs+1
             continue
@@ -134,7 +156,8 @@ for result in $list ;do
             continue
         fi
         nsr=$nsr+1
-    done
+    done < $sosreports
+    rm -f $sosreports
 
     if [[  $nsr == 0 ]] ;then
         log_info "$TS: No sosreports found for $result"
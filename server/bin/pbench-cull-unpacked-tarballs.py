@@ -16,6 +16,9 @@ found in the ${INCOMING} directory hierarchy is checked against the configured
 maximum age, and removed (along with its ${RESULTS} and ${USERS} hierarchy
 links).
 
+The entries of the indexer's sosreport cache older than the maximum age are
+removed as well, as only a tar ball still unpacked can be re-indexed.
+
 """
 
 import sys
@@ -32,7 +35,11 @@ import pbench.server
 from pbench.server import PbenchServerConfig
 from pbench.common.exceptions import BadConfig
 from pbench.common.logger import get_pbench_logger
-from pbench.server.indexer import _STD_DATETIME_FMT
+from pbench.server.indexer import (
+    _STD_DATETIME_FMT,
+    cull_sosreport_cache,
+    sosreport_cache_dir,
+)
 from pbench.server.report import Report
 
 
@@ -400,6 +407,17 @@ def main(options):
             # Stop any further unpacked tar ball removal if an error is
             # encountered.
             break
+
+    sos_cache = sosreport_cache_dir(config)
+    if sos_cache is not None and not options.dry_run:
+        try:
+            culled = cull_sosreport_cache(
+                sos_cache, max_unpacked_age * 24 * 60 * 60, pbench.server._time()
+            )
+        except OSError as exc:
+            logger.warning("Failed to cull sosreport cache, '{}': {}", sos_cache, exc)
+        else:
+            logger.debug("Culled {:d} sosreport cache entries", culled)
     end = pbench.server._time()
 
     # Generate the ${TOP}/public_html prefix so we can strip it from the
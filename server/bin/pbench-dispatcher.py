@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench Dispatcher
+
+Watch the receive directories and the TODO, TO-UNPACK and TO-INDEX state
+directories of the ARCHIVE hierarchy with inotify, running the pipeline stage
+for the work arriving in them right away, rather than waiting for its next
+cron job: pbench-server-prep-shim-002, pbench-dispatch and pbench-index are
+run whenever triggered, holding the same locks as their cron jobs, and the
+tar balls are unpacked in-process (see pbench.server.dispatcher).
+
+All the stages are run every "--rescan" seconds anyway, as a safety net for
+missed events, and a status report of the tar balls unpacked since the last
+one is posted as often.  The dispatcher runs until it is sent SIGTERM or
+SIGINT; see lib/systemd/pbench-dispatcher.service to run it as a service.
+
+Return 0 on success, and a value > 0 on configuration errors.
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from argparse import ArgumentParser
+
+from pbench.common.exceptions import BadConfig
+from pbench.common.logger import get_pbench_logger
+from pbench.server import PbenchServerConfig
+from pbench.server.dispatcher import Dispatcher
+from pbench.server.unpack import Unpacker
+
+
+_NAME_ = "pbench-dispatcher"
+
+_MB = 1024 * 1024
+
+
+def main(options):
+    if not options.cfg_name:
+        print(
+            f"{_NAME_}: ERROR: No config file specified; set"
+            " _PBENCH_SERVER_CONFIG env variable",
+            file=sys.stderr,
+        )
+        return 1
+
+    try:
+        config = PbenchServerConfig(options.cfg_name)
+    except BadConfig as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 2
+
+    logger = get_pbench_logger(_NAME_, config)
+
+    for name in ("INCOMING", "RESULTS", "USERS"):
+        if not config.get_valid_dir_option(name, getattr(config, name), logger):
+            return 3
+
+    try:
+        # The unpacking worker processes must not be forked from this
+        # multi-threaded process.
+        unpacker = Unpacker(
+            config,
+            logger,
+            workers=options.workers,
+            io_budget=options.io_budget * _MB if options.io_budget > 0 else None,
+            aging=options.aging * _MB,
+            rescan=options.rescan,
+            mp_context=multiprocessing.get_context("forkserver"),
+            report_name=_NAME_,
+        )
+    except BadConfig as e:
+        logger.error("{}", e)
+        return 4
+
+    stop = threading.Event()
+
+    def sighandler(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, sighandler)
+    signal.signal(signal.SIGINT, sighandler)
+
+    logger.info("{}: starting", config.TS)
+    Dispatcher(config, logger, unpacker=unpacker, rescan=options.rescan).run(stop)
+    logger.info("{}: stopping", config.TS)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(f"Usage: {_NAME_} [--config <path-to-config-file>]")
+    parser.add_argument("-C", "--config", dest="cfg_name", help="Specify config file")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        dest="workers",
+        default=4,
+        help="Number of worker processes used to unpack tar balls in parallel",
+    )
+    parser.add_argument(
+        "--io-budget",
+        type=int,
+        dest="io_budget",
+        default=4096,
+        help="Maximum number of MB of tar balls unpacked at once, 0 for no"
+        " limit; a larger tar ball is only unpacked on its own",
+    )
+    parser.add_argument(
+        "--aging",
+        type=float,
+        dest="aging",
+        default=10,
+        help="Number of MB a tar ball's size is discounted by, for each"
+        " second it waits to be unpacked",
+    )
+    parser.add_argument(
+        "--rescan",
+        type=int,
+        dest="rescan",
+        default=300,
+        help="Number of seconds between runs of all the stages, whether or not"
+        " new work was noticed",
+    )
+    parser.set_defaults(cfg_name=os.environ.get("_PBENCH_SERVER_CONFIG"))
+    parsed = parser.parse_args()
+    if parsed.workers < 1:
+        parser.error("--workers must be at least 1")
+    status = main(parsed)
+    sys.exit(status)
@@ -9,8 +9,16 @@ into the configured Elasticsearch V1 instance.
 import sys
 import os
 import glob
+import json
+import queue
+import select
+import signal
+import socket
 import tarfile
 import tempfile
+import threading
+import time
+from multiprocessing import Pool
 from pathlib import Path
 from argparse import ArgumentParser
 from configparser import Error as ConfigParserError
@@ -25,11 +33,16 @@ from pbench.common.exceptions import (
     JsonFileError,
     TemplateError,
 )
+from pbench.common.logger import get_pbench_logger, reset_pbench_logger
 from pbench.server import tstos
+from pbench.server.bulk import BULK_FILE_SUFFIX, write_bulk_file
+from pbench.server.catalog import open_catalog
 from pbench.server.indexer import (
     IdxContext,
     PbenchTarBall,
     es_index,
+    summarize_metrics,
+    TEMPLATE_CACHE_MAX_AGE,
     VERSION,
 )
 from pbench.server.report import Report
@@ -56,6 +69,231 @@ def _count_lines(fname):
     return cnt
 
 
+def _bulk_file_path(idxctx, tb):
+    """Return the path of the bulk file to which the actions of the given tar
+    ball are written, `<bulk-dir>/<controller>/<name>[.tool-data].ndjson.gz`.
+    """
+    tb_path = Path(tb)
+    name = tb_path.name[: -len(".tar.xz")]
+    suffix = ".tool-data" if idxctx.options.index_tool_data else ""
+    return Path(
+        idxctx.options.bulk_dir,
+        tb_path.parent.parent.name,
+        f"{name}{suffix}{BULK_FILE_SUFFIX}",
+    )
+
+
+def _write_metrics(idxctx, metrics_file, name, metrics):
+    """Write the metrics of each tar ball indexed, along with their totals,
+    to the given file as JSON.
+    """
+    doc = dict(
+        name=name,
+        ts=idxctx.TS,
+        totals=metrics,
+        tarballs=[
+            dict(
+                tbname=ctx["tbname"], phases=ctx["phases"], max_rss_kb=ctx["max_rss_kb"]
+            )
+            for ctx in idxctx.opctx
+            if ctx["object"] == "metrics"
+        ],
+    )
+    try:
+        with open(metrics_file, "w") as fp:
+            json.dump(doc, fp, indent=4, sort_keys=True)
+    except OSError as e:
+        idxctx.logger.warning("Unable to write metrics file {}: {}", metrics_file, e)
+
+
+def _index_tarball(idxctx, tb, size, tmpdir, extracted_root, ie_filepath):
+    """Index a single tar ball, returning a tuple of the tar ball handling
+    status code (see main() below) and the time stamp at which indexing
+    ended (None if the indexing step was never reached).
+
+    Any indexing errors which can't or won't be retried are written to the
+    given indexing errors file.  When a bulk directory is given, the actions
+    are written to a bulk file instead of being indexed.
+
+    When the pipelined bulk indexer is used, the units of actions completely
+    indexed are recorded in the tar ball's checkpoint, so that they are
+    skipped if indexing the tar ball has to be retried; the checkpoint is
+    removed once the tar ball is indexed without any failures.
+
+    The time spent in each phase of indexing the tar ball is added to the
+    indexing context's operational context.
+    """
+    idxctx.logger.info("Starting {} (size {:d})", tb, size)
+
+    ptb = None
+    end = None
+    checkpoint = None
+    try:
+        # "Open" the tar ball represented by the tar ball object
+        idxctx.logger.debug("open tar ball")
+        start = idxctx.time()
+        ptb = PbenchTarBall(idxctx, os.path.realpath(tb), tmpdir, extracted_root)
+        ptb.metrics.add("open", idxctx.time() - start)
+
+        # Construct the generator for emitting all actions.  The `idxctx`
+        # dictionary is passed along to each generator so that it can add its
+        # context for error handling to the list.
+        idxctx.logger.debug("generator setup")
+        if idxctx.options.index_tool_data:
+            actions = ptb.mk_tool_data_actions()
+        else:
+            actions = ptb.make_all_actions()
+        # Time spent generating the actions, to tell it apart from the time
+        # spent waiting on the bulk indexer.
+        actions = ptb.metrics.timed("generate", actions)
+
+        if idxctx.options.bulk_dir:
+            bulk_path = _bulk_file_path(idxctx, tb)
+            idxctx.logger.debug("begin writing bulk file {}", bulk_path)
+            es_res = write_bulk_file(bulk_path, actions)
+        else:
+            if idxctx.bulk_options["in_flight"] > 0:
+                checkpoint = ptb.mk_checkpoint()
+            # File name for containing all indexing errors that can't/won't
+            # be retried.
+            with ie_filepath.open(mode="w") as fp:
+                idxctx.logger.debug("begin indexing")
+                es_res = es_index(
+                    idxctx.es,
+                    actions,
+                    fp,
+                    idxctx.logger,
+                    idxctx._dbg,
+                    checkpoint=checkpoint,
+                    **idxctx.bulk_options,
+                )
+    except UnsupportedTarballFormat as e:
+        idxctx.logger.warning("Unsupported tar ball format: {}", e)
+        tb_res = 4
+    except BadDate as e:
+        idxctx.logger.warning("Bad Date: {!r}", e)
+        tb_res = 5
+    except _filenotfounderror as e:
+        idxctx.logger.warning("No such file: {}", e)
+        tb_res = 6
+    except BadMDLogFormat as e:
+        idxctx.logger.warning("The metadata.log file is curdled in" " tar ball: {}", e)
+        tb_res = 7
+    except SosreportHostname as e:
+        idxctx.logger.warning("Bad hostname in sosreport: {}", e)
+        tb_res = 10
+    except tarfile.TarError as e:
+        idxctx.logger.error("Can't unpack tar ball into {}: {}", ptb.extracted_root, e)
+        tb_res = 11
+    except Exception as e:
+        idxctx.logger.exception("Other indexing error: {}", e)
+        tb_res = 12
+    else:
+        beg, end, successes, duplicates, failures, retries = es_res
+        idxctx.logger.info(
+            "done indexing (start ts: {}, end ts: {}, duration:"
+            " {:.2f}s, successes: {:d}, duplicates: {:d},"
+            " failures: {:d}, retries: {:d})",
+            tstos(beg),
+            tstos(end),
+            end - beg,
+            successes,
+            duplicates,
+            failures,
+            retries,
+        )
+        tb_res = 1 if failures > 0 else 0
+        if tb_res == 0 and checkpoint is not None:
+            checkpoint.remove()
+        ptb.metrics.add(
+            "bulk-wait", max(0.0, (end - beg) - ptb.metrics.seconds("generate"))
+        )
+    if ptb is not None:
+        idxctx.opctx.append(ptb.metrics.opctx(ptb.tbname))
+    return tb_res, end
+
+
+# The indexing context of a worker process, or the error setting it up, see
+# _worker_init().
+_worker_idxctx = None
+_worker_init_error = None
+
+
+def _worker_init(options, name, tracking_id):
+    """Set up the indexing context of a worker process; each worker has its
+    own logger and Elasticsearch client, and uses the tracking ID of the
+    parent's "start" report status.
+
+    An error setting up the context is raised for each tar ball handed to the
+    worker instead of here, where it would only kill the worker process, for
+    the pool to start another one in its place, forever.
+    """
+    global _worker_idxctx, _worker_init_error
+    try:
+        _worker_idxctx = IdxContext(options, name, _dbg=_DEBUG)
+    except Exception as exc:
+        _worker_init_error = exc
+    else:
+        _worker_idxctx.set_tracking_id(tracking_id)
+
+
+def _worker_index_tarball(work):
+    """Index one tar ball in a worker process, returning its handling status
+    along with the operational context (error counters) it gathered, so that
+    the parent can account for it as though it did the work itself.
+    """
+    if _worker_init_error is not None:
+        raise _worker_init_error
+    size, controller, tb, tmpdir, extracted_root, ie_filepath = work
+    idxctx = _worker_idxctx
+    idxctx.opctx = []
+    tb_res, end = _index_tarball(idxctx, tb, size, tmpdir, extracted_root, ie_filepath)
+    return size, controller, tb, ie_filepath, tb_res, end, idxctx.opctx
+
+
+def _gen_indexed(idxctx, options, name, work):
+    """Generate the handling status for each unit of work, indexing the tar
+    balls one after the other in this process, or in parallel using a pool
+    of worker processes when more than one worker is requested.
+
+    Results from workers are generated in the order they complete.  A tar
+    ball whose worker fails outside of _index_tarball()'s own error handling
+    (setting up the worker's indexing context, or passing the work or its
+    result between the processes) gets the generic error status, 12, as it
+    would if the error was raised while indexing it.
+    """
+    if options.workers > 1:
+        done = queue.Queue()
+        with Pool(
+            options.workers,
+            initializer=_worker_init,
+            initargs=(options, name, idxctx.get_tracking_id()),
+        ) as pool:
+            for unit in work:
+                pool.apply_async(
+                    _worker_index_tarball,
+                    (unit,),
+                    callback=lambda result, unit=unit: done.put((unit, result, None)),
+                    error_callback=lambda exc, unit=unit: done.put((unit, None, exc)),
+                )
+            for _ in range(len(work)):
+                unit, result, exc = done.get()
+                if exc is not None:
+                    size, controller, tb, _, _, ie_filepath = unit
+                    idxctx.logger.error("Worker failed to index {}: {!r}", tb, exc)
+                    yield size, controller, tb, ie_filepath, 12, None
+                    continue
+                *res, opctx = result
+                idxctx.opctx.extend(opctx)
+                yield res
+    else:
+        for size, controller, tb, tmpdir, extracted_root, ie_filepath in work:
+            tb_res, end = _index_tarball(
+                idxctx, tb, size, tmpdir, extracted_root, ie_filepath
+            )
+            yield size, controller, tb, ie_filepath, tb_res, end
+
+
 def main(options, name):
     """Main entry point to pbench-index.
 
@@ -67,6 +305,26 @@ def main(options, name):
            dump_templates        - Dump the templates that would be used
            index_tool_data       - Index tool data only
            re_index              - Consider tar balls marked for re-indexing
+           workers               - Number of worker processes to use for
+                                   indexing tar balls in parallel
+           tool_data_workers     - Number of worker processes to use for
+                                   generating the tool data documents of a
+                                   single tar ball in parallel
+           bulk_dir              - Directory to which the documents of each
+                                   tar ball are written as a bulk file, to
+                                   be replayed later with
+                                   pbench-replay-bulk-files, instead of being
+                                   indexed (None to index them); the tar
+                                   balls are moved to TO-REPLAY
+           metrics_file          - File to which the time spent in each
+                                   phase of indexing each tar ball is
+                                   written as JSON (None for no file)
+           daemon                - Keep running, indexing the tar balls as
+                                   they arrive (see _daemon())
+           interval              - Number of seconds between the daemon's
+                                   looks for new tar balls
+           socket                - Path of the daemon's wake-up socket
+                                   (None for the configured one, if any)
        All exceptions are caught and logged to syslog with the stacktrace of
        the exception in a sub-object of the logged JSON document.
 
@@ -137,6 +395,22 @@ def main(options, name):
         idxctx.templates.dump_templates()
         return 0
 
+    if not options.bulk_dir and idxctx.bulk_options["in_flight"] <= 0:
+        # Only the pipelined bulk indexer records checkpoints (see
+        # _index_tarball()), so say so once, rather than for each tar ball.
+        idxctx.logger.info(
+            "Indexing checkpoints are not recorded, as bulk_in_flight is 0"
+        )
+
+    if options.daemon:
+        return _daemon(idxctx, options, name)
+    return _index(idxctx, options, name)
+
+
+def _index(idxctx, options, name):
+    """Index the tar balls waiting in the source state, once, returning one of
+    the status codes of main().
+    """
     _re_idx = "RE-" if options.re_index else ""
     if options.index_tool_data:
         # The link source and destination for the operation of this script
@@ -148,6 +422,11 @@ def main(options, name):
         # when it indexes run, table-of-contents, and result data.
         linksrc = f"TO-{_re_idx}INDEX"
         linkdest = "TO-INDEX-TOOL"
+    if options.bulk_dir:
+        # Nothing has reached Elasticsearch yet, so the tar balls wait for
+        # pbench-replay-bulk-files to replay their bulk files, which then
+        # moves them on to the link destination above.
+        linkdest = "TO-REPLAY"
     # We only ever use a symlink'd error destination for indexing
     # problems.
     linkerrdest = "WONT-INDEX"
@@ -184,8 +463,17 @@ def main(options, name):
     # find -L $ARCHIVE/*/$linksrc -name '*.tar.xz' -printf "%s\t%p\n" 2>/dev/null | sort -n > $list
     tarballs = []
     try:
-        tb_glob = os.path.join(ARCHIVE_rp, "*", linksrc, "*.tar.xz")
-        for tb in glob.iglob(tb_glob):
+        catalog = open_catalog(idxctx.config)
+        if catalog is None:
+            tb_glob = os.path.join(ARCHIVE_rp, "*", linksrc, "*.tar.xz")
+            tb_links = glob.iglob(tb_glob)
+        else:
+            # Ask the state catalog, instead of reading every controller's
+            # state directory.
+            with catalog:
+                catalog.refresh([linksrc])
+                tb_links = catalog.links(linksrc)
+        for tb in tb_links:
             try:
                 rp = Path(tb).resolve(strict=True)
             except OSError:
@@ -223,7 +511,9 @@ def main(options, name):
         return 12
     else:
         if not tarballs:
-            idxctx.logger.info("No tar balls found that need processing")
+            # The daemon finds nothing to do on most of its passes.
+            log = idxctx.logger.debug if options.daemon else idxctx.logger.info
+            log("No tar balls found that need processing")
             return 0
 
     # We always process the smallest tar balls first.
@@ -233,22 +523,36 @@ def main(options, name):
     # that were available as symlinks in the various 'linksrc' directories.
     idxctx.logger.debug("Preparing to index {:d} tar balls", len(tarballs))
 
-    try:
-        # Now that we are ready to begin the actual indexing step, ensure we
-        # have the proper index templates in place.
-        idxctx.logger.debug("update_templates [start]")
-        idxctx.templates.update_templates(idxctx.es)
-    except TemplateError as e:
-        idxctx.logger.error("update_templates [end], error {}", repr(e))
-        res = 9
-    except Exception:
-        idxctx.logger.exception(
-            "update_templates [end]: Unexpected template" " processing error"
-        )
-        res = 12
-    else:
-        idxctx.logger.debug("update_templates [end]")
+    if options.bulk_dir:
+        # The index templates are put in place when the bulk files are
+        # replayed, so Elasticsearch need not be reachable now.
+        idxctx.logger.debug("update_templates [skipped, writing bulk files]")
+        res = 0
+    elif (
+        idxctx.templates_updated is not None
+        and time.monotonic() - idxctx.templates_updated < TEMPLATE_CACHE_MAX_AGE
+    ):
+        # Put in place by a recent pass of the daemon.
+        idxctx.logger.debug("update_templates [skipped, already up to date]")
         res = 0
+    else:
+        try:
+            # Now that we are ready to begin the actual indexing step, ensure
+            # we have the proper index templates in place.
+            idxctx.logger.debug("update_templates [start]")
+            idxctx.templates.update_templates(idxctx.es)
+        except TemplateError as e:
+            idxctx.logger.error("update_templates [end], error {}", repr(e))
+            res = 9
+        except Exception:
+            idxctx.logger.exception(
+                "update_templates [end]: Unexpected template" " processing error"
+            )
+            res = 12
+        else:
+            idxctx.logger.debug("update_templates [end]")
+            idxctx.templates_updated = time.monotonic()
+            res = 0
 
     if res != 0:
         # Exit early if we encounter any errors.
@@ -264,6 +568,7 @@ def main(options, name):
         hostname=idxctx.gethostname(),
         version=VERSION,
         templates=idxctx.templates,
+        bulk_dir=options.bulk_dir,
     )
     # We use the "start" report ID as the tracking ID for all indexed
     # documents.
@@ -290,86 +595,39 @@ def main(options, name):
             indexed = Path(tmpdir, f"{name}.{idxctx.TS}.indexed")
             erred = Path(tmpdir, f"{name}.{idxctx.TS}.erred")
             skipped = Path(tmpdir, f"{name}.{idxctx.TS}.skipped")
-            ie_filepath = Path(tmpdir, f"{name}.{idxctx.TS}.indexing-errors.json")
 
+            work = []
             for size, controller, tb in tarballs:
                 # Sanity check source tar ball path
-                linksrc_dir = Path(tb).parent
-                linksrc_dirname = linksrc_dir.name
+                linksrc_dirname = Path(tb).parent.name
                 assert linksrc_dirname == linksrc, (
                     f"Logic bomb!  tar ball " f"path {tb} does not contain {linksrc}"
                 )
-
-                idxctx.logger.info("Starting {} (size {:d})", tb, size)
-
-                ptb = None
-                try:
-                    # "Open" the tar ball represented by the tar ball object
-                    idxctx.logger.debug("open tar ball")
-                    ptb = PbenchTarBall(
-                        idxctx,
-                        os.path.realpath(tb),
+                if options.workers > 1:
+                    # Each worker needs its own indexing errors file.
+                    ie_filepath = Path(
                         tmpdir,
-                        Path(INCOMING_rp, controller),
+                        f"{name}.{idxctx.TS}.{Path(tb).name}.indexing-errors.json",
                     )
-
-                    # Construct the generator for emitting all actions.  The
-                    # `idxctx` dictionary is passed along to each generator so
-                    # that it can add its context for error handling to the
-                    # list.
-                    idxctx.logger.debug("generator setup")
-                    if options.index_tool_data:
-                        actions = ptb.mk_tool_data_actions()
-                    else:
-                        actions = ptb.make_all_actions()
-
-                    # File name for containing all indexing errors that
-                    # can't/won't be retried.
-                    with ie_filepath.open(mode="w") as fp:
-                        idxctx.logger.debug("begin indexing")
-                        es_res = es_index(
-                            idxctx.es, actions, fp, idxctx.logger, idxctx._dbg
-                        )
-                except UnsupportedTarballFormat as e:
-                    idxctx.logger.warning("Unsupported tar ball format: {}", e)
-                    tb_res = 4
-                except BadDate as e:
-                    idxctx.logger.warning("Bad Date: {!r}", e)
-                    tb_res = 5
-                except _filenotfounderror as e:
-                    idxctx.logger.warning("No such file: {}", e)
-                    tb_res = 6
-                except BadMDLogFormat as e:
-                    idxctx.logger.warning(
-                        "The metadata.log file is curdled in" " tar ball: {}", e
-                    )
-                    tb_res = 7
-                except SosreportHostname as e:
-                    idxctx.logger.warning("Bad hostname in sosreport: {}", e)
-                    tb_res = 10
-                except tarfile.TarError as e:
-                    idxctx.logger.error(
-                        "Can't unpack tar ball into {}: {}", ptb.extracted_root, e
-                    )
-                    tb_res = 11
-                except Exception as e:
-                    idxctx.logger.exception("Other indexing error: {}", e)
-                    tb_res = 12
                 else:
-                    beg, end, successes, duplicates, failures, retries = es_res
-                    idxctx.logger.info(
-                        "done indexing (start ts: {}, end ts: {}, duration:"
-                        " {:.2f}s, successes: {:d}, duplicates: {:d},"
-                        " failures: {:d}, retries: {:d})",
-                        tstos(beg),
-                        tstos(end),
-                        end - beg,
-                        successes,
-                        duplicates,
-                        failures,
-                        retries,
+                    ie_filepath = Path(
+                        tmpdir, f"{name}.{idxctx.TS}.indexing-errors.json"
+                    )
+                work.append(
+                    (
+                        size,
+                        controller,
+                        tb,
+                        tmpdir,
+                        Path(INCOMING_rp, controller),
+                        ie_filepath,
                     )
-                    tb_res = 1 if failures > 0 else 0
+                )
+
+            for size, controller, tb, ie_filepath, tb_res, end in _gen_indexed(
+                idxctx, options, name, work
+            ):
+                linksrc_dir = Path(tb).parent
                 try:
                     ie_len = ie_filepath.stat().st_size
                 except _filenotfounderror:
@@ -383,6 +641,8 @@ def main(options, name):
                 else:
                     # Success fetching indexing error file size.
                     if ie_len > len(tb) + 1:
+                        if end is None:
+                            end = idxctx.time()
                         try:
                             report.post_status(tstos(end), "errors", ie_filepath)
                         except Exception:
@@ -509,14 +769,136 @@ def main(options, name):
                     with skipped.open() as sfp:
                         for line in sorted(sfp):
                             print(line.strip(), file=fp)
+            metrics = summarize_metrics(idxctx.opctx)
+            if options.metrics_file:
+                _write_metrics(idxctx, options.metrics_file, name, metrics)
             try:
-                report.post_status(tstos(idxctx.time()), "status", report_fname)
+                report.post_status(
+                    tstos(idxctx.time()), "status", report_fname, metrics=metrics
+                )
             except Exception:
                 pass
 
     return res
 
 
+def _daemon(idxctx, options, name):
+    """Index the tar balls arriving in the source state until SIGTERM or
+    SIGINT, returning the status code of the last pass.
+
+    The indexing context, with its configuration, index templates, and
+    Elasticsearch client, is kept from one pass to the next, so that a pass
+    with nothing to do costs no more than a look at the state directories
+    (and no "start" report is posted).  A new pass is made every
+    "--interval" seconds, or as soon as a datagram is received on the local
+    socket (given by "--socket", or the "socket" option of the [pbench-index]
+    section), e.g. from pbench-dispatcher.  The index templates are checked
+    again once the local template cache has expired (see
+    pbench.server.indexer.TEMPLATE_CACHE_MAX_AGE).
+
+    On SIGHUP, the configuration is reloaded, and a new indexing context
+    used, unless the new configuration is invalid; the log handler is built
+    anew from the reloaded configuration as well (reopening a log file, e.g.
+    after it was rotated).
+    """
+    stop = threading.Event()
+    reload = threading.Event()
+
+    def sighandler(signum, frame):
+        if signum == signal.SIGHUP:
+            reload.set()
+        else:
+            stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, sighandler)
+
+    sock_path = options.socket or idxctx.config.get(
+        "pbench-index", "socket", fallback=None
+    )
+    sock = None
+    if sock_path:
+        try:
+            os.unlink(sock_path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(sock_path)
+        sock.setblocking(False)
+
+    idxctx.logger.info(
+        "{}: daemon started, indexing every {:d} seconds{}",
+        name,
+        options.interval,
+        f", or when woken up on {sock_path}" if sock else "",
+    )
+    res = 0
+    try:
+        while not stop.is_set():
+            if reload.is_set():
+                reload.clear()
+                # The logger keeps its handler, built from the configuration
+                # of its first use, unless told otherwise.
+                reset_pbench_logger(name)
+                try:
+                    new_idxctx = IdxContext(options, name, _dbg=_DEBUG)
+                except (
+                    ConfigFileError,
+                    ConfigParserError,
+                    BadConfig,
+                    JsonFileError,
+                ) as e:
+                    reset_pbench_logger(name)
+                    idxctx.logger = get_pbench_logger(name, idxctx.config)
+                    idxctx.logger.error(
+                        "Reloading the configuration failed, keeping the"
+                        " current one: {}",
+                        e,
+                    )
+                else:
+                    idxctx = new_idxctx
+                    idxctx.logger.info("{}: configuration reloaded", name)
+            # Each pass is a run of its own, with its own metrics.
+            idxctx.TS = f"run-{idxctx.config.timestamp()}"
+            idxctx.opctx = []
+            res = _index(idxctx, options, name)
+            if res != 0:
+                idxctx.logger.warning(
+                    "{}.{}: indexing pass failed with status {:d}",
+                    name,
+                    idxctx.TS,
+                    res,
+                )
+            # Wait for the next pass, a second at a time, so that signals
+            # are acted upon promptly.
+            deadline = time.monotonic() + options.interval
+            while not stop.is_set() and not reload.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                if sock is None:
+                    stop.wait(min(timeout, 1))
+                    continue
+                ready, _, _ = select.select([sock], [], [], min(timeout, 1))
+                if ready:
+                    # Any number of wake-ups make for a single pass.
+                    try:
+                        while True:
+                            sock.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    break
+    finally:
+        if sock is not None:
+            sock.close()
+            try:
+                os.unlink(sock_path)
+            except FileNotFoundError:
+                pass
+    idxctx.logger.info("{}: daemon stopped", name)
+    return res
+
+
 ###########################################################################
 # Options handling
 if __name__ == "__main__":
@@ -560,6 +942,22 @@ if __name__ == "__main__":
         default=False,
         help="Only index tool data, assumes run data already exists",
     )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        dest="workers",
+        default=1,
+        help="Number of worker processes used to index tar balls in parallel",
+    )
+    parser.add_argument(
+        "--tool-data-workers",
+        type=int,
+        dest="tool_data_workers",
+        default=1,
+        help="Number of worker processes used to generate the tool data"
+        " documents of each tar ball in parallel (requires --tool-data)",
+    )
     parser.add_argument(
         "-R",
         "--re-index",
@@ -568,6 +966,51 @@ if __name__ == "__main__":
         default=False,
         help="Perform re-indexing of previously indexed data",
     )
+    parser.add_argument(
+        "--bulk-dir",
+        dest="bulk_dir",
+        default=None,
+        help="Write the documents of each tar ball as a compressed bulk file"
+        " in the given directory, to be replayed later by"
+        " pbench-replay-bulk-files, instead of indexing them; the tar balls"
+        " wait in the TO-REPLAY state until then",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        default=None,
+        help="Write the time spent in each phase of indexing each tar ball,"
+        " the documents and bytes per second of each tool, and the peak RSS,"
+        " to the given file as JSON",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        dest="daemon",
+        default=False,
+        help="Keep running, indexing the tar balls as they arrive, with the"
+        " configuration, index templates, and Elasticsearch client loaded"
+        " once (and reloaded on SIGHUP), until SIGTERM or SIGINT",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        dest="interval",
+        default=60,
+        help="Number of seconds between looks for new tar balls to index"
+        " (requires --daemon)",
+    )
+    parser.add_argument(
+        "--socket",
+        dest="socket",
+        default=None,
+        help="Path of a local socket on which a datagram has the daemon look"
+        " for new tar balls right away (requires --daemon)",
+    )
     parsed = parser.parse_args()
+    if parsed.tool_data_workers > 1 and parsed.workers > 1:
+        # Worker processes indexing tar balls can't have workers of their
+        # own.
+        parser.error("--tool-data-workers can't be combined with --workers")
     status = main(parsed, run_name)
     sys.exit(status)
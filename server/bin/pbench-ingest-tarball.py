@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench Ingest Tar Ball
+
+Extract the given tar ball (full path) beneath the given unpack directory,
+in a single pass over the compressed tar ball which also verifies its MD5,
+and records its member manifest, the MD5s of the sosreports it contains, and
+the prefix and user of its metadata.log file, so that later stages of the
+pipeline do not have to read the tar ball again (see pbench.server.ingest).
+
+Return 0 on success, and a value > 0 if the tar ball could not be ingested.
+"""
+
+import sys
+from pathlib import Path
+from argparse import ArgumentParser
+
+from pbench.common.exceptions import IngestError
+from pbench.server.ingest import ingest_tarball
+
+
+_NAME_ = "pbench-ingest-tarball"
+
+
+def main(options):
+    try:
+        tb_path = Path(options.tb_path).resolve(strict=True)
+    except FileNotFoundError:
+        print(
+            f"{_NAME_}: The tar ball path, '{options.tb_path}', does not resolve"
+            " to a real location",
+            file=sys.stderr,
+        )
+        return 2
+
+    try:
+        ingest_tarball(str(tb_path), options.unpack_dir)
+    except IngestError as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 3
+    except OSError as e:
+        print(f"{_NAME_}: Unable to ingest tar ball {tb_path}: {e}", file=sys.stderr)
+        return 4
+
+    return 0
+
+
+if __name__ == "__main__":
+    prog = Path(sys.argv[0]).name
+    parser = ArgumentParser(f"Usage: {prog} <tar-ball-path> <unpack-dir>")
+    parser.add_argument(
+        "tb_path", help="Specify the full path of the tar ball in the ARCHIVE tree"
+    )
+    parser.add_argument(
+        "unpack_dir", help="Specify the directory beneath which to extract the tar ball"
+    )
+    parsed = parser.parse_args()
+    status = main(parsed)
+    sys.exit(status)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench Replay Bulk Files
+
+Index the documents of the bulk files written by `pbench-index --bulk-dir`
+into the configured Elasticsearch instance.  Each argument is either a bulk
+file, or a directory which is searched for bulk files.
+
+The number of leading documents of a bulk file known to be handled is
+recorded in a progress file next to it as the replay proceeds, so that an
+interrupted replay resumes where it left off, and bulk files completely
+replayed are skipped (unless --restart is given).
+
+The tar ball of each bulk file replayed, waiting in the TO-REPLAY state of its
+controller, is then moved on to the state it would have reached had it been
+indexed by pbench-index directly: TO-INDEX-TOOL once its run data is
+replayed, INDEXED once its tool data is, or WONT-INDEX.1 if any of its
+documents could not be indexed.
+
+Return 0 on success, and a value > 0 if any bulk file could not be replayed.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from configparser import Error as ConfigParserError
+from pathlib import Path
+
+from pbench.common.exceptions import (
+    BadConfig,
+    BulkFileError,
+    ConfigFileError,
+    JsonFileError,
+    TemplateError,
+)
+from pbench.server.bulk import (
+    BULK_FILE_SUFFIX,
+    PipelinedBulk,
+    load_progress,
+    read_bulk_file,
+    save_progress,
+)
+from pbench.server.indexer import IdxContext
+from pbench.server.utils import rename_tb_link
+
+
+_NAME_ = "pbench-replay-bulk-files"
+
+# The suffix pbench-index adds to the name of the bulk file of a tar ball's
+# tool data.
+_TOOL_DATA_SUFFIX = ".tool-data"
+
+
+def _bulk_files(paths):
+    """Generate the bulk files named by the given paths, in sorted order for
+    each directory.
+    """
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            yield from sorted(path.rglob(f"*{BULK_FILE_SUFFIX}"))
+        else:
+            yield path
+
+
+def replay(idxctx, bulk_path, in_flight, restart=False):
+    """Replay the given bulk file, returning True if all of its documents
+    were handled.
+    """
+    skip, complete = (0, False) if restart else load_progress(bulk_path)
+    if complete:
+        idxctx.logger.debug("{}: already replayed", bulk_path)
+        return True
+
+    def _progress(actions):
+        save_progress(bulk_path, skip + actions)
+
+    errors_path = Path(f"{bulk_path}.errors")
+    with errors_path.open(mode="a") as errorsfp:
+        bulk = PipelinedBulk(
+            idxctx.es,
+            errorsfp,
+            idxctx.logger,
+            in_flight=in_flight,
+            chunk_docs=idxctx.bulk_options["chunk_docs"],
+            chunk_bytes=idxctx.bulk_options["chunk_bytes"],
+            progress=_progress,
+        )
+        beg, end, successes, duplicates, failures, retries = bulk.run(
+            read_bulk_file(bulk_path, skip)
+        )
+    save_progress(bulk_path, skip + bulk.next_seq, complete=True)
+    if errors_path.stat().st_size == 0:
+        errors_path.unlink()
+    idxctx.logger.info(
+        "{}: resumed at {:d}, replayed in {:.2f} secs, successes {:d},"
+        " duplicates {:d}, failures {:d}, retries {:d}",
+        bulk_path,
+        skip,
+        end - beg,
+        successes,
+        duplicates,
+        failures,
+        retries,
+    )
+    return failures == 0
+
+
+def advance(idxctx, bulk_path, replayed):
+    """Move the tar ball of the given bulk file, if it is waiting in the
+    TO-REPLAY state of its controller, on to its next state.
+    """
+    name = bulk_path.name[: -len(BULK_FILE_SUFFIX)]
+    if name.endswith(_TOOL_DATA_SUFFIX):
+        name = name[: -len(_TOOL_DATA_SUFFIX)]
+        linkdest = "INDEXED"
+    else:
+        linkdest = "TO-INDEX-TOOL"
+    if not replayed:
+        linkdest = "WONT-INDEX.1"
+    controller_path = Path(idxctx.config.ARCHIVE, bulk_path.parent.name)
+    tb = Path(controller_path, "TO-REPLAY", f"{name}.tar.xz")
+    if not os.path.lexists(tb):
+        idxctx.logger.debug("{}: no tar ball waiting to be replayed", bulk_path)
+        return
+    rename_tb_link(str(tb), Path(controller_path, linkdest), idxctx.logger)
+    idxctx.logger.debug("{}: moved {} to {}", bulk_path, tb.name, linkdest)
+
+
+def main(options):
+    if not options.cfg_name:
+        print(
+            f"{_NAME_}: ERROR: No config file specified; set"
+            " _PBENCH_SERVER_CONFIG env variable or"
+            " use --config <file> on the command line",
+            file=sys.stderr,
+        )
+        return 2
+
+    try:
+        idxctx = IdxContext(options, _NAME_)
+    except (ConfigFileError, ConfigParserError, BadConfig) as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 2
+    except JsonFileError as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 8
+
+    try:
+        idxctx.templates.update_templates(idxctx.es)
+    except TemplateError as e:
+        idxctx.logger.error("update_templates error {}", repr(e))
+        return 9
+
+    in_flight = options.in_flight or idxctx.bulk_options["in_flight"] or 1
+    res = 0
+    for bulk_path in _bulk_files(options.paths):
+        try:
+            replayed = replay(idxctx, bulk_path, in_flight, restart=options.restart)
+            if not replayed:
+                res = 1
+            advance(idxctx, bulk_path, replayed)
+        except (BulkFileError, OSError) as e:
+            idxctx.logger.error("{}: replay failed, {}", bulk_path, e)
+            res = 1
+    return res
+
+
+if __name__ == "__main__":
+    prog = Path(sys.argv[0]).name
+    parser = ArgumentParser(
+        f"Usage: {prog} [--config <path-to-config-file>] <bulk-file-or-dir> ..."
+    )
+    parser.add_argument(
+        "-C",
+        "--config",
+        dest="cfg_name",
+        default=os.environ.get("_PBENCH_SERVER_CONFIG"),
+        help="Specify config file",
+    )
+    parser.add_argument(
+        "--in-flight",
+        type=int,
+        dest="in_flight",
+        default=0,
+        help="Maximum number of bulk requests in flight at one time"
+        " (defaults to the configured bulk_in_flight, or 1)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        dest="restart",
+        default=False,
+        help="Replay bulk files from the start, ignoring any recorded progress",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Bulk files, or directories holding bulk files"
+    )
+    parsed = parser.parse_args()
+    status = main(parsed)
+    sys.exit(status)
@@ -128,6 +128,24 @@ for host in $hosts; do
                 nprefixerrs=$nprefixerrs+1
             fi
         fi
+        # remove member manifest if present
+        manifest=".manifest/${x%%.tar.xz}.manifest"
+        if [ -e $manifest ]; then
+            rm $manifest
+            rc=$?
+            if [ $rc != 0 ]; then
+                log_error "$TS: Failed to remove member manifest file: $manifest, code: $rc" "${mail_content}"
+            fi
+        fi
+        # remove indexing checkpoint if present
+        checkpoint=".checkpoint/${x%%.tar.xz}.checkpoint"
+        if [ -e $checkpoint ]; then
+            rm $checkpoint
+            rc=$?
+            if [ $rc != 0 ]; then
+                log_error "$TS: Failed to remove indexing checkpoint file: $checkpoint, code: $rc" "${mail_content}"
+            fi
+        fi
     done
     popd > /dev/null 2>&4
 done
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench State Catalog
+
+Maintain and query the state catalog of the tar balls of the ARCHIVE
+hierarchy (see pbench.server.catalog), named by the "state-catalog" option
+of the [pbench-server] section of the configuration:
+
+    refresh              - bring the catalog up to date with the state links
+    list <state> [-n N]  - list the links of the (N smallest) tar balls in
+                           the given state
+    check                - verify the catalog against a full scan of the
+                           state links, listing any inconsistencies
+
+Return 0 on success, 4 if "check" finds inconsistencies, and any other value
+> 0 on errors.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+from pbench.common.exceptions import BadConfig
+from pbench.server import PbenchServerConfig
+from pbench.server.catalog import open_catalog
+
+
+_NAME_ = "pbench-state-catalog"
+
+
+def main(options):
+    if not options.cfg_name:
+        print(
+            f"{_NAME_}: ERROR: No config file specified; set"
+            " _PBENCH_SERVER_CONFIG env variable",
+            file=sys.stderr,
+        )
+        return 1
+
+    try:
+        config = PbenchServerConfig(options.cfg_name)
+    except BadConfig as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 2
+
+    catalog = open_catalog(config)
+    if catalog is None:
+        print(f"{_NAME_}: No state catalog configured", file=sys.stderr)
+        return 3
+
+    with catalog:
+        if options.command == "check":
+            problems = catalog.check()
+            for problem in problems:
+                print(problem)
+            return 4 if problems else 0
+        changes = catalog.refresh()
+        if options.command == "refresh":
+            print(f"{changes:d} state changes")
+        else:
+            for link in catalog.links(options.state, limit=options.limit):
+                print(link)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(f"Usage: {_NAME_} [--config <path-to-config-file>]")
+    parser.add_argument("-C", "--config", dest="cfg_name", help="Specify config file")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    subparsers.add_parser("refresh", help="Bring the catalog up to date")
+    list_parser = subparsers.add_parser(
+        "list", help="List the links of the tar balls in a state, smallest first"
+    )
+    list_parser.add_argument("state", help="Specify the state, e.g. TO-INDEX")
+    list_parser.add_argument(
+        "-n",
+        "--limit",
+        type=int,
+        dest="limit",
+        default=None,
+        help="List at most this many tar balls",
+    )
+    subparsers.add_parser("check", help="Verify the catalog against the links")
+    parser.set_defaults(cfg_name=os.environ.get("_PBENCH_SERVER_CONFIG"))
+    parsed = parser.parse_args()
+    status = main(parsed)
+    sys.exit(status)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench Tar Ball Manifest
+
+Write the member manifest for the given tar ball (full path), so that later
+consumers of the tar ball do not have to read through the entire compressed
+tar ball to find out what it contains.
+
+Return 0 on success, and a value > 0 if the manifest could not be written.
+
+With --sosreports, instead list the sosreports found when the tar ball was
+ingested (see pbench-ingest-tarball), one per line, as the status of the
+check of its MD5 ("ok", "bad-md5", or "no-md5") followed by its member
+name, returning 1 if the tar ball was not ingested, or has changed since.
+"""
+
+import sys
+import tarfile
+from pathlib import Path
+from argparse import ArgumentParser
+
+from pbench.server.ingest import load_ingest_record
+from pbench.server.manifest import write_manifest
+
+
+_NAME_ = "pbench-tarball-manifest"
+
+
+def main(options):
+    try:
+        tb_path = Path(options.tb_path).resolve(strict=True)
+    except FileNotFoundError:
+        print(
+            f"{_NAME_}: The tar ball path, '{options.tb_path}', does not resolve"
+            " to a real location",
+            file=sys.stderr,
+        )
+        return 2
+
+    if options.sosreports:
+        ingest = load_ingest_record(str(tb_path))
+        if ingest is None:
+            return 1
+        for sos in ingest["sosreports"]:
+            print(f"{sos['status']} {sos['name']}")
+        return 0
+
+    try:
+        write_manifest(str(tb_path))
+    except tarfile.TarError as e:
+        print(f"{_NAME_}: Unable to read tar ball {tb_path}: {e}", file=sys.stderr)
+        return 3
+    except OSError as e:
+        print(f"{_NAME_}: Unable to write manifest for {tb_path}: {e}", file=sys.stderr)
+        return 4
+
+    return 0
+
+
+if __name__ == "__main__":
+    prog = Path(sys.argv[0]).name
+    parser = ArgumentParser(f"Usage: {prog} <tar-ball-path>")
+    parser.add_argument(
+        "--sosreports",
+        action="store_true",
+        default=False,
+        help="List the sosreports found when the tar ball was ingested",
+    )
+    parser.add_argument(
+        "tb_path", help="Specify the full path of the tar ball in the ARCHIVE tree"
+    )
+    parsed = parser.parse_args()
+    status = main(parsed)
+    sys.exit(status)
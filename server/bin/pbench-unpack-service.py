@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- mode: python -*-
+
+"""Pbench Unpack Service
+
+Unpack the tar balls in the TO-UNPACK state of all the controllers of the
+ARCHIVE hierarchy, using several worker processes at once, smallest first, but
+aged by how long each has been waiting, so that small tar balls do not wait
+behind large ones, and large ones are not starved (see pbench.server.unpack).
+
+New tar balls are looked for while the work is in progress; the service only
+exits once there are none left to unpack, so running it under cron once a
+minute, with a lock, keeps it running for as long as there is work to do.
+
+Return 0 on success, and a value > 0 on configuration errors.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+from pbench.common.exceptions import BadConfig
+from pbench.common.logger import get_pbench_logger
+from pbench.server import PbenchServerConfig
+from pbench.server.unpack import Unpacker
+
+
+_NAME_ = "pbench-unpack-service"
+
+_MB = 1024 * 1024
+
+
+def main(options):
+    if not options.cfg_name:
+        print(
+            f"{_NAME_}: ERROR: No config file specified; set"
+            " _PBENCH_SERVER_CONFIG env variable",
+            file=sys.stderr,
+        )
+        return 1
+
+    try:
+        config = PbenchServerConfig(options.cfg_name)
+    except BadConfig as e:
+        print(f"{_NAME_}: {e}", file=sys.stderr)
+        return 2
+
+    logger = get_pbench_logger(_NAME_, config)
+
+    for name in ("INCOMING", "RESULTS", "USERS"):
+        if not config.get_valid_dir_option(name, getattr(config, name), logger):
+            return 3
+
+    try:
+        unpacker = Unpacker(
+            config,
+            logger,
+            workers=options.workers,
+            io_budget=options.io_budget * _MB if options.io_budget > 0 else None,
+            aging=options.aging * _MB,
+            rescan=options.rescan,
+        )
+    except BadConfig as e:
+        logger.error("{}", e)
+        return 4
+
+    logger.info("{}: starting", config.TS)
+    unpacker.run()
+    logger.info("{}: Processed {:d} tarballs", config.TS, unpacker.ntb)
+
+    unpacker.post_report(_NAME_)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(f"Usage: {_NAME_} [--config <path-to-config-file>]")
+    parser.add_argument("-C", "--config", dest="cfg_name", help="Specify config file")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        dest="workers",
+        default=4,
+        help="Number of worker processes used to unpack tar balls in parallel",
+    )
+    parser.add_argument(
+        "--io-budget",
+        type=int,
+        dest="io_budget",
+        default=4096,
+        help="Maximum number of MB of tar balls unpacked at once, 0 for no"
+        " limit; a larger tar ball is only unpacked on its own",
+    )
+    parser.add_argument(
+        "--aging",
+        type=float,
+        dest="aging",
+        default=10,
+        help="Number of MB a tar ball's size is discounted by, for each"
+        " second it waits to be unpacked",
+    )
+    parser.add_argument(
+        "--rescan",
+        type=int,
+        dest="rescan",
+        default=60,
+        help="Number of seconds between looks for new tar balls to unpack",
+    )
+    parser.set_defaults(cfg_name=os.environ.get("_PBENCH_SERVER_CONFIG"))
+    parsed = parser.parse_args()
+    if parsed.workers < 1:
+        parser.error("--workers must be at least 1")
+    status = main(parsed)
+    sys.exit(status)
@@ -207,37 +207,20 @@ function do_work() {
             continue
         fi
         let start_time=$(timestamp-seconds-since-epoch)
-        tar --extract --no-same-owner --touch --delay-directory-restore --file="${result}" --force-local --directory="${incoming}.unpack"
+        # Extract the tar ball in a single pass over it, which also verifies
+        # its MD5, and records its member manifest, along with everything
+        # later stages need to know about it (the MD5s of its sosreports,
+        # and the prefix and user of its metadata.log), so that they don't
+        # have to read the entire tar ball again.  The extracted files are
+        # readable by all, and the directories readable and searchable by
+        # all.
+        pbench-ingest-tarball ${link} ${incoming}.unpack
         status=${?}
         if [[ ${status} -ne 0 ]]; then
-            log_error "${TS}: 'tar -xf ${result}' failed: code ${status}" "${mail_content}"
+            log_error "${TS}: 'pbench-ingest-tarball ${result}' failed: code ${status}" "${mail_content}"
             rm -rf ${incoming}.unpack
             nerrs=${nerrs}+1
-            move_symlink ${hostname} ${resultname} ${linksrc} ${linkerr} || doexit "Error handling failed for failed untar"
-            if [[ ${SECONDS} -ge ${max_seconds} ]]; then break; fi
-            continue
-        fi
-
-        # chmod directories to at least 555
-        find ${incoming}.unpack/${resultname} -type d -print0 | xargs -0 chmod ugo+rx
-        status=${?}
-        if [[ ${status} -ne 0 ]]; then
-            log_error "${TS}: 'chmod ugo+rx' of subdirs ${resultname} for ${result} failed: code ${status}" "${mail_content}"
-            nerrs=${nerrs}+1
-            rm -rf ${incoming}.unpack
-            move_symlink ${hostname} ${resultname} ${linksrc} ${linkerr} || doexit "Error handling failed for failed find/chmod"
-            if [[ ${SECONDS} -ge ${max_seconds} ]]; then break; fi
-            continue
-        fi
-
-        # chmod files to at least 444
-        chmod -R ugo+r ${incoming}.unpack/${resultname}
-        status=${?}
-        if [[ ${status} -ne 0 ]]; then
-            log_error "${TS}: 'chmod -R ugo+r ${resultname}' for ${result} failed: code ${status}" "${mail_content}"
-            nerrs=${nerrs}+1
-            rm -rf ${incoming}.unpack
-            move_symlink ${hostname} ${resultname} ${linksrc} ${linkerr} || doexit "Error handling failed for failed chmod"
+            move_symlink ${hostname} ${resultname} ${linksrc} ${linkerr} || doexit "Error handling failed for failed ingest"
             if [[ ${SECONDS} -ge ${max_seconds} ]]; then break; fi
             continue
         fi